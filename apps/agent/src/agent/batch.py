@@ -0,0 +1,244 @@
+import time
+import asyncio
+import logging
+from typing import AsyncGenerator, Optional
+from pydantic import BaseModel, Field
+
+from nat.builder.builder import Builder
+from nat.cli.register_workflow import register_function
+from nat.data_models.function import FunctionBaseConfig
+from nat.data_models.component_ref import FunctionRef
+from nat.builder.function_info import FunctionInfo
+from agent.pipeline import StageError, gather_stages, load_output
+from mcp_server import tracing
+
+logger = logging.getLogger(__name__)
+
+
+class BatchEvaluateConfig(FunctionBaseConfig, name="batch_evaluate"):
+    """
+    Evaluates many strategy prompts through the backtest stages with a separate
+    concurrency limit per stage, so LLM rate limits and runner capacity hold.
+    """
+
+    description: str = Field(
+        default="Backtest a batch of strategy prompts and summarize the results."
+    )
+    task_register: FunctionRef = Field(default="task_register")
+    quick_preview: FunctionRef = Field(default="quick_preview")
+    yh_query_save: FunctionRef = Field(default="yh_query_save")
+    code_generator: FunctionRef = Field(default="code_generator")
+    code_executor: FunctionRef = Field(default="code_executor")
+    parse_concurrency: int = Field(default=8, description="Concurrent previews.")
+    fetch_concurrency: int = Field(default=4, description="Concurrent data fetches.")
+    codegen_concurrency: int = Field(
+        default=4, description="Concurrent code generations."
+    )
+    execute_concurrency: int = Field(
+        default=2, description="Concurrent backtest executions."
+    )
+    max_items: int = Field(default=500, description="Largest accepted batch.")
+
+
+class BatchItem(BaseModel):
+    prompt: str
+    ticker: Optional[str] = Field(
+        default=None, description="Run the strategy on this ticker instead."
+    )
+
+
+class BatchInput(BaseModel):
+    items: list[BatchItem]
+
+
+class BatchResult(BaseModel):
+    index: int
+    prompt: str
+    ticker: Optional[str] = None
+    task_id: Optional[str] = None
+    status: str
+    stage: Optional[str] = None
+    message: Optional[str] = None
+    kpis: Optional[dict] = None
+    elapsed: float
+
+
+class BatchEvent(BaseModel):
+    result: Optional[BatchResult] = None
+    summary: Optional[str] = None
+
+
+class BatchReport(BaseModel):
+    results: list[BatchResult]
+    summary: str
+
+
+SUMMARY_COLUMNS = (
+    ("total_return", "Return %"),
+    ("sharpe_ratio", "Sharpe"),
+    ("max_drawdown", "Max DD %"),
+    ("win_rate", "Win %"),
+    ("total_trades", "Trades"),
+)
+
+
+def _cell(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return "" if value is None else str(value)
+
+
+def summary_table(results: list[BatchResult], elapsed: float) -> str:
+    """Markdown table of the batch, in input order."""
+    header = ["#", "Ticker", "Status"] + [title for _, title in SUMMARY_COLUMNS]
+    lines = [
+        "| " + " | ".join(header) + " |",
+        "|" + "---|" * len(header),
+    ]
+    for result in sorted(results, key=lambda r: r.index):
+        kpis = result.kpis or {}
+        status = result.status if result.stage is None else f"failed ({result.stage})"
+        row = [str(result.index), result.ticker or "", status]
+        row += [_cell(kpis.get(key)) for key, _ in SUMMARY_COLUMNS]
+        lines.append("| " + " | ".join(row) + " |")
+    succeeded = sum(r.status == "success" for r in results)
+    lines.append("")
+    lines.append(f"{succeeded}/{len(results)} succeeded in {elapsed:.1f}s")
+    return "\n".join(lines)
+
+
+@register_function(config_type=BatchEvaluateConfig)
+async def batch_evaluate(config: BatchEvaluateConfig, builder: Builder):
+
+    task_register = builder.get_function(config.task_register)
+    quick_preview = builder.get_function(config.quick_preview)
+    yh_query_save = builder.get_function(config.yh_query_save)
+    code_generator = builder.get_function(config.code_generator)
+    code_executor = builder.get_function(config.code_executor)
+    # Shared by all concurrent batches so the limits hold process-wide
+    parse_slots = asyncio.Semaphore(config.parse_concurrency)
+    fetch_slots = asyncio.Semaphore(config.fetch_concurrency)
+    codegen_slots = asyncio.Semaphore(config.codegen_concurrency)
+    execute_slots = asyncio.Semaphore(config.execute_concurrency)
+
+    async def _call(stage: str, slots: asyncio.Semaphore, call) -> dict:
+        try:
+            async with slots:
+                with tracing.span(stage):
+                    return load_output(stage, await call)
+        finally:
+            # A call cancelled while waiting for its slot was never started
+            call.close()
+
+    @tracing.traced(name="batch_item")
+    async def _evaluate(index: int, item: BatchItem) -> BatchResult:
+        start = time.perf_counter()
+        task_id, ticker = None, item.ticker
+        try:
+            task = await _call(
+                "task_register",
+                parse_slots,
+                task_register.acall_invoke(user_prompt=item.prompt),
+            )
+            task_id = task["task_id"]
+            preview = await _call(
+                "quick_preview",
+                parse_slots,
+                quick_preview.acall_invoke(user_prompt=item.prompt),
+            )
+            ticker = item.ticker or preview.get("ticker")
+            if not ticker:
+                raise StageError("quick_preview", "Not a recognizable trading strategy")
+            window = {
+                "ticker": ticker,
+                "time_frame": preview.get("time_frame", "1d"),
+                "start_date": preview["start_date"],
+                "end_date": preview["end_date"],
+            }
+            await gather_stages(
+                _call(
+                    "yh_query_save",
+                    fetch_slots,
+                    yh_query_save.acall_invoke(task_id=task_id, **window),
+                ),
+                _call(
+                    "code_generator",
+                    codegen_slots,
+                    code_generator.acall_invoke(
+                        task_id=task_id, user_prompt=item.prompt, **window
+                    ),
+                ),
+            )
+            executed = await _call(
+                "code_executor",
+                execute_slots,
+                code_executor.acall_invoke(task_id=task_id),
+            )
+            return BatchResult(
+                index=index,
+                prompt=item.prompt,
+                ticker=ticker,
+                task_id=task_id,
+                status="success",
+                kpis=(executed.get("output") or {}).get("kpis"),
+                elapsed=round(time.perf_counter() - start, 3),
+            )
+        except Exception as e:
+            stage = e.stage if isinstance(e, StageError) else None
+            logger.warning(f"Batch item {index} failed at {stage}: {e}")
+            return BatchResult(
+                index=index,
+                prompt=item.prompt,
+                ticker=ticker,
+                task_id=task_id,
+                status="failed",
+                stage=stage or "unknown",
+                message=str(e),
+                elapsed=round(time.perf_counter() - start, 3),
+            )
+
+    async def _stream(batch: BatchInput) -> AsyncGenerator[BatchEvent, None]:
+        """
+        Backtest every item in the batch, yielding each result as it finishes and a summary table last.
+        """
+        if len(batch.items) > config.max_items:
+            yield BatchEvent(
+                summary=f"Batch of {len(batch.items)} exceeds the limit of {config.max_items} items"
+            )
+            return
+        start = time.perf_counter()
+        pending = [
+            asyncio.ensure_future(_evaluate(index, item))
+            for index, item in enumerate(batch.items)
+        ]
+        results = []
+        try:
+            for finished in asyncio.as_completed(pending):
+                result = await finished
+                results.append(result)
+                yield BatchEvent(result=result)
+        finally:
+            # A disconnected client cancels the remaining work
+            for task in pending:
+                task.cancel()
+        yield BatchEvent(summary=summary_table(results, time.perf_counter() - start))
+
+    async def _single(batch: BatchInput) -> BatchReport:
+        """
+        Backtest every item in the batch and return all results with a summary table.
+        """
+        results, summary = [], ""
+        async for event in _stream(batch):
+            if event.result is not None:
+                results.append(event.result)
+            if event.summary is not None:
+                summary = event.summary
+        return BatchReport(
+            results=sorted(results, key=lambda r: r.index), summary=summary
+        )
+
+    yield FunctionInfo.create(
+        single_fn=_single,
+        stream_fn=_stream,
+        description=config.description,
+    )
@@ -0,0 +1,150 @@
+import re
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable, Optional
+
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(text: str) -> str:
+    """Lowercase and collapse whitespace so trivially different prompts share a key."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def day_bucket() -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+class ResponseCache:
+    """
+    Redis-backed cache for LLM responses.
+
+    Entries live under ``{namespace}:{sha256}`` with a TTL; a sorted set indexes
+    them by insertion time so the oldest are evicted once ``max_entries`` is
+    exceeded. Concurrent lookups for the same key share one computation.
+    Redis errors never fail a request, the cache is simply bypassed.
+    """
+
+    def __init__(
+        self,
+        redis: aioredis.Redis,
+        namespace: str,
+        ttl: int = 86400,
+        max_entries: int = 10000,
+    ):
+        self.redis = redis
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @property
+    def index_key(self) -> str:
+        return f"{self.namespace}:index"
+
+    @property
+    def stats_key(self) -> str:
+        return f"{self.namespace}:stats"
+
+    def key(self, *parts: str) -> str:
+        digest = hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+        return f"{self.namespace}:{digest}"
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+    async def shared_stats(self) -> dict:
+        """Hit/miss counters aggregated across all processes sharing the Redis."""
+        stats = await self.redis.hgetall(self.stats_key)
+        return {name: int(value) for name, value in stats.items()}
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            return await self.redis.get(key)
+        except Exception as e:
+            logger.warning(f"Cache lookup failed for {key}: {e}")
+            return None
+
+    async def set(self, key: str, value: str):
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(key, value, ex=self.ttl)
+                pipe.zadd(self.index_key, {key: time.time()})
+                # Drop index entries whose value has already expired
+                pipe.zremrangebyscore(self.index_key, 0, time.time() - self.ttl)
+                pipe.zcard(self.index_key)
+                *_, size = await pipe.execute()
+            if size > self.max_entries:
+                evicted = await self.redis.zpopmin(
+                    self.index_key, size - self.max_entries
+                )
+                if evicted:
+                    await self.redis.delete(*[name for name, _ in evicted])
+        except Exception as e:
+            logger.warning(f"Cache store failed for {key}: {e}")
+
+    async def _count(self, field: str):
+        setattr(self, field, getattr(self, field) + 1)
+        try:
+            await self.redis.hincrby(self.stats_key, field, 1)
+        except Exception:
+            pass
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[str]],
+        cacheable: Callable[[str], bool] = bool,
+    ) -> str:
+        """
+        Return the cached value for ``key`` or compute, store and return it.
+        Values rejected by ``cacheable`` are returned but not stored.
+        """
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            await self._count("coalesced")
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling() or not inflight.cancelled():
+                    raise
+                # Only the caller computing it was cancelled; compute it here
+                return await self.get_or_compute(key, compute, cacheable)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self.get(key)
+            if value is not None:
+                await self._count("hits")
+            else:
+                await self._count("misses")
+                value = await compute()
+                if cacheable(value):
+                    await self.set(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unobserved failure does not warn
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+            logger.debug(f"Cache {self.namespace} stats: {self.stats()}")
@@ -0,0 +1,176 @@
+import re
+import json
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, Optional
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+# Shared per model name, so every function using a model shares its limits
+_semaphores: dict[str, asyncio.Semaphore] = {}
+_latencies: dict[str, "LatencyTracker"] = {}
+
+
+class LLMCallError(Exception):
+    """Raised when no attempt produced a valid response before the deadline."""
+
+
+class LLMPolicyConfig(BaseModel):
+    """Call policy fields shared by the functions that use ResilientLLM."""
+
+    llm_timeout: float = Field(
+        default=60.0, description="Deadline in seconds for a call including retries."
+    )
+    llm_retries: int = Field(default=2, description="Retries after a failed attempt.")
+    llm_max_concurrency: int = Field(
+        default=8, description="Concurrent requests per model."
+    )
+    llm_hedge: bool = Field(
+        default=True, description="Send a duplicate request after the p95 latency."
+    )
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies."""
+
+    def __init__(self, size: int = 200):
+        self.samples = deque(maxlen=size)
+
+    def add(self, latency: float):
+        self.samples.append(latency)
+
+    def percentile(self, q: float, min_samples: int = 20) -> Optional[float]:
+        if len(self.samples) < min_samples:
+            return None
+        values = sorted(self.samples)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def repair_json(content: str) -> str:
+    """
+    Cheap fixes for common LLM JSON slips: markdown fences, text around the
+    object and trailing commas. Returns the input unchanged if it already parses.
+    """
+    try:
+        json.loads(content)
+        return content
+    except (TypeError, ValueError):
+        pass
+    text = content.strip().lstrip("\ufeff")
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.S)
+    if fenced:
+        text = fenced.group(1).strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        text = text[start : end + 1]
+    return re.sub(r",\s*([}\]])", r"\1", text)
+
+
+class ResilientLLM:
+    """
+    Wraps a LangChain chat model with a per-model concurrency limit, an overall
+    deadline, retries with jittered exponential backoff, a hedged duplicate
+    request once the primary exceeds the model's recent p95 latency, and JSON
+    repair plus validation before a response is accepted.
+    """
+
+    def __init__(
+        self,
+        llm,
+        model: str,
+        validate: Optional[Callable[[str], bool]] = None,
+        max_concurrency: int = 8,
+        timeout: float = 60.0,
+        retries: int = 2,
+        backoff: float = 0.5,
+        hedge: bool = True,
+    ):
+        self.llm = llm
+        self.model = model
+        self.validate = validate
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.semaphore = _semaphores.setdefault(
+            model, asyncio.Semaphore(max_concurrency)
+        )
+        self.latency = _latencies.setdefault(model, LatencyTracker())
+
+    def _accept(self, response):
+        if self.validate is None:
+            return response
+        content = repair_json(response.content)
+        if not self.validate(content):
+            raise ValueError(f"Invalid response from {self.model}: {response.content[:200]}")
+        response.content = content
+        return response
+
+    async def _call(self, prompt):
+        async with self.semaphore:
+            start = time.perf_counter()
+            response = await self.llm.ainvoke(prompt)
+            self.latency.add(time.perf_counter() - start)
+            return self._accept(response)
+
+    async def _hedged(self, prompt):
+        attempts = {asyncio.ensure_future(self._call(prompt))}
+        try:
+            delay = self.latency.percentile(0.95) if self.hedge else None
+            if delay is not None:
+                done, _ = await asyncio.wait(attempts, timeout=delay)
+                # Do not hedge into a saturated model
+                if not done and not self.semaphore.locked():
+                    logger.info(f"Hedging {self.model} request after {delay:.2f}s")
+                    attempts.add(asyncio.ensure_future(self._call(prompt)))
+            error = None
+            while attempts:
+                done, attempts = await asyncio.wait(
+                    attempts, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    async def ainvoke(self, prompt):
+        deadline = time.monotonic() + self.timeout
+        error: Optional[BaseException] = None
+        for attempt in range(self.retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                return await asyncio.wait_for(self._hedged(prompt), remaining)
+            except asyncio.TimeoutError as e:
+                error = e
+                break
+            except Exception as e:
+                error = e
+                logger.warning(
+                    f"{self.model} attempt {attempt + 1}/{self.retries + 1} failed: {e}"
+                )
+            # Full jitter keeps retries from concurrent callers apart
+            pause = random.uniform(0, self.backoff * 2**attempt)
+            await asyncio.sleep(min(pause, max(0.0, deadline - time.monotonic())))
+        raise LLMCallError(f"{self.model} gave no valid response: {error!r}")
+
+
+def resilient(llm, model: str, policy: LLMPolicyConfig, validate=None) -> ResilientLLM:
+    return ResilientLLM(
+        llm,
+        model=model,
+        validate=validate,
+        max_concurrency=policy.llm_max_concurrency,
+        timeout=policy.llm_timeout,
+        retries=policy.llm_retries,
+        hedge=policy.llm_hedge,
+    )
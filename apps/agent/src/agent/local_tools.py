@@ -0,0 +1,119 @@
+import logging
+from typing import Optional
+from pydantic import Field
+
+from nat.builder.builder import Builder
+from nat.cli.register_workflow import register_function
+from nat.data_models.function import FunctionBaseConfig
+from nat.builder.function_info import FunctionInfo
+from agent.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class MCPLocalToolConfig(FunctionBaseConfig, name="mcp_local_tool"):
+    """
+    Calls an MCP server tool implementation in-process instead of over HTTP+SSE.
+    For single-host deployments where the agent can reach the server's Redis.
+    """
+
+    tool_name: str = Field(
+        description="One of task_register, yh_query_save, code_executor, robustness_check."
+    )
+    description: Optional[str] = Field(
+        default=None, description="Override the tool description."
+    )
+
+
+def bind_tools(tools, redis) -> dict:
+    """The MCP tool signatures, bound to the given Redis client."""
+
+    async def task_register(user_prompt: str, traceparent: Optional[str] = None) -> dict:
+        """Register a task with the user_prompt, return a task UUID if succeeded."""
+        return await tools.task_register(redis, user_prompt, traceparent=traceparent)
+
+    async def yh_query_save(
+        task_id: str,
+        ticker: str,
+        time_frame: str,
+        start_date: str,
+        end_date: str,
+        traceparent: Optional[str] = None,
+    ) -> dict:
+        """Query Yahoo Finance and save the data, return storage key if succeeded."""
+        return await tools.yh_query_save(
+            redis,
+            task_id,
+            ticker,
+            time_frame,
+            start_date,
+            end_date,
+            traceparent=traceparent,
+        )
+
+    async def code_executor(
+        task_id: str,
+        storage_keys: Optional[list[str]] = None,
+        weights: Optional[dict[str, float]] = None,
+        rebalance: str = "none",
+        profile: Optional[str] = None,
+        traceparent: Optional[str] = None,
+    ) -> dict:
+        """Execute the generated code and return the output.
+
+        Pass storage_keys from several yh_query_save calls to backtest the strategy
+        on a portfolio with shared cash. weights maps ticker to target weight
+        (equal weight if omitted), rebalance is one of none/weekly/monthly/quarterly.
+        profile (deterministic or sampling) adds a hot-spot report to the output.
+        """
+        return await tools.code_executor(
+            redis,
+            task_id,
+            storage_keys,
+            weights,
+            rebalance,
+            profile,
+            traceparent=traceparent,
+        )
+
+    async def robustness_check(
+        task_id: str,
+        method: str = "bootstrap",
+        samples: int = 2000,
+        seed: int = 42,
+        traceparent: Optional[str] = None,
+    ) -> dict:
+        """Resample an executed backtest and return confidence intervals.
+
+        method is bootstrap (per-bar returns), trade_bootstrap or trade_shuffle
+        (closed trades). Results are reproducible for a given seed.
+        """
+        return await tools.robustness_check(
+            redis, task_id, method, samples, seed, traceparent=traceparent
+        )
+
+    return {
+        "task_register": task_register,
+        "yh_query_save": yh_query_save,
+        "code_executor": code_executor,
+        "robustness_check": robustness_check,
+    }
+
+
+@register_function(config_type=MCPLocalToolConfig)
+async def mcp_local_tool(config: MCPLocalToolConfig, builder: Builder):
+    # Imported here so wire-only deployments do not load the server's dependencies
+    from mcp_server import k8s, tools
+    from mcp_server.config import settings
+
+    bound = bind_tools(tools, redis_client)
+    if config.tool_name not in bound:
+        raise ValueError(
+            f"Unknown tool {config.tool_name}, expected one of {sorted(bound)}"
+        )
+    if config.tool_name == "code_executor" and settings.job_runner_mode == "job":
+        k8s.init_k8s_client(logger=logger)
+    fn = bound[config.tool_name]
+    logger.info(f"Configured in-process tool: {config.tool_name}")
+
+    yield FunctionInfo.from_fn(fn, description=config.description or fn.__doc__)
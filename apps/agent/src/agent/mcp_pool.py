@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import random
+from datetime import timedelta
+from typing import Optional
+from pydantic import BaseModel, Field, HttpUrl
+
+import anyio
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED, TextContent
+
+from nat.builder.builder import Builder
+from nat.cli.register_workflow import register_function
+from nat.data_models.function import FunctionBaseConfig
+from nat.builder.function_info import FunctionInfo
+from nat.tool.mcp.mcp_client import model_from_mcp_schema
+from mcp_server import tracing
+
+logger = logging.getLogger(__name__)
+
+# Raised when a request cannot be written to a dead session
+SEND_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError, ConnectionError)
+# One pool per server URL, shared by every pooled tool pointing at it
+_pools: dict[str, "MCPSessionPool"] = {}
+
+
+class MCPPooledToolConfig(FunctionBaseConfig, name="mcp_pooled_tool"):
+    """
+    Same as mcp_tool_wrapper, but calls go over long-lived, initialized MCP
+    sessions shared by all pooled tools of a server instead of a new SSE
+    connection per call.
+    """
+
+    url: HttpUrl = Field(description="The URL of the MCP server.")
+    mcp_tool_name: str = Field(description="The name of the tool served by the MCP server.")
+    description: Optional[str] = Field(
+        default=None, description="Override the tool description."
+    )
+    return_exception: bool = Field(
+        default=True, description="Return the error message instead of raising."
+    )
+    pool_size: int = Field(default=4, description="Open sessions per server.")
+    ping_interval: float = Field(
+        default=30.0, description="Seconds between health check pings per session."
+    )
+    call_timeout: float = Field(
+        default=600.0, description="Read timeout in seconds for a single tool call."
+    )
+
+
+class _PooledSession:
+    """
+    One MCP session kept open by its own task. The SSE transport runs in an
+    anyio task group, so it has to be entered and exited by the same task.
+    """
+
+    def __init__(self, pool: "MCPSessionPool", index: int):
+        self.pool = pool
+        self.index = index
+        self.session: Optional[ClientSession] = None
+        self.in_flight = 0
+        self.ready = asyncio.Event()
+        self._broken = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def mark_broken(self):
+        self.ready.clear()
+        self._broken.set()
+
+    async def _run(self):
+        failures = 0
+        while True:
+            try:
+                async with sse_client(url=self.pool.url) as (read, write):
+                    async with ClientSession(read, write) as session:
+                        await session.initialize()
+                        self.session = session
+                        self._broken.clear()
+                        self.ready.set()
+                        failures = 0
+                        logger.info(f"MCP session {self.index} to {self.pool.url} is ready")
+                        await self._watch(session)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"MCP session {self.index} to {self.pool.url} failed: {e}")
+            finally:
+                self.session = None
+                self.ready.clear()
+            failures += 1
+            # Jittered exponential backoff so sessions do not reconnect in lockstep
+            await asyncio.sleep(random.uniform(0, min(30.0, 0.5 * 2**failures)))
+
+    async def _watch(self, session: ClientSession):
+        """Ping while idle; returns when the session should be replaced."""
+        while True:
+            try:
+                await asyncio.wait_for(self._broken.wait(), self.pool.ping_interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await asyncio.wait_for(session.send_ping(), self.pool.ping_timeout)
+            except Exception as e:
+                logger.warning(f"MCP session {self.index} failed its health check: {e!r}")
+                return
+
+    async def close(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+
+class MCPSessionPool:
+    """Initialized MCP sessions to one server; calls go to the least busy one."""
+
+    def __init__(
+        self,
+        url: str,
+        size: int = 4,
+        ping_interval: float = 30.0,
+        ping_timeout: float = 10.0,
+        connect_timeout: float = 30.0,
+    ):
+        self.url = url
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.connect_timeout = connect_timeout
+        self.users = 0
+        self.sessions = [_PooledSession(self, i) for i in range(size)]
+
+    async def _acquire(self) -> _PooledSession:
+        ready = [s for s in self.sessions if s.ready.is_set()]
+        if not ready:
+            waits = [asyncio.ensure_future(s.ready.wait()) for s in self.sessions]
+            try:
+                await asyncio.wait(
+                    waits,
+                    timeout=self.connect_timeout,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+            finally:
+                for wait in waits:
+                    wait.cancel()
+            ready = [s for s in self.sessions if s.ready.is_set()]
+            if not ready:
+                raise ConnectionError(f"No MCP session to {self.url} is available")
+        return min(ready, key=lambda s: s.in_flight)
+
+    async def request(self, method: str, *args, **kwargs):
+        """
+        Run ``ClientSession.<method>`` on a pooled session. A broken session is
+        handed back for reconnect; the call is retried once on another session
+        only if it could not be sent, so a tool never runs twice.
+        """
+        for attempt in range(2):
+            pooled = await self._acquire()
+            pooled.in_flight += 1
+            try:
+                return await getattr(pooled.session, method)(*args, **kwargs)
+            except SEND_ERRORS as e:
+                logger.warning(f"MCP session {pooled.index} to {self.url} broke: {e!r}")
+                pooled.mark_broken()
+                if attempt:
+                    raise
+            except McpError as e:
+                if e.error.code == CONNECTION_CLOSED:
+                    pooled.mark_broken()
+                raise
+            finally:
+                pooled.in_flight -= 1
+
+    async def close(self):
+        await asyncio.gather(*(s.close() for s in self.sessions))
+
+
+def get_pool(url: str, size: int, ping_interval: float) -> MCPSessionPool:
+    pool = _pools.get(url)
+    if pool is None:
+        pool = _pools[url] = MCPSessionPool(url, size=size, ping_interval=ping_interval)
+    pool.users += 1
+    return pool
+
+
+async def release_pool(pool: MCPSessionPool):
+    pool.users -= 1
+    if pool.users <= 0:
+        _pools.pop(pool.url, None)
+        await pool.close()
+
+
+def _text(result) -> str:
+    output = []
+    for content in result.content:
+        if isinstance(content, TextContent):
+            output.append(content.text)
+        else:
+            logger.warning(f"Got non-text output of type {type(content)}")
+    return "\n".join(output)
+
+
+@register_function(config_type=MCPPooledToolConfig)
+async def mcp_pooled_tool(config: MCPPooledToolConfig, builder: Builder):
+
+    pool = get_pool(str(config.url), config.pool_size, config.ping_interval)
+    try:
+        listed = await pool.request("list_tools")
+        tool = next((t for t in listed.tools if t.name == config.mcp_tool_name), None)
+        if tool is None:
+            raise ValueError(f"Tool {config.mcp_tool_name} not found at {config.url}")
+        input_schema = model_from_mcp_schema(tool.name, tool.inputSchema)
+        read_timeout = timedelta(seconds=config.call_timeout)
+        # Servers that accept a traceparent argument get the caller's trace context
+        propagate = "traceparent" in input_schema.model_fields
+        logger.info(f"Configured pooled tool: {tool.name} from MCP server at {config.url}")
+
+        def _convert_from_str(input_str: str) -> input_schema:
+            return input_schema.model_validate_json(input_str)
+
+        async def _response_fn(tool_input: BaseModel | None = None, **kwargs) -> str:
+            try:
+                if tool_input:
+                    args = tool_input.model_dump()
+                else:
+                    # Optional server arguments come through as non-nullable fields
+                    args = {k: v for k, v in kwargs.items() if v is not None}
+                    input_schema.model_validate(args)
+                with tracing.span("mcp_call", tool=tool.name):
+                    if propagate and not args.get("traceparent"):
+                        args["traceparent"] = tracing.current_traceparent()
+                    result = await pool.request(
+                        "call_tool", tool.name, args, read_timeout_seconds=read_timeout
+                    )
+                return _text(result)
+            except Exception as e:
+                if config.return_exception:
+                    logger.warning(f"Error calling tool {tool.name}: {e!r}")
+                    return str(e)
+                raise
+
+        yield FunctionInfo.create(
+            single_fn=_response_fn,
+            description=config.description or tool.description or f"MCP Tool {tool.name}",
+            input_schema=input_schema,
+            converters=[_convert_from_str],
+        )
+    finally:
+        await release_pool(pool)
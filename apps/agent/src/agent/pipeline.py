@@ -0,0 +1,206 @@
+import json
+import time
+import asyncio
+import logging
+from typing import Optional
+from pydantic import Field
+
+from nat.builder.builder import Builder
+from nat.cli.register_workflow import register_function
+from nat.data_models.function import FunctionBaseConfig
+from nat.data_models.component_ref import FunctionRef, LLMRef
+from nat.builder.function_info import FunctionInfo
+from nat.builder.framework_enum import LLMFrameworkEnum
+from agent.prompts import analysis_prompt
+from agent.redis import redis_client
+from agent.usage import invoke_with_usage
+from mcp_server import tracing
+
+logger = logging.getLogger(__name__)
+
+
+class QuantPipelineConfig(FunctionBaseConfig, name="quant_pipeline"):
+    """
+    Runs the backtest workflow as a fixed DAG instead of an LLM-orchestrated loop:
+    task_register -> quick_preview -> (yh_query_save || code_generator) ->
+    code_executor -> robustness_check -> analysis.
+    """
+
+    llm_name: LLMRef = Field(description="LLM used for the final analysis.")
+    task_register: FunctionRef = Field(default="task_register")
+    quick_preview: FunctionRef = Field(default="quick_preview")
+    yh_query_save: FunctionRef = Field(default="yh_query_save")
+    code_generator: FunctionRef = Field(default="code_generator")
+    code_executor: FunctionRef = Field(default="code_executor")
+    robustness_check: Optional[FunctionRef] = Field(
+        default="robustness_check",
+        description="Set to null to skip the robustness check.",
+    )
+
+
+class StageError(Exception):
+    def __init__(self, stage: str, message: str):
+        super().__init__(message)
+        self.stage = stage
+
+
+def load_output(stage: str, output) -> dict:
+    """Tool outputs are JSON strings (MCP tools) or dicts (local functions)."""
+    if isinstance(output, dict):
+        result = output
+    else:
+        try:
+            result = json.loads(output)
+        except (TypeError, ValueError):
+            raise StageError(stage, str(output))
+    if not isinstance(result, dict):
+        raise StageError(stage, f"Unexpected output: {output}")
+    if result.get("status") == "failed" or "error" in result:
+        raise StageError(stage, result.get("message") or result.get("error") or "failed")
+    return result
+
+
+async def gather_stages(*stages):
+    """
+    Like asyncio.gather, but the first failing stage cancels the others, so a
+    failed fetch does not leave code generation spending tokens on a dead task.
+    """
+    tasks = [asyncio.ensure_future(stage) for stage in stages]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+@register_function(
+    config_type=QuantPipelineConfig, framework_wrappers=[LLMFrameworkEnum.LANGCHAIN]
+)
+async def quant_pipeline(config: QuantPipelineConfig, builder: Builder):
+
+    llm = await builder.get_llm(
+        config.llm_name, wrapper_type=LLMFrameworkEnum.LANGCHAIN
+    )
+    task_register = builder.get_function(config.task_register)
+    quick_preview = builder.get_function(config.quick_preview)
+    yh_query_save = builder.get_function(config.yh_query_save)
+    code_generator = builder.get_function(config.code_generator)
+    code_executor = builder.get_function(config.code_executor)
+    robustness_check = (
+        builder.get_function(config.robustness_check)
+        if config.robustness_check
+        else None
+    )
+
+    async def _stage(stage: str, timings: dict, call) -> dict:
+        start = time.perf_counter()
+        try:
+            with tracing.span(stage):
+                return load_output(stage, await call)
+        except StageError:
+            raise
+        except Exception as e:
+            raise StageError(stage, str(e)) from e
+        finally:
+            timings[stage] = round(time.perf_counter() - start, 3)
+
+    @tracing.traced(name="quant_pipeline")
+    async def _run(input_message: str) -> str:
+        """
+        Backtest the trading strategy described in input_message and return the analysis as JSON.
+        """
+        timings: dict = {}
+        task_id = None
+        try:
+            task = await _stage(
+                "task_register",
+                timings,
+                task_register.acall_invoke(user_prompt=input_message),
+            )
+            task_id = task["task_id"]
+            preview = await _stage(
+                "quick_preview",
+                timings,
+                quick_preview.acall_invoke(user_prompt=input_message),
+            )
+            if not preview.get("ticker"):
+                raise StageError("quick_preview", "Not a recognizable trading strategy")
+
+            window = {
+                "ticker": preview["ticker"],
+                "time_frame": preview.get("time_frame", "1d"),
+                "start_date": preview["start_date"],
+                "end_date": preview["end_date"],
+            }
+            # Data fetch and code generation only depend on the preview
+            _, generated = await gather_stages(
+                _stage(
+                    "yh_query_save",
+                    timings,
+                    yh_query_save.acall_invoke(task_id=task_id, **window),
+                ),
+                _stage(
+                    "code_generator",
+                    timings,
+                    code_generator.acall_invoke(
+                        task_id=task_id, user_prompt=input_message, **window
+                    ),
+                ),
+            )
+            executed = await _stage(
+                "code_executor", timings, code_executor.acall_invoke(task_id=task_id)
+            )
+            robustness = None
+            if robustness_check is not None:
+                try:
+                    robustness = (
+                        await _stage(
+                            "robustness_check",
+                            timings,
+                            robustness_check.acall_invoke(task_id=task_id),
+                        )
+                    ).get("output")
+                except StageError as e:
+                    # The analysis can still be given from the single-path kpis
+                    logger.warning(f"Robustness check failed for {task_id}: {e}")
+
+            start = time.perf_counter()
+            prompt = analysis_prompt.invoke(
+                {
+                    "user_prompt": input_message,
+                    "task_id": task_id,
+                    "logic_summary": json.dumps(generated.get("logic_summary")),
+                    "backtest": json.dumps(executed.get("output")),
+                    "robustness": json.dumps(robustness),
+                }
+            )
+            response = await invoke_with_usage(
+                llm, prompt, "quant_pipeline", redis_client
+            )
+            timings["analysis"] = round(time.perf_counter() - start, 3)
+            logger.info(
+                f"quant_pipeline {task_id} stage timings: {timings} "
+                f"(trace {tracing.current_traceparent()})"
+            )
+            return response.content
+        except StageError as e:
+            logger.warning(
+                f"quant_pipeline {task_id} failed at {e.stage}: {e} (timings: {timings})"
+            )
+            return json.dumps(
+                {
+                    "task_id": task_id,
+                    "status": "failed",
+                    "stage": e.stage,
+                    "message": str(e),
+                }
+            )
+
+    yield FunctionInfo.from_fn(
+        _run,
+        description=(
+            "Backtest a natural language trading strategy end to end and return the analysis."
+        ),
+    )
@@ -0,0 +1,165 @@
+"""
+Measure how well the rule-based preview parser agrees with the LLM.
+
+    python -m agent.preview_eval tests/preview/corpus.jsonl
+    python -m agent.preview_eval tests/preview/corpus.jsonl --record
+
+Each corpus line holds a ``prompt``, the ``current_date`` it was labelled on,
+the ``expected`` preview and who it was ``labelled_by``: "hand", or
+"llm_generic:<model>" once ``--record`` has relabelled it with the live
+``llm_generic`` model (configured by the same LLM_GENERIC_* variables as
+configs/config.yaml). Only recorded labels measure agreement with the LLM;
+hand labels are reported apart, as a regression check of the parser.
+"""
+
+import sys
+import json
+import asyncio
+import argparse
+from datetime import date
+
+from agent.preview_parser import parse_preview
+
+FIELDS = ("ticker", "time_frame", "start_date", "end_date", "indicators")
+
+
+def canonical_indicators(indicators: list) -> list:
+    canonical = []
+    for indicator in indicators or []:
+        params = {
+            key: float(value) if isinstance(value, (int, float)) else value
+            for key, value in (indicator.get("params") or {}).items()
+        }
+        canonical.append(
+            (str(indicator.get("name", "")).upper(), sorted(params.items()))
+        )
+    return sorted(canonical)
+
+
+def field_agrees(field: str, expected: dict, actual: dict) -> bool:
+    if field == "indicators":
+        return canonical_indicators(expected.get(field)) == canonical_indicators(
+            actual.get(field)
+        )
+    if field == "time_frame":
+        # 1m is a minute, 1M a month
+        return expected.get(field) == actual.get(field)
+    return str(expected.get(field, "")).upper() == str(actual.get(field, "")).upper()
+
+
+def evaluate(corpus: list, min_confidence: float) -> dict:
+    answered = 0
+    exact = 0
+    field_hits = dict.fromkeys(FIELDS, 0)
+    disagreements = []
+    for entry in corpus:
+        preview, confidence = parse_preview(
+            entry["prompt"], date.fromisoformat(entry["current_date"])
+        )
+        if preview is None or confidence < min_confidence:
+            continue
+        answered += 1
+        # The LLM gave no usable preview, so nothing the parser says agrees
+        expected = entry["expected"] or {}
+        mismatched = [f for f in FIELDS if not field_agrees(f, expected, preview)]
+        for field in FIELDS:
+            field_hits[field] += field not in mismatched
+        if mismatched:
+            disagreements.append(
+                {
+                    "prompt": entry["prompt"],
+                    "fields": mismatched,
+                    "expected": {f: expected.get(f) for f in mismatched},
+                    "actual": {f: preview.get(f) for f in mismatched},
+                }
+            )
+        else:
+            exact += 1
+    return {
+        "total": len(corpus),
+        "answered": answered,
+        "coverage": answered / len(corpus) if corpus else 0.0,
+        "agreement": exact / answered if answered else 0.0,
+        "field_agreement": {
+            f: hits / answered if answered else 0.0 for f, hits in field_hits.items()
+        },
+        "disagreements": disagreements,
+    }
+
+
+async def record(corpus: list):
+    import os
+    from langchain_openai import ChatOpenAI
+    from agent.prompts import quick_preview_prompt
+
+    model = os.getenv("LLM_GENERIC_MODEL_NAME", "qwen-plus")
+    llm = ChatOpenAI(
+        model=model,
+        api_key=os.getenv("LLM_GENERIC_MODEL_API_KEY"),
+        base_url=os.getenv(
+            "LLM_GENERIC_MODEL_API_ENDPOINT",
+            "https://dashscope.aliyuncs.com/compatible-mode/v1",
+        ),
+        temperature=1,
+        max_tokens=3000,
+    )
+    for entry in corpus:
+        prompt = quick_preview_prompt.invoke(
+            {
+                "user_prompt": entry["prompt"],
+                "current_date": f"{entry['current_date']} 00:00:00",
+            }
+        )
+        response = await llm.ainvoke(prompt)
+        try:
+            entry["expected"] = json.loads(response.content)
+        except json.JSONDecodeError:
+            # quick_preview would reject it too
+            entry["expected"] = None
+            print(f"Not JSON: {response.content!r}", file=sys.stderr)
+        entry["labelled_by"] = f"llm_generic:{model}"
+        print(f"Recorded: {entry['prompt']}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("corpus", help="Path to the JSONL corpus")
+    parser.add_argument("--min-confidence", type=float, default=0.8)
+    parser.add_argument(
+        "--record", action="store_true", help="Relabel the corpus with the LLM"
+    )
+    parser.add_argument("--verbose", action="store_true", help="List disagreements")
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    if args.record:
+        asyncio.run(record(corpus))
+        with open(args.corpus, "w") as f:
+            for entry in corpus:
+                f.write(json.dumps(entry) + "\n")
+
+    groups = {}
+    for entry in corpus:
+        groups.setdefault(entry.get("labelled_by", "hand"), []).append(entry)
+    for labelled_by, entries in sorted(groups.items()):
+        report = evaluate(entries, args.min_confidence)
+        print(
+            f"{labelled_by}: coverage {report['answered']}/{report['total']} "
+            f"({report['coverage']:.0%}), exact agreement {report['agreement']:.0%}"
+        )
+        for field, rate in report["field_agreement"].items():
+            print(f"  {field:<12} {rate:.0%}")
+        if args.verbose:
+            for item in report["disagreements"]:
+                print(json.dumps(item))
+    if "hand" in groups:
+        print(
+            f"{len(groups['hand'])} labels were written by hand and do not measure "
+            "agreement with the LLM; run with --record to label them with llm_generic."
+        )
+
+
+if __name__ == "__main__":
+    main()
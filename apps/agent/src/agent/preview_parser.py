@@ -0,0 +1,469 @@
+"""
+Rule-based fast path for quick_preview.
+
+Mirrors the rules of ``quick_preview_system_prompt`` for the common case: one
+ticker, an optional time frame and date range, and indicators drawn from the
+fixed SMA/EMA/RSI/MACD/BB vocabulary. ``parse_preview`` returns the preview in
+the same JSON shape as the LLM together with a confidence in [0, 1]; callers
+fall back to the LLM when the confidence is below their threshold.
+"""
+
+import re
+from datetime import date, timedelta
+from typing import Optional
+
+# Symbol -> company/index names that refer to it
+TICKERS = {
+    "AAPL": ["apple"],
+    "MSFT": ["microsoft"],
+    "GOOGL": ["google", "alphabet"],
+    "AMZN": ["amazon"],
+    "META": ["facebook"],
+    "TSLA": ["tesla"],
+    "NVDA": ["nvidia"],
+    "NFLX": ["netflix"],
+    "AMD": [],
+    "INTC": ["intel"],
+    "IBM": [],
+    "ORCL": ["oracle"],
+    "JPM": ["jpmorgan", "jp morgan"],
+    "BAC": ["bank of america"],
+    "KO": ["coca-cola", "coca cola"],
+    "DIS": ["disney"],
+    "BA": ["boeing"],
+    "WMT": ["walmart"],
+    "XOM": ["exxon"],
+    "SPY": ["s&p 500", "s&p500", "sp500", "s&p"],
+    "QQQ": ["nasdaq 100", "nasdaq-100", "nasdaq"],
+    "DIA": ["dow jones"],
+    "IWM": ["russell 2000"],
+    "GLD": ["gold etf"],
+    "TLT": [],
+    "BTC-USD": ["bitcoin", "btc"],
+    "ETH-USD": ["ethereum", "eth"],
+}
+
+# Industry-standard defaults, as the prompt instructs the LLM to use
+DEFAULT_PARAMS = {
+    "SMA": {"period": 20},
+    "EMA": {"period": 20},
+    "RSI": {"period": 14},
+    "MACD": {"fast": 12, "slow": 26, "signal": 9},
+    "BB": {"period": 20, "stddev": 2},
+}
+
+# SMA/EMA have no single standard period, so a defaulted one is a guess
+AMBIGUOUS_DEFAULTS = {"SMA", "EMA"}
+
+INDICATOR_ALIASES = [
+    (r"simple moving averages?", "SMA"),
+    (r"exponential moving averages?", "EMA"),
+    (r"moving averages?", "SMA"),
+    (r"bollinger bands?", "BB"),
+    (r"relative strength index", "RSI"),
+    (r"sma", "SMA"),
+    (r"ema", "EMA"),
+    (r"rsi", "RSI"),
+    (r"macd", "MACD"),
+    (r"bb", "BB"),
+    (r"ma", "SMA"),
+]
+INDICATOR_RE = re.compile(
+    r"\b(" + "|".join(alias for alias, _ in INDICATOR_ALIASES) + r")\b", re.I
+)
+
+# Indicators outside the vocabulary; their presence means the LLM should decide
+UNSUPPORTED_RE = re.compile(
+    r"\b(atr|adx|stoch\w*|vwap|obv|ichimoku|fibonacci|cci|williams|parabolic|sar|"
+    r"keltner|donchian|supertrend|momentum|roc|mfi|aroon|dmi|kdj|wma|hma|tema|dema|"
+    r"volume|pairs?|portfolio)\b",
+    re.I,
+)
+
+# Upper-case words that look like symbols but are not
+NOT_TICKERS = {
+    "SMA", "EMA", "RSI", "MACD", "BB", "MA", "AND", "OR", "THE", "ETF", "USD",
+    "ATR", "ADX", "OBV", "VWAP", "CCI", "MFI", "ROC", "SAR", "AI", "API", "US",
+    "I", "A", "BUY", "SELL", "EOD", "YTD",
+}
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+
+TIME_UNITS = {
+    "m": "m", "min": "m", "mins": "m", "minute": "m", "minutes": "m",
+    "h": "h", "hr": "h", "hrs": "h", "hour": "h", "hours": "h",
+    "d": "d", "day": "d", "days": "d",
+    "w": "w", "wk": "w", "week": "w", "weeks": "w",
+    "mo": "M", "month": "M", "months": "M",
+}
+TIME_UNIT_RE = r"(min|mins|minutes?|m|hrs?|hours?|h|days?|d|wk|weeks?|w|months?|mo)"
+# The server's time frames (mcp_server.ticker.interval_timeframe_map): 1w and 1M
+TIME_FRAME_WORDS = {"daily": "1d", "hourly": "1h", "weekly": "1w", "monthly": "1M"}
+
+# Default lookback per time frame unit; daily follows the prompt's one-year rule
+DEFAULT_LOOKBACK = {
+    "m": timedelta(days=30),
+    "h": timedelta(days=180),
+    "d": timedelta(days=365),
+    "w": timedelta(days=5 * 365),
+    "M": timedelta(days=10 * 365),
+}
+
+NUMBER = r"\d+(?:\.\d+)?"
+MAX_PERIOD = 500
+PERIOD_UNIT = r"(?:-|\s)?(?:day|week|period|bar|candle|length)s?"
+
+
+class _Text:
+    """Prompt text plus the character spans already explained by a rule."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.consumed: list[tuple[int, int]] = []
+
+    def consume(self, start: int, end: int):
+        self.consumed.append((start, end))
+
+    def is_consumed(self, start: int, end: int) -> bool:
+        return any(s <= start and end <= e for s, e in self.consumed)
+
+    def finditer(self, pattern: str, flags: int = re.I):
+        for match in re.finditer(pattern, self.text, flags):
+            if not self.is_consumed(*match.span()):
+                yield match
+
+    def unexplained_numbers(self) -> list[str]:
+        return [
+            m.group(0)
+            for m in re.finditer(NUMBER, self.text)
+            if not self.is_consumed(*m.span())
+        ]
+
+
+def _shift_months(day: date, months: int) -> date:
+    month = day.month - 1 - months
+    year = day.year + month // 12
+    month = month % 12 + 1
+    # Clamp to the last valid day of the target month
+    for d in range(day.day, 27, -1):
+        try:
+            return day.replace(year=year, month=month, day=d)
+        except ValueError:
+            continue
+    return day.replace(year=year, month=month, day=min(day.day, 28))
+
+
+def _lookback(end: date, count: int, unit: str) -> date:
+    if unit == "wk":
+        return end - timedelta(weeks=count)
+    if unit == "mo":
+        return _shift_months(end, count)
+    if unit == "y":
+        return _shift_months(end, 12 * count)
+    return end - timedelta(days=count)
+
+
+def _number(value: str):
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+def _parse_ticker(text: _Text) -> tuple[Optional[str], float]:
+    found: dict[str, float] = {}
+    for match in text.finditer(r"\$?\b([A-Z]{1,5}(?:-USD)?)\b", flags=0):
+        symbol = match.group(1)
+        if symbol in NOT_TICKERS:
+            continue
+        if symbol in TICKERS or match.group(0).startswith("$"):
+            found[symbol] = 1.0
+        elif len(symbol) >= 2:
+            found.setdefault(symbol, 0.8)
+        text.consume(*match.span())
+    for symbol, names in TICKERS.items():
+        # Lower-case symbols only when long enough not to be ordinary words
+        if len(symbol) >= 3:
+            names = [symbol.lower(), *names]
+        for name in names:
+            for match in text.finditer(r"\b" + re.escape(name) + r"\b"):
+                found[symbol] = 1.0
+                text.consume(*match.span())
+    if len(found) != 1:
+        return None, 0.0
+    return next(iter(found.items()))
+
+
+def _parse_time_frame(text: _Text) -> tuple[str, float]:
+    patterns = [
+        rf"\b(\d+)[\s-]*{TIME_UNIT_RE}\b[\s-]*(?:as\s+(?:the\s+|a\s+)?)?(?:time\s*frame|interval|bars?|candles?|candlesticks?|charts?)",
+        rf"\b(?:time\s*frame|interval)\s*(?:of|=|:|is)?\s*(\d+)\s*{TIME_UNIT_RE}\b",
+    ]
+    for pattern in patterns:
+        for match in text.finditer(pattern):
+            text.consume(*match.span())
+            return f"{match.group(1)}{TIME_UNITS[match.group(2).lower()]}", 1.0
+    for word, time_frame in TIME_FRAME_WORDS.items():
+        pattern = rf"\b{word}\s+(?:time\s*frame|interval|bars?|candles?|charts?|data|prices?)\b"
+        for match in text.finditer(pattern):
+            text.consume(*match.span())
+            return time_frame, 1.0
+    if re.search(r"\bintraday\b", text.text, re.I):
+        return "1h", 0.5
+    return "1d", 1.0
+
+
+def _parse_dates(
+    text: _Text, time_frame: str, today: date
+) -> tuple[str, str, float]:
+    end = today
+    iso = list(text.finditer(r"\b(\d{4}-\d{2}-\d{2})\b"))
+    for match in iso:
+        text.consume(*match.span())
+    if len(iso) >= 2:
+        return iso[0].group(1), iso[1].group(1), 1.0 if len(iso) == 2 else 0.5
+    if len(iso) == 1:
+        before = text.text[: iso[0].start()].lower()
+        if re.search(r"\b(until|to|through|till|ending)\s*$", before):
+            end = date.fromisoformat(iso[0].group(1))
+        else:
+            return iso[0].group(1), today.isoformat(), 1.0
+
+    year = r"((?:19|20)\d{2})"
+    for match in text.finditer(
+        rf"\b(?:from\s+|between\s+)?{year}\s*(?:-|–|to|through|until|and)\s*{year}\b"
+    ):
+        text.consume(*match.span())
+        last = min(date(int(match.group(2)), 12, 31), today)
+        return f"{match.group(1)}-01-01", last.isoformat(), 1.0
+    for match in text.finditer(rf"\b(?:since|from|starting(?:\s+in)?)\s+{year}\b"):
+        text.consume(*match.span())
+        return f"{match.group(1)}-01-01", end.isoformat(), 1.0
+    for match in text.finditer(rf"\b(?:in|during|for)\s+{year}\b"):
+        text.consume(*match.span())
+        last = min(date(int(match.group(1)), 12, 31), today)
+        return f"{match.group(1)}-01-01", last.isoformat(), 1.0
+
+    count = r"(\d+|" + "|".join(NUMBER_WORDS) + r")"
+    for match in text.finditer(
+        rf"\b(?:(?:last|past|previous|over)\s+(?:the\s+)?)?{count}?[\s-]*"
+        r"(years?|yrs?|y|months?|mos?|weeks?|wks?|days?)\b(?:\s+of\s+(?:data|history))?"
+    ):
+        phrase = match.group(0).lower()
+        unit = match.group(2).lower()
+        # A bare "2 days" is more likely a holding period than a range
+        if not re.match(r"(last|past|previous|over)\b", phrase) and not unit.startswith("y"):
+            continue
+        value = (match.group(1) or "1").lower()
+        n = NUMBER_WORDS.get(value) or int(value)
+        unit = {"mo": "mo", "we": "wk", "wk": "wk", "da": "d"}.get(unit[:2], "y")
+        text.consume(*match.span())
+        return _lookback(end, n, unit).isoformat(), end.isoformat(), 1.0
+
+    unit = re.sub(r"\d+", "", time_frame)
+    start = end - DEFAULT_LOOKBACK.get(unit, DEFAULT_LOOKBACK["d"])
+    return start.isoformat(), end.isoformat(), 1.0
+
+
+def _indicator_name(alias: str) -> str:
+    for candidate in (alias, alias[:-1]):
+        for pattern, name in INDICATOR_ALIASES:
+            if re.fullmatch(pattern, candidate, re.I):
+                return name
+    raise KeyError(alias)
+
+
+def _parse_indicators(text: _Text) -> tuple[list[dict], float]:
+    indicators: list[tuple[str, dict, bool]] = []
+    confidence = 1.0
+    source = text.text
+
+    # "50/200 MA crossover", "10 and 30 day EMAs"
+    pair = (
+        rf"\b(\d+)\s*(?:/|and|&)\s*(\d+)(?:{PERIOD_UNIT})?[\s-]*"
+        r"(simple moving averages?|exponential moving averages?|moving averages?|smas?|emas?|mas?)\b"
+    )
+    for match in text.finditer(pair):
+        name = _indicator_name(match.group(3))
+        for value in match.group(1, 2):
+            indicators.append((name, {"period": int(value)}, True))
+        text.consume(*match.span())
+    for match in text.finditer(r"\b(golden|death)\s+cross\b"):
+        indicators.append(("SMA", {"period": 50}, True))
+        indicators.append(("SMA", {"period": 200}, True))
+        text.consume(*match.span())
+
+    for match in INDICATOR_RE.finditer(source):
+        if text.is_consumed(*match.span()):
+            continue
+        name = _indicator_name(match.group(1))
+        params = dict(DEFAULT_PARAMS[name])
+        explicit = False
+        text.consume(*match.span())
+        before, after = source[: match.start()], source[match.end() :]
+
+        left = re.search(rf"(\d+){PERIOD_UNIT}?[\s-]*$", before, re.I)
+        if left and (name == "MACD" or int(left.group(1)) > MAX_PERIOD):
+            left = None
+        if left:
+            params["period"] = int(left.group(1))
+            explicit = True
+            text.consume(left.start(), match.start())
+
+        offset = tail = match.end()
+        if name == "MACD":
+            right = re.match(
+                r"\s*\(?\s*(\d+)\s*[,/\s]\s*(\d+)\s*[,/\s]\s*(\d+)\s*\)?", after
+            )
+            if right:
+                params = {
+                    "fast": int(right.group(1)),
+                    "slow": int(right.group(2)),
+                    "signal": int(right.group(3)),
+                }
+                explicit = True
+                tail = offset + right.end()
+                text.consume(offset, tail)
+        elif name == "BB":
+            right = re.match(
+                rf"\s*\(\s*(\d+)\s*(?:,\s*({NUMBER})\s*)?\)", after
+            )
+            if right:
+                params["period"] = int(right.group(1))
+                if right.group(2):
+                    params["stddev"] = _number(right.group(2))
+                explicit = True
+                tail = offset + right.end()
+                text.consume(offset, tail)
+            window = re.split(r"[,;.](?!\d)|\band\b", after, maxsplit=1)[0]
+            for dev in re.finditer(
+                rf"({NUMBER})\s*(?:std|stddev|standard\s+deviations?|sigma|σ)", window, re.I
+            ):
+                params["stddev"] = _number(dev.group(1))
+                explicit = True
+                text.consume(offset + dev.start(), offset + dev.end())
+            for period in re.finditer(rf"(\d+)(?:{PERIOD_UNIT})\b", window, re.I):
+                if not text.is_consumed(offset + period.start(), offset + period.end()):
+                    params["period"] = int(period.group(1))
+                    explicit = True
+                    text.consume(offset + period.start(), offset + period.end())
+        else:
+            right = re.match(
+                r"\s*(?:\(\s*(\d+)\s*\)|(\d+)\b(?!\s*[/%])|"
+                rf"(?:with\s+)?(?:an?\s+)?(?:period|length|window|lookback)\s*(?:of|=|:)?\s*(\d+)|"
+                rf"with\s+(?:an?\s+)?(\d+){PERIOD_UNIT}\b)",
+                after,
+                re.I,
+            )
+            if right and not left:
+                params["period"] = int(next(g for g in right.groups() if g))
+                explicit = True
+                tail = offset + right.end()
+                text.consume(offset, tail)
+
+        on = re.match(
+            r"\s*(?:\(\d+\)\s*)?(?:line\s+)?(?:plotted\s+|applied\s+|calculated\s+)?"
+            r"(?:directly\s+)?(?:on|of|to|over)\s+(?:the\s+)?(rsi|macd|ema|sma)\b",
+            source[tail:],
+            re.I,
+        )
+        if on:
+            params["source"] = _indicator_name(on.group(1))
+            explicit = True
+        indicators.append((name, params, explicit))
+
+    # Mentions without parameters defer to an explicit mention of the same name
+    explicit_names = {name for name, _, explicit in indicators if explicit}
+    result: list[dict] = []
+    for name, params, explicit in indicators:
+        if not explicit and name in explicit_names:
+            continue
+        if not explicit and name in AMBIGUOUS_DEFAULTS:
+            confidence *= 0.6
+        entry = {"name": name, "params": params}
+        if entry not in result:
+            result.append(entry)
+    return result, confidence
+
+
+def _consume_rule_numbers(text: _Text):
+    """Numbers in trading rules (thresholds, stops, holding periods) are not preview fields."""
+    patterns = [
+        rf"(?:<=?|>=?|=)\s*{NUMBER}",
+        rf"\b(?:below|above|under|over|crosses(?:\s+(?:above|below))?|exceeds?|hits?|reaches?|at|than|level|levels)\s+{NUMBER}\b",
+        rf"\b{NUMBER}\s*/\s*{NUMBER}\s+(?:levels?|thresholds?|bands?)",
+        rf"\b{NUMBER}\s*%",
+        rf"\b{NUMBER}[\s-]*(?:days?|bars?|weeks?)[\s-]+(?:holding|hold)",
+        rf"\bhold(?:ing)?\s+(?:for\s+)?{NUMBER}",
+        rf"\$\s*{NUMBER}[kKmM]?",
+        rf"\b{NUMBER}\s*(?:shares|contracts|x)\b",
+    ]
+    for pattern in patterns:
+        for match in text.finditer(pattern):
+            text.consume(*match.span())
+
+
+def parse_preview(user_prompt: str, today: date) -> tuple[Optional[dict], float]:
+    """
+    Parse a strategy prompt into the quick_preview JSON shape.
+
+    Returns ``(preview, confidence)``; ``preview`` is None when the prompt is
+    outside what the rules cover (no or several tickers, no supported
+    indicators, or unsupported ones).
+    """
+    if UNSUPPORTED_RE.search(user_prompt):
+        return None, 0.0
+    text = _Text(user_prompt)
+    _consume_rule_numbers(text)
+
+    indicators, confidence = _parse_indicators(text)
+    if not indicators:
+        return None, 0.0
+    ticker, ticker_confidence = _parse_ticker(text)
+    if ticker is None:
+        return None, 0.0
+    time_frame, time_frame_confidence = _parse_time_frame(text)
+    start_date, end_date, date_confidence = _parse_dates(text, time_frame, today)
+
+    confidence *= ticker_confidence * time_frame_confidence * date_confidence
+    # Every number we could not attribute is something the rules may have misread
+    confidence *= 0.5 ** len(text.unexplained_numbers())
+    return {
+        "ticker": ticker,
+        "time_frame": time_frame,
+        "start_date": start_date,
+        "end_date": end_date,
+        "indicators": indicators,
+    }, confidence
+
+
+# Words that carry no strategy logic once ticker and dates are removed
+FILLER_WORDS = {
+    "backtest", "test", "analyze", "run", "show", "me", "please", "strategy",
+    "a", "an", "the", "on", "for", "in",
+}
+
+
+def strategy_spec(user_prompt: str) -> dict:
+    """
+    Canonical description of the trading logic in a prompt: indicators with
+    parameters and the normalized rule text, with ticker and dates removed, so
+    the same strategy on another asset or period maps to the same spec.
+    """
+    text = _Text(user_prompt)
+    _consume_rule_numbers(text)
+    indicators, _ = _parse_indicators(text)
+    start = len(text.consumed)
+    _parse_ticker(text)
+    _parse_dates(text, "1d", date.today())
+    removed = sorted(text.consumed[start:])
+
+    rules, cursor = [], 0
+    for span_start, span_end in removed:
+        rules.append(user_prompt[cursor:span_start])
+        cursor = max(cursor, span_end)
+    rules.append(user_prompt[cursor:])
+    words = re.sub(r"[^\w<>=%./-]+", " ", " ".join(rules).lower()).split()
+    words = [word.strip(".") for word in words if word.strip(".") not in FILLER_WORDS]
+    return {"indicators": indicators, "rules": " ".join(w for w in words if w)}
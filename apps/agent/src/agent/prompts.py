@@ -21,7 +21,7 @@ You must follow these rules strictly:
 2.  The JSON object must contain these keys: "indicators", "ticker", "time_frame", "start_date", "end_date".
 3.  If there is no time_frame specified in human input, use "1d" as the default
 3.1 If there is no start_date or end_date specified in human input, decide the appropriate start_date and end_date based on the time_frame.
-3.2 For example, if time_frame is "1d", use {current_date} as end_date as start_date and 1yr before {current_date} as start_date.
+3.2 For example, if time_frame is "1d", use the current date given with the request as end_date and 1yr before it as start_date.
 4.  The value of "indicators" is a list of indicator objects.
 4.1  Each indicator object has a "name" (e.g., "SMA", "EMA", "RSI", "MACD", "BB") and a "params" object.
 4.2  If the user does not specify a parameter, use the industry-standard default.
@@ -39,23 +39,22 @@ User Input: "Show me standard Bollinger Bands with a 2.5 stddev, a 14-period RSI
 and a 10-period SMA plotted directly on the RSI line itself."
 Your JSON Response:
 {{"ticker":"TSLA","time_frame": "1d","start_date":"2023-01-01","end_date":"2023-12-31","indicators": [{{"name": "BB","params": {{"period": 20,"stddev": 2.5}}}},{{"name": "RSI","params": {{"period": 14}}}},{{"name": "SMA","params": {{"period": 10,"source": "RSI"}}}}]}}
----
-## User Request
-User Input: "[INSERT USER STRATEGY HERE]"
+"""
+
+# Variable fields go last so the static system prompt is a cacheable prefix
+quick_preview_template = """## User Request
+Current date: {current_date}
+User Input: "{user_prompt}"
 Your JSON Response:"""
 
 quick_preview_prompt = ChatPromptTemplate(
-    [("human", "{user_prompt}"), ("system", quick_preview_system_prompt)]
+    [("system", quick_preview_system_prompt), ("human", quick_preview_template)]
 )
 
 
 code_generator_system_prompt = """You are an expert Backtrader strategy developer and trading algorithm engineer.
 Your task is to interpret a natural language trading strategy and generate actual Backtrader Python code.
-
-INPUT STRATEGY: "{user_prompt}"
-ASSET: {ticker}
-TIMEFRAME: {time_frame}
-DATE RANGE: {start_date} to {end_date}
+The strategy, asset, timeframe and date range are given in the request that follows these instructions.
 
 YOUR TASK:
 1. Parse and understand the trading strategy logic
@@ -137,6 +136,36 @@ IMPORTANT RULES:
 7. Use self.data.close, self.data.high, etc. for price data
 """
 
+code_generator_template = """INPUT STRATEGY: "{user_prompt}"
+ASSET: {ticker}
+TIMEFRAME: {time_frame}
+DATE RANGE: {start_date} to {end_date}"""
+
 code_generator_prompt = ChatPromptTemplate(
-    [("human", "{user_prompt}"), ("system", code_generator_system_prompt)]
+    [("system", code_generator_system_prompt), ("human", code_generator_template)]
+)
+
+
+analysis_system_prompt = """You are a quantitative trading analyst reviewing a completed backtest.
+
+You are given the backtest KPIs and, when available, bootstrap confidence intervals from a robustness check.
+Analyze the results, give a score out of 100 to the strategy based on the kpis, weighting the lower bounds of the
+confidence intervals over the single-path kpis, and provide suggestions for improvement if any in one sentence.
+
+Your answer MUST be a single JSON object in the format below, JSON only, no text outside:
+{{
+    "task_id": "string",
+    "analysis": "string",
+    "strategy_score": "int",
+    "suggestions": "string"
+}}"""
+
+analysis_template = """INPUT STRATEGY: "{user_prompt}"
+TASK ID: {task_id}
+LOGIC SUMMARY: {logic_summary}
+BACKTEST OUTPUT: {backtest}
+ROBUSTNESS CHECK: {robustness}"""
+
+analysis_prompt = ChatPromptTemplate(
+    [("system", analysis_system_prompt), ("human", analysis_template)]
 )
@@ -1,8 +1,14 @@
 import json
+import os
 import time
+import datetime
+import asyncio
 import logging
+from typing import Optional
 from pydantic import Field
 
+import httpx
+
 from nat.builder.builder import Builder
 from nat.cli.register_workflow import register_function
 from nat.data_models.function import FunctionBaseConfig
@@ -11,10 +17,22 @@ from nat.builder.function_info import FunctionInfo
 from nat.builder.framework_enum import LLMFrameworkEnum
 from agent.prompts import *
 from agent.redis import redis_client
-
+from agent.llm import LLMCallError, LLMPolicyConfig, resilient
+from agent.usage import invoke_with_usage, usage_summary
+from agent.cache import ResponseCache, day_bucket, normalize_prompt
+from agent.preview_parser import parse_preview, strategy_spec
+from agent.pipeline import quant_pipeline  # noqa: F401 (registers the workflow)
+from agent.local_tools import mcp_local_tool  # noqa: F401 (registers the tool type)
+from agent.batch import batch_evaluate  # noqa: F401 (registers the batch endpoint)
+from agent.mcp_pool import mcp_pooled_tool  # noqa: F401 (registers the tool type)
+
+from mcp_server import tracing
 from mcp_server.models import TaskEntry
+from mcp_server.redis import update_task
 
 print("Agent custom functions loaded.")
+# Spans from in-process tools are recorded as the agent's too
+tracing.configure(service=os.getenv("TRACE_SERVICE_NAME", "agent"))
 
 
 logger = logging.getLogger(__name__)
@@ -46,11 +64,52 @@ logger = logging.getLogger(__name__)
 #     yield FunctionInfo.from_fn(_run, description=config.description, input_schema=CodeGeneratorInput)
 
 
-class QuickPreviewConfig(FunctionBaseConfig, name="quick_preview"):
+class QuickPreviewConfig(FunctionBaseConfig, LLMPolicyConfig, name="quick_preview"):
     description: str = Field(
         description="Provide a quick preview based on the user_prompt, return details if succeeded."
     )
     llm_name: LLMRef = Field(description="LLM to use for the quick preview.")
+    cache_enabled: bool = Field(
+        default=True, description="Cache LLM responses by normalized prompt."
+    )
+    cache_ttl: int = Field(default=86400, description="Cache entry TTL in seconds.")
+    cache_max_entries: int = Field(
+        default=10000, description="Maximum number of cached responses."
+    )
+    rule_parser_enabled: bool = Field(
+        default=True, description="Answer high-confidence prompts with local rules."
+    )
+    rule_parser_min_confidence: float = Field(
+        default=0.8, description="Minimum rule parser confidence to skip the LLM."
+    )
+    prefetch_endpoint: Optional[str] = Field(
+        default=None,
+        description="MCP server /prefetch URL to warm market data once a ticker is known.",
+    )
+
+
+def _is_json_object(content: str) -> bool:
+    try:
+        return isinstance(json.loads(content), dict)
+    except (TypeError, ValueError):
+        return False
+
+
+def _preview_window(content: str) -> Optional[dict]:
+    try:
+        preview = json.loads(content)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(preview, dict) or not preview.get("ticker"):
+        return None
+    if not preview.get("start_date") or not preview.get("end_date"):
+        return None
+    return {
+        "ticker": preview["ticker"],
+        "time_frame": preview.get("time_frame") or "1d",
+        "start_date": preview["start_date"],
+        "end_date": preview["end_date"],
+    }
 
 
 # class QuickPreviewInput(BaseModel):
@@ -62,23 +121,74 @@ class QuickPreviewConfig(FunctionBaseConfig, name="quick_preview"):
 )
 async def quick_preview(config: QuickPreviewConfig, builder: Builder):
 
-    llm = await builder.get_llm(
-        config.llm_name, wrapper_type=LLMFrameworkEnum.LANGCHAIN
+    llm = resilient(
+        await builder.get_llm(config.llm_name, wrapper_type=LLMFrameworkEnum.LANGCHAIN),
+        model=config.llm_name,
+        policy=config,
+        validate=_is_json_object,
     )
-
-    async def _run(user_prompt: str) -> str:
-        """
-        A quick preview function that uses an LLM to provide a quick preview based on the user_prompt.
-        """
+    cache = ResponseCache(
+        redis_client,
+        namespace="cache:quick_preview",
+        ttl=config.cache_ttl,
+        max_entries=config.cache_max_entries,
+    )
+    # Strong references to fire-and-forget prefetch requests
+    prefetches: set[asyncio.Task] = set()
+
+    async def _post_prefetch(window: dict):
+        try:
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                response = await client.post(config.prefetch_endpoint, json=window)
+                logger.debug(f"Prefetch {window['ticker']}: {response.text}")
+        except Exception as e:
+            # Only an optimization, yh_query_save fetches on its own
+            logger.warning(f"Prefetch request failed: {e}")
+
+    def _prefetch(content: str):
+        window = _preview_window(content) if config.prefetch_endpoint else None
+        if window is None:
+            return
+        task = asyncio.create_task(_post_prefetch(window))
+        prefetches.add(task)
+        task.add_done_callback(prefetches.discard)
+
+    async def _preview(user_prompt: str) -> str:
         prompt = quick_preview_prompt.invoke(
             {
                 "user_prompt": user_prompt,
                 "current_date": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
             },
         )
-        response = await llm.ainvoke(prompt)
+        response = await invoke_with_usage(llm, prompt, "quick_preview", redis_client)
         return response.content
 
+    @tracing.traced(name="quick_preview")
+    async def _run(user_prompt: str) -> str:
+        """
+        A quick preview function that uses an LLM to provide a quick preview based on the user_prompt.
+        """
+        if config.rule_parser_enabled:
+            preview, confidence = parse_preview(
+                user_prompt, datetime.datetime.now(datetime.timezone.utc).date()
+            )
+            if preview and confidence >= config.rule_parser_min_confidence:
+                logger.info(f"quick_preview answered by rules (confidence {confidence:.2f})")
+                content = json.dumps(preview, separators=(",", ":"))
+                _prefetch(content)
+                return content
+        if not config.cache_enabled:
+            content = await _preview(user_prompt)
+        else:
+            # Default dates are derived from the current day, so the key is bucketed by day
+            key = cache.key(normalize_prompt(user_prompt), day_bucket())
+            content = await cache.get_or_compute(
+                key, lambda: _preview(user_prompt), cacheable=_is_json_object
+            )
+            logger.info(f"quick_preview cache stats: {cache.stats()}")
+        _prefetch(content)
+        return content
+
     yield FunctionInfo.from_fn(
         _run,
         description=config.description,
@@ -86,9 +196,35 @@ async def quick_preview(config: QuickPreviewConfig, builder: Builder):
     )
 
 
-class CodeGeneratorConfig(FunctionBaseConfig, name="code_generator"):
+class CodeGeneratorConfig(FunctionBaseConfig, LLMPolicyConfig, name="code_generator"):
     description: str = Field(description="Generate code based on the user prompt.")
     llm_name: LLMRef = Field(description="LLM to use for the code generation.")
+    cache_enabled: bool = Field(
+        default=True, description="Reuse generated code for equivalent strategies."
+    )
+    cache_ttl: int = Field(
+        default=7 * 86400, description="Cache entry TTL in seconds."
+    )
+    cache_max_entries: int = Field(
+        default=10000, description="Maximum number of cached generations."
+    )
+
+
+def _is_valid_code(content: str) -> bool:
+    try:
+        resp_json = json.loads(content)
+    except (TypeError, ValueError):
+        return False
+    if not isinstance(resp_json, dict):
+        return False
+    summary = resp_json.get("logic_summary")
+    return (
+        "init_code" in resp_json
+        and "next_code" in resp_json
+        and isinstance(summary, dict)
+        and "entry_conditions" in summary
+        and "exit_conditions" in summary
+    )
 
 
 # class CodeGeneratorInput(BaseModel):
@@ -105,10 +241,20 @@ class CodeGeneratorConfig(FunctionBaseConfig, name="code_generator"):
 )
 async def code_generator(config: CodeGeneratorConfig, builder: Builder):
 
-    llm = await builder.get_llm(
-        config.llm_name, wrapper_type=LLMFrameworkEnum.LANGCHAIN
+    llm = resilient(
+        await builder.get_llm(config.llm_name, wrapper_type=LLMFrameworkEnum.LANGCHAIN),
+        model=config.llm_name,
+        policy=config,
+        validate=_is_valid_code,
+    )
+    cache = ResponseCache(
+        redis_client,
+        namespace="cache:code_generator",
+        ttl=config.cache_ttl,
+        max_entries=config.cache_max_entries,
     )
 
+    @tracing.traced(name="code_generator")
     async def _run(
         task_id: str,
         user_prompt: str,
@@ -122,19 +268,40 @@ async def code_generator(config: CodeGeneratorConfig, builder: Builder):
 
         """
 
-        prompt = code_generator_prompt.invoke(
-            {
-                "user_prompt": user_prompt,
-                "ticker": ticker,
-                "start_date": start_date,
-                "end_date": end_date,
-                "time_frame": time_frame,
-            },
-        )
-        response = await llm.ainvoke(prompt)
-        if len(response.content) < 100:
-            logger.warning(f"LLM response is too short: {response.content}")
-        resp_json = json.loads(response.content)
+        async def _generate() -> str:
+            prompt = code_generator_prompt.invoke(
+                {
+                    "user_prompt": user_prompt,
+                    "ticker": ticker,
+                    "start_date": start_date,
+                    "end_date": end_date,
+                    "time_frame": time_frame,
+                },
+            )
+            response = await invoke_with_usage(
+                llm, prompt, "code_generator", redis_client
+            )
+            if len(response.content) < 100:
+                logger.warning(f"LLM response is too short: {response.content}")
+            return response.content
+
+        try:
+            if config.cache_enabled:
+                # Generated code never references the ticker or dates, so they are not part of the key
+                spec = strategy_spec(user_prompt)
+                key = cache.key(
+                    code_generator_system_prompt, json.dumps(spec, sort_keys=True)
+                )
+                content = await cache.get_or_compute(
+                    key, _generate, cacheable=_is_valid_code
+                )
+                logger.info(f"code_generator cache stats: {cache.stats()}")
+            else:
+                content = await _generate()
+        except LLMCallError as e:
+            logger.warning(f"Code generation failed for {task_id}: {e}")
+            return {"status": "failed", "message": "Invalid LLM response"}
+        resp_json = json.loads(content)
         if "init_code" not in resp_json or "next_code" not in resp_json:
             logger.warning(f"LLM response is missing fields: {resp_json}")
             return {"status": "failed", "message": "Invalid LLM response"}
@@ -146,15 +313,14 @@ async def code_generator(config: CodeGeneratorConfig, builder: Builder):
             logger.warning(f"LLM response is missing fields: {resp_json}")
             return {"status": "failed", "message": "Invalid LLM response"}
 
-        task_data = await redis_client.get(task_id)
-        if task_data:
-            task = TaskEntry(**json.loads(task_data))
+        def store_code(task: TaskEntry):
             task.code = {
                 "init_code": resp_json.get("init_code"),
                 "next_code": resp_json.get("next_code"),
             }
-            await redis_client.set(task_id, json.dumps(task.to_dict()), ex=3600)
-        else:
+
+        # yh_query_save may update the same task concurrently
+        if await update_task(redis_client, task_id, store_code, ex=3600) is None:
             return {"status": "failed", "message": f"Task {task_id} not found"}
 
         return {
@@ -168,3 +334,24 @@ async def code_generator(config: CodeGeneratorConfig, builder: Builder):
         description=config.description,
         # input_schema=CodeGeneratorInput,
     )
+
+
+class LLMUsageConfig(FunctionBaseConfig, name="llm_usage"):
+    description: str = Field(
+        default="Report LLM token usage, cached-token ratio and latency per function."
+    )
+
+
+@register_function(config_type=LLMUsageConfig)
+async def llm_usage(config: LLMUsageConfig, builder: Builder):
+
+    async def _run(function_name: str = "") -> dict:
+        """
+        Return accumulated LLM usage per agent function, or for function_name only.
+        """
+        summary = await usage_summary(redis_client)
+        if function_name:
+            return {function_name: summary.get(function_name)}
+        return summary
+
+    yield FunctionInfo.from_fn(_run, description=config.description)
@@ -0,0 +1,89 @@
+import time
+import logging
+
+import redis.asyncio as aioredis
+
+from mcp_server import tracing
+
+logger = logging.getLogger(__name__)
+
+USAGE_PREFIX = "usage:llm"
+# Recent latencies kept per function for percentiles
+LATENCY_SAMPLES = 1000
+COUNTERS = ("calls", "prompt_tokens", "completion_tokens", "cached_tokens", "latency_ms")
+
+
+def token_usage(response) -> dict:
+    """Prompt, completion and cached-prompt token counts of a LangChain chat response."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    details = usage.get("input_token_details") or {}
+    cached = details.get("cache_read")
+    if cached is None:
+        # OpenAI-compatible providers report cached tokens in the raw usage block
+        raw = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+        cached = (raw.get("prompt_tokens_details") or {}).get("cached_tokens")
+    return {
+        "prompt_tokens": usage.get("input_tokens", 0) or 0,
+        "completion_tokens": usage.get("output_tokens", 0) or 0,
+        "cached_tokens": cached or 0,
+    }
+
+
+async def record_usage(
+    redis: aioredis.Redis, function: str, response, latency: float
+) -> dict:
+    usage = dict(token_usage(response), latency_ms=round(latency * 1000))
+    logger.info(f"LLM usage for {function}: {usage}")
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            key = f"{USAGE_PREFIX}:{function}"
+            pipe.hincrby(key, "calls", 1)
+            for field, value in usage.items():
+                pipe.hincrby(key, field, value)
+            pipe.lpush(f"{key}:latency", usage["latency_ms"])
+            pipe.ltrim(f"{key}:latency", 0, LATENCY_SAMPLES - 1)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to record LLM usage for {function}: {e}")
+    return usage
+
+
+async def invoke_with_usage(llm, prompt, function: str, redis: aioredis.Redis):
+    """``llm.ainvoke(prompt)`` with token and latency accounting under ``function``."""
+    start = time.perf_counter()
+    with tracing.span("llm", function=function) as span:
+        response = await llm.ainvoke(prompt)
+        span.attributes.update(token_usage(response))
+    await record_usage(redis, function, response, time.perf_counter() - start)
+    return response
+
+
+def _percentile(values: list, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def usage_summary(redis: aioredis.Redis) -> dict:
+    """Per-function totals, cache hit ratio and latency percentiles."""
+    summary = {}
+    async for key in redis.scan_iter(match=f"{USAGE_PREFIX}:*"):
+        if key.endswith(":latency"):
+            continue
+        function = key[len(USAGE_PREFIX) + 1 :]
+        totals = {f: int(v) for f, v in (await redis.hgetall(key)).items()}
+        latencies = [int(v) for v in await redis.lrange(f"{key}:latency", 0, -1)]
+        calls = totals.get("calls", 0)
+        summary[function] = {
+            **{field: totals.get(field, 0) for field in COUNTERS},
+            "cached_ratio": (
+                totals.get("cached_tokens", 0) / totals["prompt_tokens"]
+                if totals.get("prompt_tokens")
+                else 0.0
+            ),
+            "latency_ms_avg": totals.get("latency_ms", 0) / calls if calls else None,
+            "latency_ms_p50": _percentile(latencies, 0.50),
+            "latency_ms_p95": _percentile(latencies, 0.95),
+        }
+    return summary
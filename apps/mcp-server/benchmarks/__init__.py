@@ -0,0 +1,7 @@
+"""Offline benchmarks for the data, templating and execution hot paths.
+
+Run from apps/mcp-server:
+
+    uv run python -m benchmarks run --output bench.json
+    uv run python -m benchmarks compare baseline.json bench.json
+"""
@@ -0,0 +1,171 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks.cases import CASES
+from benchmarks.imports import DEFAULT_FORBID, check_imports
+
+
+DEFAULT_SIZES = "1000,10000,100000,1000000"
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def time_case(case, size: int, repeat: int) -> dict:
+    inputs = case.setup(size)
+    try:
+        # One untimed warm-up run keeps lazy imports out of the numbers
+        case.run(inputs)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            case.run(inputs)
+            timings.append(time.perf_counter() - started)
+    finally:
+        case.teardown(inputs)
+    return {
+        "case": case.name,
+        "size": size,
+        "repeat": repeat,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "max": max(timings),
+    }
+
+
+def run(args) -> int:
+    sizes = [int(s) for s in args.sizes.split(",")]
+    selected = set(args.cases.split(",")) if args.cases else None
+    results = []
+    for case in CASES:
+        if selected and case.name not in selected:
+            continue
+        case_sizes = [s for s in sizes if case.max_size is None or s <= case.max_size]
+        if case.max_size is not None and not case_sizes:
+            case_sizes = [min(sizes)]
+        for size in case_sizes:
+            try:
+                result = time_case(case, size, args.repeat)
+            except Exception as e:
+                print(f"{case.name:<30} {size:>9}  skipped: {e}", file=sys.stderr)
+                continue
+            results.append(result)
+            print(
+                f"{case.name:<30} {size:>9}  "
+                f"median {result['median'] * 1000:10.3f} ms  "
+                f"min {result['min'] * 1000:10.3f} ms"
+            )
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "sizes": sizes,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+def compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = {(r["case"], r["size"]): r for r in json.load(f)["results"]}
+    with open(args.current) as f:
+        current = json.load(f)["results"]
+
+    regressions = 0
+    print(f"{'case':<30} {'size':>9} {'baseline':>12} {'current':>12} {'change':>8}")
+    for result in current:
+        base = baseline.get((result["case"], result["size"]))
+        if base is None:
+            continue
+        # Medians are compared; tiny cases use an absolute floor to avoid noise
+        if base["median"] < args.min_time and result["median"] < args.min_time:
+            change = 0.0
+        else:
+            change = result["median"] / base["median"] - 1.0
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif change < -args.threshold:
+            flag = "  improved"
+        print(
+            f"{result['case']:<30} {result['size']:>9} "
+            f"{base['median'] * 1000:10.3f}ms {result['median'] * 1000:10.3f}ms "
+            f"{change * 100:+7.1f}%{flag}"
+        )
+    if regressions:
+        print(f"{regressions} regression(s) above {args.threshold * 100:.0f}%")
+        return 1
+    print("No regressions.")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmark suite.")
+    run_parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Bar counts.")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--cases", default="", help="Comma separated names.")
+    run_parser.add_argument("--output", default="bench.json")
+
+    compare_parser = commands.add_parser("compare", help="Flag regressions.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10)
+    compare_parser.add_argument(
+        "--min-time", type=float, default=0.001, help="Seconds below which to ignore."
+    )
+
+    imports_parser = commands.add_parser(
+        "imports", help="Check server import time against a budget."
+    )
+    imports_parser.add_argument("--module", default="mcp_server.main")
+    imports_parser.add_argument(
+        "--budget",
+        type=float,
+        default=float(os.getenv("IMPORT_BUDGET", "2.0")),
+        help="Seconds; defaults to IMPORT_BUDGET or 2.0.",
+    )
+    imports_parser.add_argument("--repeat", type=int, default=3)
+    imports_parser.add_argument("--top", type=int, default=15)
+    imports_parser.add_argument(
+        "--forbid",
+        default=DEFAULT_FORBID,
+        help="Comma separated packages that must not be imported.",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        return run(args)
+    if args.command == "imports":
+        return check_imports(args)
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.data import (
+    synthetic_history,
+    synthetic_result_logs,
+    synthetic_rows,
+    synthetic_runs,
+)
+
+
+RUNNER_PATH = Path(__file__).resolve().parents[3] / "deploy" / "code-runner"
+
+STRATEGY_INIT = [
+    "self.sma_fast = bt.indicators.SimpleMovingAverage(self.data.close, period=10)",
+    "self.sma_slow = bt.indicators.SimpleMovingAverage(self.data.close, period=30)",
+    "self.crossover = bt.indicators.CrossOver(self.sma_fast, self.sma_slow)",
+]
+STRATEGY_NEXT = [
+    "if not self.position:\n    if self.crossover[0] > 0:\n        self.capture_buy_signal()\n        self.buy()",
+    "elif self.position:\n    if self.crossover[0] < 0:\n        self.capture_sell_signal()\n        self.sell()",
+]
+
+
+class Case:
+    """A benchmark case: setup(size) builds inputs once, run(inputs) is timed."""
+
+    name = ""
+    max_size = None
+
+    def setup(self, size: int):
+        return None
+
+    def run(self, inputs):
+        raise NotImplementedError
+
+    def teardown(self, inputs):
+        pass
+
+
+class YfinanceToOhlcv(Case):
+    name = "yfinance_to_ohlcv"
+
+    def setup(self, size):
+        return synthetic_history(size)
+
+    def run(self, inputs):
+        from mcp_server.ticker import yfinance_to_ohlcv
+
+        return yfinance_to_ohlcv(inputs)
+
+
+class OhlcvToRedis(Case):
+    name = "ohlcv_to_redis"
+
+    def setup(self, size):
+        from mcp_server.ticker import redis_to_ohlcv
+
+        return redis_to_ohlcv(synthetic_rows(size))
+
+    def run(self, inputs):
+        from mcp_server.ticker import ohlcv_to_redis
+
+        return json.dumps(ohlcv_to_redis(inputs))
+
+
+class RedisToOhlcv(Case):
+    name = "redis_to_ohlcv"
+
+    def setup(self, size):
+        return json.dumps(synthetic_rows(size))
+
+    def run(self, inputs):
+        from mcp_server.ticker import redis_to_ohlcv
+
+        return redis_to_ohlcv(json.loads(inputs))
+
+
+class DataEndpointSerialization(Case):
+    """What /data/{storage_key} does after the Redis GET returns."""
+
+    name = "data_endpoint_serialization"
+
+    def setup(self, size):
+        return json.dumps(synthetic_rows(size))
+
+    def run(self, inputs):
+        from mcp_server.http_cache import content_etag, render_json
+        from mcp_server.ticker import redis_to_ohlcv
+
+        content_etag(inputs)
+        return render_json(
+            {"data": [o.model_dump() for o in redis_to_ohlcv(json.loads(inputs))]}
+        )
+
+
+class StrategyRendering(Case):
+    name = "generate_strategy_code"
+    # Template rendering does not depend on the dataset size
+    max_size = 1000
+
+    def run(self, inputs):
+        from mcp_server.generator import generate_strategy_code
+
+        return generate_strategy_code(STRATEGY_INIT, STRATEGY_NEXT)
+
+
+class RunSpecRendering(Case):
+    """Successor of generate_execution_with_data_code since the harness moved
+    into the runner image: render the strategy and build the run spec."""
+
+    name = "generate_run_spec"
+    max_size = 1000
+
+    def run(self, inputs):
+        from mcp_server.generator import generate_run_spec, generate_strategy_code
+
+        strategy_code = generate_strategy_code(STRATEGY_INIT, STRATEGY_NEXT)
+        return json.dumps(
+            generate_run_spec("bench", strategy_code, 100000.0, ["BENCH:1m:a:b"])
+        )
+
+
+class SafeParseLogs(Case):
+    name = "safe_parse_logs"
+
+    def setup(self, size):
+        return synthetic_result_logs(size)
+
+    def run(self, inputs):
+        from mcp_server.utils import safe_parse_logs
+
+        return safe_parse_logs(inputs)
+
+
+class HarnessCase(Case):
+    """Shared setup for running the runner harness on a synthetic dataset."""
+
+    max_size = 100_000
+
+    def setup(self, size):
+        from mcp_server.generator import generate_run_spec, generate_strategy_code
+
+        workdir = tempfile.TemporaryDirectory(prefix="bench-harness-")
+        data_file = os.path.join(workdir.name, "0.json")
+        with open(data_file, "w") as f:
+            # The harness works on daily bars
+            json.dump(synthetic_rows(size, freq="D"), f)
+        spec = generate_run_spec(
+            "bench",
+            generate_strategy_code(STRATEGY_INIT, STRATEGY_NEXT),
+            100000.0,
+            ["BENCH:1d:a:b"],
+        )
+        spec["data_files"] = [data_file]
+        spec_file = os.path.join(workdir.name, "spec.json")
+        with open(spec_file, "w") as f:
+            json.dump(spec, f)
+        return {"workdir": workdir, "spec": spec, "spec_file": spec_file}
+
+    def teardown(self, inputs):
+        inputs["workdir"].cleanup()
+
+
+class HarnessSubprocess(HarnessCase):
+    """A cold interpreter per run, as a Kubernetes Job pod does."""
+
+    name = "harness_subprocess"
+
+    def run(self, inputs):
+        env = dict(os.environ, PYTHONPATH=str(RUNNER_PATH))
+        output = subprocess.run(
+            [sys.executable, "-m", "agentquant_runner", "run", inputs["spec_file"]],
+            env=env,
+            check=True,
+            capture_output=True,
+        ).stdout
+        result = json.loads(output)
+        if not result.get("success"):
+            raise RuntimeError(result.get("error"))
+        return result
+
+
+class HarnessInProcess(HarnessCase):
+    """Warm imports, as a fork server child does."""
+
+    name = "harness_inprocess"
+
+    def run(self, inputs):
+        if str(RUNNER_PATH) not in sys.path:
+            sys.path.insert(0, str(RUNNER_PATH))
+        from agentquant_runner import harness
+
+        result = harness.execute(inputs["spec"])
+        if not result.get("success"):
+            raise RuntimeError(result.get("error"))
+        return harness.encode_result(result)
+
+
+class HistoryQueries(Case):
+    """
+    /runs lookups over a history of ``size`` runs: a ticker's top 20 by Sharpe,
+    and a page of 50 in the middle of a Sharpe-ordered listing.
+    """
+
+    name = "history_queries"
+
+    def setup(self, size):
+        from mcp_server.history import KPIS, HistoryStore
+
+        workdir = tempfile.TemporaryDirectory(prefix="bench-history-")
+        store = HistoryStore(os.path.join(workdir.name, "history.sqlite3"))
+        rows = synthetic_runs(size)
+        columns = (
+            "task_id, created_at, tickers, time_frame, start_date, end_date, "
+            "indicators, portfolio, " + ", ".join(KPIS)
+        )
+        conn = store.connection()
+        with conn:
+            conn.executemany(
+                f"INSERT INTO runs ({columns}) VALUES ({', '.join('?' * (8 + len(KPIS)))})",
+                rows,
+            )
+            conn.executemany(
+                "INSERT INTO run_tickers (ticker, task_id) VALUES (?, ?)",
+                [(row[2], row[0]) for row in rows],
+            )
+        # Column 8 is sharpe_ratio, the first KPI
+        middle = sorted(rows, key=lambda row: (row[8], row[0]), reverse=True)[size // 2]
+        return {
+            "workdir": workdir,
+            "store": store,
+            "cursor": (middle[8], middle[0]),
+            "ticker": rows[0][2],
+        }
+
+    def run(self, inputs):
+        store = inputs["store"]
+        top, _ = store.query({"ticker": inputs["ticker"]}, "sharpe_ratio", True, 20)
+        page, _ = store.query({}, "sharpe_ratio", True, 50, inputs["cursor"])
+        return top, page
+
+    def teardown(self, inputs):
+        inputs["workdir"].cleanup()
+
+
+CASES = [
+    YfinanceToOhlcv(),
+    OhlcvToRedis(),
+    RedisToOhlcv(),
+    DataEndpointSerialization(),
+    StrategyRendering(),
+    RunSpecRendering(),
+    SafeParseLogs(),
+    HarnessSubprocess(),
+    HarnessInProcess(),
+    HistoryQueries(),
+]
@@ -0,0 +1,109 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+
+SEED = 42
+INTRADAY_START = "2000-01-03 09:30"
+# Early enough for 100k daily bars to stay within pandas' timestamp range
+DAILY_START = "1750-01-01"
+
+
+def synthetic_history(bars: int, seed: int = SEED, freq: str = "min") -> pd.DataFrame:
+    """A yfinance-shaped OHLCV frame with a geometric random walk close."""
+    rng = np.random.default_rng(seed)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0.0002, 0.01, bars)))
+    spread = np.abs(rng.normal(0.0, 0.005, bars))
+    open_ = close * (1.0 + rng.normal(0.0, 0.002, bars))
+    start = INTRADAY_START if freq == "min" else DAILY_START
+    index = pd.date_range(start, periods=bars, freq=freq, tz="America/New_York")
+    return pd.DataFrame(
+        {
+            "Open": open_,
+            "High": np.maximum(open_, close) * (1.0 + spread),
+            "Low": np.minimum(open_, close) * (1.0 - spread),
+            "Close": close,
+            "Volume": rng.integers(1_000, 1_000_000, bars),
+            "Dividends": 0.0,
+            "Stock Splits": 0.0,
+        },
+        index=pd.DatetimeIndex(index, name="Datetime"),
+    )
+
+
+def synthetic_rows(bars: int, seed: int = SEED, freq: str = "min") -> list:
+    """Rows in the Redis storage layout: [timestamp, open, high, low, close, volume]."""
+    frame = synthetic_history(bars, seed, freq)
+    timestamps = frame.index.asi8 // 1_000_000
+    values = frame[["Open", "High", "Low", "Close"]].round(4).to_numpy()
+    volume = frame["Volume"].to_numpy()
+    return [
+        [int(t), *map(float, v), int(vol)]
+        for t, v, vol in zip(timestamps, values, volume)
+    ]
+
+
+def synthetic_result_logs(bars: int, seed: int = SEED) -> str:
+    """Runner output of the size a backtest over `bars` bars would print."""
+    rng = np.random.default_rng(seed)
+    n_signals = max(1, bars // 20)
+    timestamps = (np.arange(bars) * 60_000 + 946_909_800_000).tolist()
+    value = (100_000 * np.cumprod(1 + rng.normal(0, 0.001, bars))).round(2).tolist()
+    result = {
+        "success": True,
+        "final_value": value[-1],
+        "initial_cash": 100000.0,
+        "kpis": {
+            "sharpe_ratio": 0.8,
+            "max_drawdown": 12.5,
+            "total_return": value[-1] / 1000 - 100,
+            "win_rate": 55.0,
+            "total_trades": n_signals // 2,
+        },
+        "signals": [
+            {
+                "type": "BUY" if i % 2 == 0 else "SELL",
+                "date": "2000-01-03",
+                "price": 100.0 + i,
+                "timestamp": timestamps[i * 20 % bars],
+            }
+            for i in range(n_signals)
+        ],
+        "trades": [
+            {"entry_date": 730000.0 + i, "exit_date": 730001.0 + i, "pnl": 10.0 - i % 7}
+            for i in range(n_signals // 2)
+        ],
+        "equity": {
+            "timestamp": timestamps,
+            "value": value,
+            "exposure": [1.0 if i % 3 else 0.0 for i in range(bars)],
+        },
+    }
+    return json.dumps(result, default=str)
+
+
+def synthetic_runs(count: int, seed: int = SEED) -> list:
+    """Run history rows: 500 tickers, 3 time frames, 20 indicator sets, over a year."""
+    from mcp_server.history import KPIS
+
+    rng = np.random.default_rng(seed)
+    tickers = rng.integers(0, 500, count)
+    time_frames = np.array(["1d", "1h", "1wk"])[rng.integers(0, 3, count)]
+    indicators = rng.integers(0, 20, count)
+    created_at = 1_700_000_000 + np.sort(rng.uniform(0, 365 * 86400, count))
+    kpis = rng.normal(0, 1, (count, len(KPIS))).round(4)
+    return [
+        (
+            f"run-{i:08d}",
+            float(created_at[i]),
+            f"T{tickers[i]:03d}",
+            str(time_frames[i]),
+            "2024-01-01",
+            "2024-12-31",
+            f"IND{indicators[i]:02d},SMA",
+            0,
+            *map(float, kpis[i]),
+        )
+        for i in range(count)
+    ]
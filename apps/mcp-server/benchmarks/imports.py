@@ -0,0 +1,62 @@
+import re
+import statistics
+import subprocess
+import sys
+
+# Loaded on first use, so importing the server must not pull them in
+DEFAULT_FORBID = "kubernetes,yfinance,pandas,jinja2"
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def profile_import(module: str) -> list:
+    """(module, self us, cumulative us, depth) rows from ``python -X importtime``."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    rows = []
+    for line in completed.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            rows.append((name, int(own), int(cumulative), (len(indent) - 1) // 2))
+    return rows
+
+
+def check_imports(args) -> int:
+    forbid = {name for name in args.forbid.split(",") if name}
+    totals = []
+    rows = []
+    # The first run also compiles bytecode; it is not counted
+    profile_import(args.module)
+    for _ in range(args.repeat):
+        rows = profile_import(args.module)
+        totals.append(next(c for name, _, c, _ in rows if name == args.module) / 1e6)
+    total = statistics.median(totals)
+
+    print(f"import {args.module}: median {total:.3f}s over {args.repeat} runs (budget {args.budget:.3f}s)")
+    print(f"{'module':<50} {'cumulative':>12}")
+    # The biggest imports anywhere below the module, itself excluded
+    heaviest = sorted(
+        (row for row in rows if row[0] != args.module),
+        key=lambda row: row[2],
+        reverse=True,
+    )
+    for name, _, cumulative, _ in heaviest[: args.top]:
+        print(f"{name:<50} {cumulative / 1000:10.1f}ms")
+
+    failed = False
+    loaded = sorted({name for name, *_ in rows if name.split(".")[0] in forbid})
+    if loaded:
+        print(f"Imported at startup but should be lazy: {', '.join(loaded[:10])}")
+        failed = True
+    if total > args.budget:
+        print(f"Import time {total:.3f}s exceeds the budget of {args.budget:.3f}s")
+        failed = True
+    if not failed:
+        print("Within budget.")
+    return 1 if failed else 0
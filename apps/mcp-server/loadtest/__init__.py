@@ -0,0 +1,8 @@
+"""Offline load test for the MCP server.
+
+Starts ``mcp_server.main:api`` with a fake Yahoo Finance provider, a fake
+backtest executor and (by default) an in-memory Redis, then drives it with
+many concurrent MCP SSE sessions. Run from apps/mcp-server:
+
+    uv run python -m loadtest run --users 50 --duration 60 --output load.json
+"""
@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.__main__ import git_revision
+
+
+def add_server_options(parser):
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument(
+        "--redis", default="memory", help='"memory" or a Redis URL, e.g. redis://localhost:6379/15.'
+    )
+    parser.add_argument("--bars", type=int, default=1250, help="Bars per dataset.")
+    parser.add_argument(
+        "--yahoo-latency", default="0.3:0.5", help='Download time "median:sigma" in seconds.'
+    )
+    parser.add_argument(
+        "--job-latency", default="3:0.4", help='Backtest job time "median:sigma" in seconds.'
+    )
+    parser.add_argument(
+        "--job-mode",
+        choices=("job", "forkserver"),
+        default="job",
+        help="Runner mode to load; job fakes the Kubernetes calls, blocking as they do.",
+    )
+    parser.add_argument(
+        "--lock-ttl",
+        type=int,
+        default=0,
+        help="Lease TTL in seconds; below the job time it checks lease renewal. 0 keeps LOCK_TTL.",
+    )
+    parser.add_argument(
+        "--history-db",
+        default="",
+        help='Run history SQLite file, "none" to disable; a temporary file by default.',
+    )
+
+
+def _ms(value):
+    return f"{value * 1000:9.1f}" if value is not None else f"{'-':>9}"
+
+
+def print_report(report: dict):
+    load, lag = report["load"], report["event_loop_lag"]
+    print(f"job mode {report['meta']['job_mode']}")
+    print(
+        f"{load['calls']} calls in {load['elapsed']:.1f}s: {load['throughput']:.1f}/s, "
+        f"{load['errors']} errors, {load['scenarios']['count']} scenarios "
+        f"({load['scenarios']['throughput']:.2f}/s)"
+    )
+    print(f"{'tool':<18} {'calls':>7} {'errors':>7} {'rps':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for tool, stats in load["tools"].items():
+        print(
+            f"{tool:<18} {stats['count']:>7} {stats['errors']:>7} {stats['throughput']:>7.1f} "
+            f"{_ms(stats['p50'])} {_ms(stats['p95'])} {_ms(stats['p99'])} {_ms(stats['max'])}"
+        )
+    print(
+        f"{'event loop lag':<34} {'':>7} "
+        f"{_ms(lag.get('p50'))} {_ms(lag.get('p95'))} {_ms(lag.get('p99'))} {_ms(lag.get('max'))}"
+    )
+    jobs = report["jobs"]
+    if "created" in jobs:
+        print(f"Kubernetes Jobs created: {jobs['created']}, duplicates: {jobs['duplicates']}")
+    print(f"Job leases lost while running: {jobs['leases_lost']}")
+
+
+def start_server(args) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "loadtest", "serve",
+        "--port", str(args.port),
+        "--redis", args.redis,
+        "--bars", str(args.bars),
+        "--yahoo-latency", args.yahoo_latency,
+        "--job-latency", args.job_latency,
+        "--job-mode", args.job_mode,
+        "--lock-ttl", str(args.lock_ttl),
+        "--history-db", args.history_db,
+    ]
+    return subprocess.Popen(command, env=dict(os.environ, PYTHONUNBUFFERED="1"))
+
+
+def wait_ready(base: str, server=None, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            if httpx.get(f"{base}/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Server at {base} did not become ready")
+
+
+def run(args) -> int:
+    from loadtest.client import generate_load
+
+    base = args.url or f"http://127.0.0.1:{args.port}"
+    server = None if args.url else start_server(args)
+    try:
+        wait_ready(base, server)
+
+        async def on_measure_start():
+            # Only lag under steady load is reported, not startup
+            async with httpx.AsyncClient() as client:
+                await client.post(f"{base}/loadtest/reset")
+
+        args.on_measure_start = on_measure_start
+        load = asyncio.run(generate_load(f"{base}/mcp/sse", args))
+        lag = httpx.get(f"{base}/loadtest/lag", timeout=10.0).json()
+        jobs = httpx.get(f"{base}/loadtest/jobs", timeout=10.0).json()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "users": args.users,
+            "connect": args.connect,
+            "duration": args.duration,
+            "think": args.think,
+            "redis": args.redis,
+            "yahoo_latency": args.yahoo_latency,
+            "job_latency": args.job_latency,
+            "job_mode": args.job_mode,
+            "lock_ttl": args.lock_ttl,
+            "bars": args.bars,
+        },
+        "load": load,
+        "event_loop_lag": lag,
+        "jobs": jobs,
+    }
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    failed = load["errors"] or load["failed_users"]
+    return 1 if failed or jobs.get("duplicates") or jobs["leases_lost"] else 0
+
+
+def serve(args) -> int:
+    from loadtest.server import serve as serve_app
+
+    serve_app(args)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="loadtest")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Start a fake-backed server and load it.")
+    add_server_options(run_parser)
+    run_parser.add_argument("--url", default="", help="Load an already running loadtest server.")
+    run_parser.add_argument("--users", type=int, default=20, help="Concurrent MCP sessions.")
+    run_parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds.")
+    run_parser.add_argument("--ramp", type=float, default=5.0, help="Seconds to start all users.")
+    run_parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured seconds after ramp.")
+    run_parser.add_argument("--think", type=float, default=1.0, help="Mean pause between scenarios.")
+    run_parser.add_argument(
+        "--connect",
+        choices=("session", "call"),
+        default="session",
+        help="One SSE session per user, or a new connection per call.",
+    )
+    run_parser.add_argument("--tickers", type=int, default=50, help="Distinct tickers requested.")
+    run_parser.add_argument("--robustness-ratio", type=float, default=0.3)
+    run_parser.add_argument("--robustness-samples", type=int, default=500)
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--output", default="")
+
+    serve_parser = commands.add_parser("serve", help="Run the server with the fakes installed.")
+    add_server_options(serve_parser)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        return run(args)
+    return serve(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
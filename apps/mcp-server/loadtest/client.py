@@ -0,0 +1,162 @@
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+
+from loadtest.stats import summarize
+
+# (start_date, end_date) windows the virtual users pick from
+WINDOWS = (
+    ("2020-01-01", "2024-12-31"),
+    ("2022-01-01", "2024-12-31"),
+    ("2023-06-01", "2025-06-01"),
+)
+
+
+class Recorder:
+    """Per-tool latencies and errors over the measured interval."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.scenarios = []
+        self.recording = False
+
+    def add(self, tool: str, seconds: float, ok: bool):
+        if not self.recording:
+            return
+        self.latencies[tool].append(seconds)
+        if not ok:
+            self.errors[tool] += 1
+
+    def report(self, elapsed: float) -> dict:
+        tools = {}
+        for tool, samples in sorted(self.latencies.items()):
+            tools[tool] = dict(
+                summarize(samples),
+                errors=self.errors[tool],
+                throughput=len(samples) / elapsed if elapsed else 0.0,
+            )
+        calls = sum(len(samples) for samples in self.latencies.values())
+        return {
+            "elapsed": elapsed,
+            "calls": calls,
+            "throughput": calls / elapsed if elapsed else 0.0,
+            "errors": sum(self.errors.values()),
+            "scenarios": dict(summarize(self.scenarios), throughput=len(self.scenarios) / elapsed if elapsed else 0.0),
+            "tools": tools,
+        }
+
+
+@asynccontextmanager
+async def open_session(url: str):
+    async with sse_client(url=url) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            yield session
+
+
+class VirtualUser:
+    """
+    One agent session running the backtest tool sequence in a loop:
+    task_register, yh_query_save, code_executor and sometimes robustness_check.
+    """
+
+    def __init__(self, url: str, options, recorder: Recorder, rng: random.Random):
+        self.url = url
+        self.options = options
+        self.recorder = recorder
+        self.rng = rng
+        self.session = None
+
+    async def call(self, tool: str, args: dict) -> dict:
+        start = time.perf_counter()
+        ok = False
+        try:
+            if self.session is None:
+                # New connection per call, as mcp_tool_wrapper does
+                async with open_session(self.url) as session:
+                    result = await session.call_tool(tool, args)
+            else:
+                result = await self.session.call_tool(tool, args)
+            text = "".join(getattr(c, "text", "") for c in result.content)
+            payload = json.loads(text) if text else {}
+            ok = not result.isError and payload.get("status") != "failed" and "error" not in payload
+            return payload
+        except Exception as e:
+            return {"status": "failed", "message": str(e)}
+        finally:
+            self.recorder.add(tool, time.perf_counter() - start, ok)
+
+    async def scenario(self):
+        start = time.perf_counter()
+        task = await self.call("task_register", {"user_prompt": "SMA 10/30 crossover"})
+        task_id = task.get("task_id")
+        if not task_id:
+            return
+        start_date, end_date = self.rng.choice(WINDOWS)
+        saved = await self.call(
+            "yh_query_save",
+            {
+                "task_id": task_id,
+                "ticker": f"T{self.rng.randrange(self.options.tickers):03d}",
+                "time_frame": "1d",
+                "start_date": start_date,
+                "end_date": end_date,
+            },
+        )
+        if saved.get("status") != "success":
+            return
+        executed = await self.call("code_executor", {"task_id": task_id})
+        if executed.get("status") == "success" and self.rng.random() < self.options.robustness_ratio:
+            await self.call(
+                "robustness_check", {"task_id": task_id, "samples": self.options.robustness_samples}
+            )
+        if self.recorder.recording:
+            self.recorder.scenarios.append(time.perf_counter() - start)
+
+    async def run(self, stop_at: float):
+        while time.perf_counter() < stop_at:
+            await self.scenario()
+            # Exponential think time between requests of one user
+            if self.options.think > 0:
+                await asyncio.sleep(self.rng.expovariate(1.0 / self.options.think))
+
+    async def start(self, delay: float, stop_at: float):
+        await asyncio.sleep(delay)
+        if self.options.connect == "call":
+            await self.run(stop_at)
+            return
+        async with open_session(self.url) as session:
+            self.session = session
+            await self.run(stop_at)
+
+
+async def generate_load(url: str, options) -> dict:
+    recorder = Recorder()
+    rng = random.Random(options.seed)
+    now = time.perf_counter()
+    measure_from = now + options.ramp + options.warmup
+    stop_at = measure_from + options.duration
+    users = [
+        VirtualUser(url, options, recorder, random.Random(rng.random()))
+        for _ in range(options.users)
+    ]
+    tasks = [
+        asyncio.create_task(user.start(options.ramp * i / max(1, options.users), stop_at))
+        for i, user in enumerate(users)
+    ]
+    await asyncio.sleep(max(0.0, measure_from - time.perf_counter()))
+    recorder.recording = True
+    await options.on_measure_start()
+    started = time.perf_counter()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    report = recorder.report(elapsed)
+    report["failed_users"] = sum(isinstance(r, BaseException) for r in results)
+    return report
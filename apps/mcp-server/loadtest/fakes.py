@@ -0,0 +1,351 @@
+import asyncio
+import json
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from types import SimpleNamespace
+
+import numpy as np
+from redis.exceptions import WatchError
+
+from benchmarks.cases import STRATEGY_INIT, STRATEGY_NEXT
+from benchmarks.data import synthetic_history
+
+
+class Latency:
+    """Log-normal latency given as "median:sigma" seconds, "0" for none."""
+
+    def __init__(self, spec: str):
+        median, _, sigma = spec.partition(":")
+        self.median = float(median)
+        self.sigma = float(sigma or 0)
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        return self.median * float(np.exp(random.gauss(0.0, self.sigma)))
+
+    def __repr__(self):
+        return f"{self.median}:{self.sigma}"
+
+
+class MemoryRedis:
+    """
+    In-process stand-in for the subset of redis.asyncio the server uses,
+    including WATCH/MULTI pipelines. Values are strings as with
+    decode_responses=True.
+    """
+
+    def __init__(self):
+        self._data: dict = {}
+        self._expire_at: dict = {}
+        self._versions: dict = {}
+
+    def _alive(self, key) -> bool:
+        expire_at = self._expire_at.get(key)
+        if expire_at is not None and expire_at <= time.monotonic():
+            self._data.pop(key, None)
+            self._expire_at.pop(key, None)
+        return key in self._data
+
+    def _touch(self, key):
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def _container(self, key, factory):
+        if not self._alive(key):
+            self._data[key] = factory()
+        return self._data[key]
+
+    async def get(self, key):
+        return self._data[key] if self._alive(key) else None
+
+    async def set(self, key, value, ex=None, keepttl=False, nx=False):
+        if nx and self._alive(key):
+            return None
+        self._data[key] = value if isinstance(value, str) else str(value)
+        if ex is not None:
+            self._expire_at[key] = time.monotonic() + ex
+        elif not keepttl:
+            self._expire_at.pop(key, None)
+        self._touch(key)
+        return True
+
+    async def exists(self, *keys):
+        return sum(1 for key in keys if self._alive(key))
+
+    async def delete(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                del self._data[key]
+                self._expire_at.pop(key, None)
+                self._touch(key)
+                removed += 1
+        return removed
+
+    async def expire(self, key, seconds):
+        if not self._alive(key):
+            return False
+        self._expire_at[key] = time.monotonic() + seconds
+        return True
+
+    async def zadd(self, key, mapping):
+        zset = self._container(key, dict)
+        added = sum(1 for member in mapping if member not in zset)
+        zset.update({m: float(s) for m, s in mapping.items()})
+        self._touch(key)
+        return added
+
+    async def zrem(self, key, *members):
+        zset = self._data.get(key) if self._alive(key) else None
+        if not zset:
+            return 0
+        removed = sum(1 for m in members if zset.pop(m, None) is not None)
+        self._touch(key)
+        return removed
+
+    async def zcard(self, key):
+        return len(self._data[key]) if self._alive(key) else 0
+
+    async def zremrangebyscore(self, key, low, high):
+        zset = self._data.get(key) if self._alive(key) else None
+        if not zset:
+            return 0
+        doomed = [m for m, s in zset.items() if float(low) <= s <= float(high)]
+        for member in doomed:
+            del zset[member]
+        self._touch(key)
+        return len(doomed)
+
+    def _ranked(self, key) -> list:
+        zset = self._data[key] if self._alive(key) else {}
+        return sorted(zset, key=lambda m: (zset[m], m))
+
+    @staticmethod
+    def _slice(items: list, start: int, stop: int) -> list:
+        return items[start:] if stop == -1 else items[start : stop + 1]
+
+    async def zrange(self, key, start, stop):
+        return self._slice(self._ranked(key), start, stop)
+
+    async def zrevrange(self, key, start, stop):
+        return self._slice(self._ranked(key)[::-1], start, stop)
+
+    async def zremrangebyrank(self, key, start, stop):
+        doomed = self._slice(self._ranked(key), start, stop)
+        for member in doomed:
+            del self._data[key][member]
+        if doomed:
+            self._touch(key)
+        return len(doomed)
+
+    async def hincrby(self, key, field, amount=1):
+        hashmap = self._container(key, dict)
+        hashmap[field] = str(int(hashmap.get(field, 0)) + amount)
+        self._touch(key)
+        return int(hashmap[field])
+
+    async def hgetall(self, key):
+        return dict(self._data[key]) if self._alive(key) else {}
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        hashmap = self._container(key, dict)
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        added = sum(1 for f in items if f not in hashmap)
+        hashmap.update({f: str(v) for f, v in items.items()})
+        self._touch(key)
+        return added
+
+    async def hget(self, key, field):
+        return self._data[key].get(field) if self._alive(key) else None
+
+    async def hmget(self, key, *fields):
+        hashmap = self._data[key] if self._alive(key) else {}
+        return [hashmap.get(f) for f in fields]
+
+    async def rpush(self, key, *values):
+        items = self._container(key, list)
+        items.extend(str(v) for v in values)
+        self._touch(key)
+        return len(items)
+
+    async def lrange(self, key, start, stop):
+        items = self._data[key] if self._alive(key) else []
+        return items[start:] if stop == -1 else items[start : stop + 1]
+
+    async def llen(self, key):
+        return len(self._data[key]) if self._alive(key) else 0
+
+    async def ttl(self, key):
+        if not self._alive(key):
+            return -2
+        expire_at = self._expire_at.get(key)
+        return -1 if expire_at is None else int(expire_at - time.monotonic())
+
+    async def ping(self):
+        return True
+
+    def pipeline(self, transaction=True):
+        return MemoryPipeline(self, transaction)
+
+    async def close(self):
+        pass
+
+
+class MemoryPipeline:
+    def __init__(self, redis: MemoryRedis, transaction: bool):
+        self.redis = redis
+        self.transaction = transaction
+        self._watched: dict = {}
+        self._queue: list = []
+        self._immediate = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.reset()
+
+    def reset(self):
+        self._watched.clear()
+        self._queue.clear()
+        self._immediate = False
+
+    async def watch(self, *keys):
+        self._immediate = True
+        for key in keys:
+            self._watched[key] = self.redis._versions.get(key, 0)
+
+    def multi(self):
+        self._immediate = False
+
+    def __getattr__(self, name):
+        command = getattr(self.redis, name)
+        if self._immediate:
+            return command
+
+        def queue(*args, **kwargs):
+            self._queue.append((command, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        try:
+            for key, version in self._watched.items():
+                if self.redis._versions.get(key, 0) != version:
+                    raise WatchError(f"Watched key {key} changed")
+            return [await command(*args, **kwargs) for command, args, kwargs in self._queue]
+        finally:
+            self.reset()
+
+
+def fake_history(ticker, start_date, end_date, time_frame, bars: int, latency: Latency):
+    """Stands in for query_ticker_historical_data; blocks like the real download."""
+    time.sleep(latency.sample())
+    if ticker.startswith("EMPTY"):
+        return synthetic_history(0, freq="D")
+    # Stable per ticker, so repeated fetches return the same bars
+    return synthetic_history(bars, seed=zlib.crc32(ticker.encode()), freq="D")
+
+
+def fake_result(bars: int, seed: int) -> dict:
+    """A runner result with the fields the metrics and robustness code read."""
+    rng = np.random.default_rng(seed)
+    values = 100000.0 * np.exp(np.cumsum(rng.normal(0.0003, 0.01, bars)))
+    timestamps = 1_600_000_000_000 + np.arange(bars, dtype="int64") * 86_400_000
+    pnl = rng.normal(50.0, 400.0, 30).round(2)
+    final_value = float(values[-1])
+    return {
+        "success": True,
+        "final_value": final_value,
+        "initial_cash": 100000.0,
+        "kpis": {
+            "sharpe_ratio": 0.8,
+            "max_drawdown": 12.5,
+            "total_return": (final_value - 100000.0) / 1000.0,
+            "win_rate": float((pnl > 0).mean() * 100),
+            "total_trades": len(pnl),
+        },
+        "signals": [],
+        "trades": [{"pnl": float(p)} for p in pnl],
+        "equity": {
+            "timestamp": timestamps.tolist(),
+            "value": values.round(2).tolist(),
+            "exposure": [1.0] * bars,
+        },
+    }
+
+
+def make_executor(bars: int, latency: Latency):
+    async def execute(spec: dict, timeout: int) -> dict:
+        """Stands in for runner.execute: waits a sampled job time, returns a result."""
+        await asyncio.sleep(min(latency.sample(), timeout))
+        seed = zlib.crc32(spec["task_id"].encode())
+        return {"success": True, "logs": json.dumps(fake_result(bars, seed))}
+
+    return execute
+
+
+class FakeCluster:
+    """
+    Stands in for the Kubernetes calls of the job runner mode. Like the real
+    client they block the calling thread: ``create_job`` for an API round trip,
+    ``watch_job`` until the sampled job time has passed. Called on the event
+    loop, they show up as loop lag.
+    """
+
+    def __init__(self, bars: int, latency: Latency, create_latency: float = 0.02):
+        self.bars = bars
+        self.latency = latency
+        self.create_latency = create_latency
+        self.created = Counter()
+        self._lock = threading.Lock()
+
+    def init_k8s_client(self, logger) -> bool:
+        return True
+
+    def create_job(self, task_id: str, spec: dict, logger):
+        time.sleep(self.create_latency)
+        with self._lock:
+            self.created[task_id] += 1
+        return SimpleNamespace(
+            name=f"code-execution-{task_id}", namespace="loadtest", task_id=task_id
+        )
+
+    def watch_job(self, job_metadata, timeout, logger) -> dict:
+        time.sleep(min(self.latency.sample(), timeout))
+        seed = zlib.crc32(job_metadata.task_id.encode())
+        return {"success": True, "logs": json.dumps(fake_result(self.bars, seed))}
+
+    def stats(self) -> dict:
+        """Jobs created, and extra Jobs for a task that already had one."""
+        with self._lock:
+            counts = list(self.created.values())
+        return {"created": sum(counts), "duplicates": sum(c - 1 for c in counts)}
+
+
+def seed_code(task_register):
+    """
+    Wrap task_register so every new task already has strategy code, standing
+    in for the agent's code_generator step.
+    """
+    from mcp_server.config import settings
+    from mcp_server.redis import update_task
+
+    def store_code(task):
+        task.code = {"init_code": STRATEGY_INIT, "next_code": STRATEGY_NEXT}
+
+    async def wrapper(redis, user_prompt, **kwargs):
+        result = await task_register(redis, user_prompt, **kwargs)
+        if result.get("status") == "success":
+            await update_task(
+                redis, result["task_id"], store_code, ex=settings.task_expire
+            )
+        return result
+
+    return wrapper
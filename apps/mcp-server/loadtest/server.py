@@ -0,0 +1,114 @@
+import asyncio
+import os
+import tempfile
+import time
+from collections import deque
+
+from loadtest.fakes import (
+    FakeCluster,
+    Latency,
+    MemoryRedis,
+    fake_history,
+    make_executor,
+    seed_code,
+)
+from loadtest.stats import summarize
+
+
+class LagMonitor:
+    """
+    Measures event loop lag: how late a periodic wake-up fires. Anything
+    blocking the loop (sync I/O, CPU-bound parsing) shows up here.
+    """
+
+    def __init__(self, interval: float = 0.01, size: int = 200_000):
+        self.interval = interval
+        self.samples = deque(maxlen=size)
+        self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - expected))
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+
+def build_app(options):
+    """Import the server with the fakes installed."""
+    from functools import partial
+
+    from pydantic import AnyUrl
+
+    from mcp_server import k8s, metrics, runner, tools
+    from mcp_server.config import settings
+
+    settings.job_runner_mode = options.job_mode
+    if options.lock_ttl:
+        settings.lock_ttl = options.lock_ttl
+    if options.history_db == "none":
+        settings.history_db = ""
+    else:
+        settings.history_db = options.history_db or os.path.join(
+            tempfile.mkdtemp(prefix="loadtest-"), "history.sqlite3"
+        )
+    # Faked at the lowest level each mode calls, so blocking stays as it is
+    cluster = FakeCluster(options.bars, Latency(options.job_latency))
+    if options.job_mode == "job":
+        k8s.init_k8s_client = cluster.init_k8s_client
+        k8s.create_job = cluster.create_job
+        k8s.watch_job = cluster.watch_job
+    else:
+        runner.execute = make_executor(options.bars, Latency(options.job_latency))
+    tools.query_ticker_historical_data = partial(
+        fake_history, bars=options.bars, latency=Latency(options.yahoo_latency)
+    )
+    tools.task_register = seed_code(tools.task_register)
+
+    from mcp_server import main
+
+    if options.redis == "memory":
+        memory = MemoryRedis()
+
+        async def init_redis_pool():
+            return memory
+
+        main.init_redis_pool = init_redis_pool
+    else:
+        settings.redis_url = AnyUrl(options.redis)
+
+    monitor = LagMonitor()
+    main.api.add_event_handler("startup", monitor.start)
+    main.api.add_event_handler("shutdown", monitor.stop)
+
+    @main.api.get("/loadtest/lag")
+    def lag():
+        """Event loop lag since the last reset, in seconds."""
+        return summarize(list(monitor.samples))
+
+    @main.api.get("/loadtest/jobs")
+    def jobs():
+        """Jobs the fake cluster was asked to create, and job leases lost."""
+        stats = cluster.stats() if options.job_mode == "job" else {}
+        stats["leases_lost"] = metrics.LOCK_LOST.value(lock="job")
+        return stats
+
+    @main.api.post("/loadtest/reset")
+    def reset():
+        monitor.samples.clear()
+        return {"status": "success"}
+
+    return main.api
+
+
+def serve(options):
+    import uvicorn
+
+    app = build_app(options)
+    uvicorn.run(app, host="127.0.0.1", port=options.port, log_level="warning")
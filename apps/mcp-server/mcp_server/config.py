@@ -9,6 +9,30 @@ class Settings(BaseSettings):
     redis_db: int = int(os.getenv("REDIS_DB", "0"))
     task_expire: int = int(os.getenv("TASK_EXPIRE", "3600"))  # 1 hour
     data_expire: int = int(os.getenv("DATA_EXPIRE", "43200"))  # 12 hours
+    prefetch_max_inflight: int = int(os.getenv("PREFETCH_MAX_INFLIGHT", "8"))
+    benchmark_ticker: str = os.getenv("BENCHMARK_TICKER", "SPY")
+    robustness_workers: int = int(os.getenv("ROBUSTNESS_WORKERS", "4"))
+    robustness_max_samples: int = int(os.getenv("ROBUSTNESS_MAX_SAMPLES", "20000"))
+    robustness_max_cells: int = int(os.getenv("ROBUSTNESS_MAX_CELLS", "20000000"))
+    robustness_budget: float = float(os.getenv("ROBUSTNESS_BUDGET", "3.0"))  # seconds
+    lock_ttl: int = int(os.getenv("LOCK_TTL", "30"))  # seconds, renewed while held
+    fetch_lock_timeout: float = float(os.getenv("FETCH_LOCK_TIMEOUT", "120"))
+    session_routing: str = os.getenv("SESSION_ROUTING", "local")  # local | redis
+    http_cache_bytes: int = int(os.getenv("HTTP_CACHE_BYTES", str(64 * 1024 * 1024)))
+    compress_min_bytes: int = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+    history_db: str = os.getenv("HISTORY_DB", "/data/history/history.sqlite3")  # empty disables
+    history_index_size: int = int(os.getenv("HISTORY_INDEX_SIZE", "1000"))  # runs per sorted set
+    history_keep_output: bool = os.getenv("HISTORY_KEEP_OUTPUT", "true").lower() == "true"
+    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    log_format: str = os.getenv("LOG_FORMAT", "json")  # json | text
+    log_queue_size: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    trace_exporter: str = os.getenv("TRACE_EXPORTER", "none")  # none | log | file | otlp
+    trace_file: str = os.getenv("TRACE_FILE", "traces.jsonl")
+    trace_otlp_endpoint: str = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318")
+    trace_service_name: str = os.getenv("TRACE_SERVICE_NAME", "mcp-server")
+
+    profile_top: int = int(os.getenv("PROFILE_TOP", "20"))  # hot spots per report
+    profile_interval: float = float(os.getenv("PROFILE_INTERVAL", "0.005"))  # sampling, seconds
 
     k8s_config_file: str = os.getenv("K8S_CONFIG_FILE", "../../deploy/kind/kubeconfig.yaml")
     k8s_server_endpoint: str = os.getenv("K8S_SERVER_ENDPOINT", "")
@@ -17,8 +41,10 @@ class Settings(BaseSettings):
     job_redis_host: str = os.getenv("JOB_REDIS_HOST", "host.docker.internal")
     job_redis_port: int = int(os.getenv("JOB_REDIS_PORT", "6379"))
     job_redis_db: int = int(os.getenv("JOB_REDIS_DB", "0"))
-    job_runner_image: str = os.getenv("JOB_RUNNER_IMAGE", "docker.io/go2sheep/code-runner:python-3.12")
+    job_runner_image: str = os.getenv("JOB_RUNNER_IMAGE", "docker.io/go2sheep/code-runner:python-3.12-harness-1")
     job_runner_timeout: int = int(os.getenv("JOB_RUNNER_TIMEOUT", "300"))  # 5 minutes
+    job_runner_mode: str = os.getenv("JOB_RUNNER_MODE", "job")  # job | forkserver
+    job_runner_endpoint: str = os.getenv("JOB_RUNNER_ENDPOINT", "localhost:9000")
 
 
 settings = Settings()
@@ -0,0 +1,615 @@
+"""
+Durable history of backtest runs, with Redis leaderboards over it.
+
+Every successful code_executor run is written to a SQLite file
+(``HISTORY_DB``) that outlives the task's Redis keys. It holds a summary row
+with tickers, time frame, indicator set and KPIs in indexed columns, and the
+full result compressed next to it. Filtered listings are read from the file
+with keyset pagination, so a page costs the same at any depth.
+
+Redis keeps sorted sets of the best ``history_index_size`` runs per KPI over
+all runs (``runs:{kpi}``) and per ticker, time frame and indicator set
+(``runs:ticker:TSLA:{kpi}``). A top-N over one of them is a single ZRANGE.
+The sets are derived data: when Redis loses them they are rebuilt from the file.
+"""
+
+import asyncio
+import base64
+import functools
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Optional
+
+import redis.asyncio as aioredis
+
+from mcp_server import locks, metrics, results
+from mcp_server.config import settings as global_settings
+from mcp_server.logging import AppLogger
+from mcp_server.models import TaskEntry
+
+logger = AppLogger().get_logger()
+# Background rebuilds, referenced until they finish
+_rebuilds: set = set()
+
+# Indexed KPIs, True where higher is better
+KPIS = {
+    "sharpe_ratio": True,
+    "sortino_ratio": True,
+    "calmar_ratio": True,
+    "cagr": True,
+    "total_return": True,
+    "win_rate": True,
+    "total_trades": True,
+    "max_drawdown": False,
+    "volatility": False,
+}
+FACETS = ("ticker", "time_frame", "indicators")
+ORDER_COLUMNS = ("created_at", *KPIS)
+# Set once the sorted sets hold everything in the file
+INDEXED_KEY = "runs:indexed"
+
+INDICATOR_RE = re.compile(r"\bbt\.(?:indicators|ind|talib)\.(\w+)")
+# backtrader names several indicators more than one way
+INDICATOR_ALIASES = {
+    "SMA": ("SimpleMovingAverage", "MovingAverageSimple"),
+    "EMA": ("ExponentialMovingAverage", "MovingAverageExponential"),
+    "WMA": ("WeightedMovingAverage", "MovingAverageWeighted"),
+    "RSI": ("RelativeStrengthIndex", "RSI_SMA", "RSI_EMA", "RSI_Safe"),
+    "MACD": ("MACDHisto", "MACDHistogram"),
+    "BBANDS": ("BollingerBands", "BollingerBandsPct"),
+    "ATR": ("AverageTrueRange",),
+    "STOCHASTIC": ("StochasticSlow", "StochasticFast", "StochasticFull"),
+    "CROSSOVER": ("CrossUp", "CrossDown"),
+    "ADX": ("AverageDirectionalMovementIndex",),
+    "CCI": ("CommodityChannelIndex",),
+}
+_CANONICAL = {
+    alias.lower(): name
+    for name, aliases in INDICATOR_ALIASES.items()
+    for alias in (name, *aliases)
+}
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    task_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    tickers TEXT NOT NULL,
+    time_frame TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    indicators TEXT NOT NULL,
+    portfolio INTEGER NOT NULL,
+    user_prompt TEXT,
+    code TEXT,
+    {", ".join(f"{kpi} REAL" for kpi in KPIS)}
+);
+CREATE TABLE IF NOT EXISTS run_tickers (
+    ticker TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    PRIMARY KEY (ticker, task_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS run_outputs (
+    task_id TEXT PRIMARY KEY,
+    output BLOB NOT NULL,
+    metrics TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_created_at ON runs (created_at, task_id);
+CREATE INDEX IF NOT EXISTS runs_time_frame ON runs (time_frame, created_at);
+CREATE INDEX IF NOT EXISTS runs_indicators ON runs (indicators, created_at);
+{"".join(f"CREATE INDEX IF NOT EXISTS runs_{kpi} ON runs ({kpi}, task_id);" for kpi in KPIS)}
+"""
+SUMMARY_COLUMNS = (
+    "task_id, created_at, tickers, time_frame, start_date, end_date, indicators, "
+    "portfolio, " + ", ".join(KPIS)
+)
+
+
+def enabled() -> bool:
+    return bool(global_settings.history_db)
+
+
+def canonical_indicator(name: str) -> str:
+    return _CANONICAL.get(name.lower(), name.upper())
+
+
+def indicator_set(names) -> str:
+    """Facet value for a set of indicator names: canonical, sorted, comma separated."""
+    if isinstance(names, str):
+        names = names.split(",")
+    return ",".join(sorted({canonical_indicator(n.strip()) for n in names if n.strip()}))
+
+
+def strategy_indicators(code: Optional[dict]) -> str:
+    """The indicator set a generated strategy builds."""
+    sources = []
+    for part in ("init_code", "next_code"):
+        value = (code or {}).get(part) or ""
+        sources.extend([value] if isinstance(value, str) else value)
+    return indicator_set(INDICATOR_RE.findall("\n".join(sources)))
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value) if math.isfinite(value) else None
+
+
+def run_summary(
+    task_id: str, task_entry: TaskEntry, output: dict, metrics_report: Optional[dict]
+) -> dict:
+    """The indexed description of one run; metrics win over the runner's KPIs."""
+    storage_keys = task_entry.storage_keys or [task_entry.storage_key or ""]
+    parts = [(key.split(":") + ["", "", ""])[:4] for key in storage_keys]
+    kpis = output.get("kpis") or {}
+    metrics_report = metrics_report or {}
+    values = {}
+    for kpi in KPIS:
+        value = _number(metrics_report.get(kpi))
+        values[kpi] = value if value is not None else _number(kpis.get(kpi))
+    return {
+        "task_id": task_id,
+        "created_at": time.time(),
+        "tickers": [p[0].upper() for p in parts if p[0]],
+        "time_frame": parts[0][1] or None,
+        "start_date": parts[0][2] or task_entry.start_date,
+        "end_date": parts[0][3] or task_entry.end_date,
+        "indicators": strategy_indicators(task_entry.code),
+        "portfolio": bool(task_entry.storage_keys),
+        "user_prompt": task_entry.user_prompt,
+        "code": task_entry.code,
+        "kpis": values,
+    }
+
+
+def _public(row: sqlite3.Row) -> dict:
+    return {
+        "task_id": row["task_id"],
+        "created_at": datetime.fromtimestamp(row["created_at"], timezone.utc).isoformat(),
+        "tickers": row["tickers"].split(",") if row["tickers"] else [],
+        "time_frame": row["time_frame"],
+        "start_date": row["start_date"],
+        "end_date": row["end_date"],
+        "indicators": row["indicators"].split(",") if row["indicators"] else [],
+        "portfolio": bool(row["portfolio"]),
+        "kpis": {kpi: row[kpi] for kpi in KPIS},
+    }
+
+
+def encode_cursor(value, task_id: str) -> str:
+    raw = json.dumps([value, task_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        value, task_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return value, task_id
+
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """Unix seconds from a timestamp or an ISO date/datetime (UTC unless given)."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid time: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class HistoryStore:
+    """The SQLite file, with one connection per thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            # Readers never wait for the writer, and other workers can share the file
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def record(self, run: dict, output: Optional[bytes], metrics_json: str) -> Optional[dict]:
+        """Insert or replace a run; returns the summary it replaced, if any."""
+        conn = self.connection()
+        columns = [
+            "task_id", "created_at", "tickers", "time_frame", "start_date", "end_date",
+            "indicators", "portfolio", "user_prompt", "code", *KPIS,
+        ]
+        values = [
+            run["task_id"],
+            run["created_at"],
+            ",".join(run["tickers"]),
+            run["time_frame"],
+            run["start_date"],
+            run["end_date"],
+            run["indicators"],
+            int(run["portfolio"]),
+            run["user_prompt"],
+            json.dumps(run["code"]),
+            *(run["kpis"][kpi] for kpi in KPIS),
+        ]
+        with conn:
+            previous = conn.execute(
+                f"SELECT {SUMMARY_COLUMNS} FROM runs WHERE task_id = ?", (run["task_id"],)
+            ).fetchone()
+            conn.execute(
+                f"INSERT OR REPLACE INTO runs ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})",
+                values,
+            )
+            conn.execute("DELETE FROM run_tickers WHERE task_id = ?", (run["task_id"],))
+            conn.executemany(
+                "INSERT OR IGNORE INTO run_tickers (ticker, task_id) VALUES (?, ?)",
+                [(ticker, run["task_id"]) for ticker in run["tickers"]],
+            )
+            if output is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO run_outputs (task_id, output, metrics) VALUES (?, ?, ?)",
+                    (run["task_id"], output, metrics_json),
+                )
+        return _public(previous) if previous else None
+
+    def get(self, task_id: str) -> Optional[dict]:
+        row = self.connection().execute(
+            f"SELECT {SUMMARY_COLUMNS}, user_prompt, code FROM runs WHERE task_id = ?",
+            (task_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        run = _public(row)
+        run["user_prompt"] = row["user_prompt"]
+        run["code"] = json.loads(row["code"]) if row["code"] else None
+        return run
+
+    def rows(self, task_ids: list) -> dict:
+        """Summaries by task id; unknown ids are left out."""
+        if not task_ids:
+            return {}
+        placeholders = ", ".join("?" * len(task_ids))
+        cursor = self.connection().execute(
+            f"SELECT {SUMMARY_COLUMNS} FROM runs WHERE task_id IN ({placeholders})",
+            task_ids,
+        )
+        return {row["task_id"]: _public(row) for row in cursor}
+
+    def output(self, task_id: str) -> Optional[tuple]:
+        """(runner output, metrics) kept for a run, None if not kept."""
+        row = self.connection().execute(
+            "SELECT output, metrics FROM run_outputs WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row["output"])), json.loads(row["metrics"] or "null")
+
+    def query(
+        self,
+        filters: dict,
+        order_by: str = "created_at",
+        descending: bool = True,
+        limit: int = 50,
+        cursor: Optional[tuple] = None,
+    ) -> tuple:
+        """One page of summaries and the cursor of the next page (None at the end)."""
+        if order_by not in ORDER_COLUMNS:
+            raise ValueError(f"Cannot order by {order_by}")
+        where, params = [], []
+        if filters.get("ticker"):
+            where.append("task_id IN (SELECT task_id FROM run_tickers WHERE ticker = ?)")
+            params.append(filters["ticker"])
+        for column in ("time_frame", "indicators"):
+            if filters.get(column):
+                where.append(f"{column} = ?")
+                params.append(filters[column])
+        if filters.get("since") is not None:
+            where.append("created_at >= ?")
+            params.append(filters["since"])
+        if filters.get("until") is not None:
+            where.append("created_at < ?")
+            params.append(filters["until"])
+        if order_by in KPIS:
+            where.append(f"{order_by} IS NOT NULL")
+        if cursor is not None:
+            where.append(f"({order_by}, task_id) {'<' if descending else '>'} (?, ?)")
+            params.extend(cursor)
+        direction = "DESC" if descending else "ASC"
+        sql = (
+            f"SELECT {SUMMARY_COLUMNS} FROM runs"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + f" ORDER BY {order_by} {direction}, task_id {direction} LIMIT ?"
+        )
+        # One extra row tells whether there is a next page
+        rows = self.connection().execute(sql, [*params, limit + 1]).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last[order_by], last["task_id"])
+        return [_public(row) for row in rows], next_cursor
+
+    def leaders(self, kpi: str, facet: Optional[str], size: int) -> list:
+        """(facet value, task id, score) of the best ``size`` runs per facet value."""
+        direction = "DESC" if KPIS[kpi] else "ASC"
+        if facet is None:
+            return self.connection().execute(
+                f"SELECT NULL, task_id, {kpi} FROM runs WHERE {kpi} IS NOT NULL "
+                f"ORDER BY {kpi} {direction} LIMIT ?",
+                (size,),
+            ).fetchall()
+        if facet == "ticker":
+            source = "run_tickers t JOIN runs r USING (task_id)"
+            value = "t.ticker"
+        else:
+            source = "runs r"
+            value = f"r.{facet}"
+        return self.connection().execute(
+            f"SELECT value, task_id, score FROM ("
+            f"SELECT {value} AS value, r.task_id AS task_id, r.{kpi} AS score, "
+            f"ROW_NUMBER() OVER (PARTITION BY {value} ORDER BY r.{kpi} {direction}) AS place "
+            f"FROM {source} WHERE r.{kpi} IS NOT NULL AND {value} != '') WHERE place <= ?",
+            (size,),
+        ).fetchall()
+
+
+@functools.cache
+def get_store() -> HistoryStore:
+    return HistoryStore(global_settings.history_db)
+
+
+def index_key(kpi: str, facet: Optional[str] = None, value: Optional[str] = None) -> str:
+    return f"runs:{kpi}" if facet is None else f"runs:{facet}:{value}:{kpi}"
+
+
+def _facet_values(run: dict) -> list:
+    values = [(None, None)]
+    values += [("ticker", ticker) for ticker in run["tickers"]]
+    if run["time_frame"]:
+        values.append(("time_frame", run["time_frame"]))
+    if run["indicators"]:
+        values.append(("indicators", run["indicators"]))
+    return values
+
+
+def _trim(pipe, key: str, kpi: str, size: int):
+    # Only the best ``size`` members are kept
+    if KPIS[kpi]:
+        pipe.zremrangebyrank(key, 0, -(size + 1))
+    else:
+        pipe.zremrangebyrank(key, size, -1)
+
+
+async def index_run(redis: aioredis.Redis, run: dict, previous: Optional[dict] = None):
+    """Add a run to the sorted sets, moving it out of those it no longer belongs to."""
+    size = global_settings.history_index_size
+    task_id = run["task_id"]
+    async with redis.pipeline(transaction=False) as pipe:
+        if previous is not None:
+            previous = dict(previous, indicators=",".join(previous["indicators"]))
+            for facet, value in _facet_values(previous):
+                for kpi in KPIS:
+                    pipe.zrem(index_key(kpi, facet, value), task_id)
+        for facet, value in _facet_values(run):
+            for kpi, score in run["kpis"].items():
+                if score is None:
+                    continue
+                key = index_key(kpi, facet, value)
+                pipe.zadd(key, {task_id: score})
+                _trim(pipe, key, kpi, size)
+        await pipe.execute()
+
+
+async def rebuild_index(redis: aioredis.Redis) -> bool:
+    """Refill the sorted sets from the file unless they are complete; one worker does it."""
+    if not enabled() or await redis.exists(INDEXED_KEY):
+        return False
+    lock = locks.RedisLock(redis, "history:rebuild")
+    if not await lock.acquire(timeout=0):
+        return False
+    try:
+        if await redis.exists(INDEXED_KEY):
+            return False
+        store = get_store()
+        size = global_settings.history_index_size
+        count = 0
+        for kpi in KPIS:
+            for facet in (None, *FACETS):
+                leaders = await asyncio.to_thread(store.leaders, kpi, facet, size)
+                for start in range(0, len(leaders), 1000):
+                    async with redis.pipeline(transaction=False) as pipe:
+                        keys = set()
+                        for value, task_id, score in leaders[start : start + 1000]:
+                            key = index_key(kpi, facet, value)
+                            pipe.zadd(key, {task_id: score})
+                            keys.add(key)
+                        # Runs indexed meanwhile may have pushed these out
+                        for key in keys:
+                            _trim(pipe, key, kpi, size)
+                        await pipe.execute()
+                count += len(leaders)
+        await redis.set(INDEXED_KEY, str(time.time()))
+        logger.info(f"Rebuilt the run history index with {count} entries.")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to rebuild the run history index: {e}")
+        return False
+    finally:
+        await lock.release()
+
+
+def schedule_rebuild(redis: aioredis.Redis):
+    task = asyncio.ensure_future(rebuild_index(redis))
+    _rebuilds.add(task)
+    task.add_done_callback(_rebuilds.discard)
+
+
+async def record_run(
+    redis: aioredis.Redis,
+    task_id: str,
+    task_entry: TaskEntry,
+    output: dict,
+    metrics_report: Optional[dict] = None,
+) -> dict:
+    """Persist a successful run and index it; returns its summary."""
+    run = run_summary(task_id, task_entry, output, metrics_report)
+    blob = None
+    if global_settings.history_keep_output:
+        blob = zlib.compress(results.dumps(output).encode(), 6)
+    previous = await asyncio.to_thread(
+        get_store().record, run, blob, results.dumps(metrics_report)
+    )
+    await index_run(redis, run, previous)
+    return run
+
+
+async def restore_result(redis: aioredis.Redis, task_id: str) -> Optional[str]:
+    """Put an expired run's result back into Redis from the file; its ETag, or None."""
+    if not enabled():
+        return None
+    stored = await asyncio.to_thread(get_store().output, task_id)
+    if stored is None:
+        return None
+    output, metrics_report = stored
+    return await results.store_result(
+        redis, task_id, output, metrics=metrics_report, ex=global_settings.task_expire
+    )
+
+
+def _filters(ticker, time_frame, indicators, since, until) -> dict:
+    return {
+        "ticker": ticker.upper() if ticker else None,
+        "time_frame": time_frame or None,
+        "indicators": indicator_set(indicators) if indicators else None,
+        "since": parse_time(since),
+        "until": parse_time(until),
+    }
+
+
+async def list_runs(
+    ticker: Optional[str] = None,
+    time_frame: Optional[str] = None,
+    indicators: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    order_by: str = "created_at",
+    order: str = "desc",
+    limit: int = 50,
+    cursor: Optional[str] = None,
+) -> dict:
+    """A page of runs matching all filters, and the cursor of the next one."""
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Unsupported order: {order}")
+    filters = _filters(ticker, time_frame, indicators, since, until)
+    with metrics.HISTORY_QUERY.time(query="list", source="store"):
+        runs, next_cursor = await asyncio.to_thread(
+            get_store().query,
+            filters,
+            order_by,
+            order == "desc",
+            limit,
+            decode_cursor(cursor) if cursor else None,
+        )
+    return {"runs": runs, "next_cursor": next_cursor}
+
+
+async def top_runs(
+    redis: aioredis.Redis,
+    kpi: str = "sharpe_ratio",
+    n: int = 10,
+    ticker: Optional[str] = None,
+    time_frame: Optional[str] = None,
+    indicators: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> dict:
+    """
+    The best ``n`` runs by ``kpi``. With at most one of ticker, time frame and
+    indicators and no time range, the answer comes from the sorted sets;
+    otherwise from the file.
+    """
+    if kpi not in KPIS:
+        raise ValueError(f"Unknown KPI: {kpi}")
+    filters = _filters(ticker, time_frame, indicators, since, until)
+    facets = [facet for facet in FACETS if filters[facet]]
+    indexed = (
+        len(facets) <= 1
+        and filters["since"] is None
+        and filters["until"] is None
+        and n <= global_settings.history_index_size
+    )
+    if indexed and not await redis.exists(INDEXED_KEY):
+        # Redis lost the sets; answer from the file while they are rebuilt
+        indexed = False
+        schedule_rebuild(redis)
+    stale = []
+    if indexed:
+        with metrics.HISTORY_QUERY.time(query="top", source="index"):
+            facet = facets[0] if facets else None
+            key = index_key(kpi, facet, filters[facet] if facet else None)
+            if KPIS[kpi]:
+                members = await redis.zrevrange(key, 0, n - 1)
+            else:
+                members = await redis.zrange(key, 0, n - 1)
+            found = await asyncio.to_thread(get_store().rows, list(members))
+        stale = [task_id for task_id in members if task_id not in found]
+        if not stale:
+            runs = [found[task_id] for task_id in members]
+            return {"kpi": kpi, "source": "index", "runs": runs}
+        # The file no longer has runs the set lists, e.g. it was recreated
+        logger.warning(
+            f"Run history index {key} lists {len(stale)} runs missing from "
+            f"{global_settings.history_db}, refilling it from the file."
+        )
+    size = global_settings.history_index_size if stale else n
+    with metrics.HISTORY_QUERY.time(query="top", source="store"):
+        runs, _ = await asyncio.to_thread(
+            get_store().query, filters, kpi, KPIS[kpi], size
+        )
+    if stale:
+        await _refill(redis, key, kpi, stale, runs)
+    return {"kpi": kpi, "source": "store", "runs": runs[:n]}
+
+
+async def _refill(redis: aioredis.Redis, key: str, kpi: str, stale: list, runs: list):
+    """Replace missing runs in a sorted set with the best ones the file has."""
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zrem(key, *stale)
+        scores = {run["task_id"]: run["kpis"][kpi] for run in runs}
+        scores = {task_id: score for task_id, score in scores.items() if score is not None}
+        if scores:
+            pipe.zadd(key, scores)
+        _trim(pipe, key, kpi, global_settings.history_index_size)
+        await pipe.execute()
+
+
+async def get_run(task_id: str) -> Optional[dict]:
+    return await asyncio.to_thread(get_store().get, task_id)
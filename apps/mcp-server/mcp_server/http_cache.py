@@ -0,0 +1,226 @@
+"""
+Conditional requests and compression for the JSON read endpoints.
+
+Bodies get a strong ETag from a hash of their content. A request whose
+If-None-Match matches is answered with 304 before the payload is rendered.
+Otherwise the body is compressed with the best encoding the client accepts
+(zstd, br or gzip), and
+compressed variants are kept in a size-bounded LRU so each body is
+compressed once per encoding.
+"""
+
+import gzip
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from mcp_server.config import settings as global_settings
+
+# Both are dependencies; an environment synced without them still serves gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_TYPE = "application/json"
+
+
+def _zstd(body: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=6).compress(body)
+
+
+def _br(body: bytes) -> bytes:
+    return brotli.compress(body, quality=5)
+
+
+def _gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+# In order of preference when the client accepts several with equal q
+ENCODERS: dict[str, Callable[[bytes], bytes]] = {}
+if zstandard is not None:
+    ENCODERS["zstd"] = _zstd
+if brotli is not None:
+    ENCODERS["br"] = _br
+ENCODERS["gzip"] = _gzip
+
+
+def content_etag(*parts) -> str:
+    """Strong ETag over the given str or bytes parts."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode() if isinstance(part, str) else part)
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()}"'
+
+
+def _variant_etag(etag: str, encoding: Optional[str]) -> str:
+    # Each encoding is a different representation, so it gets its own strong tag
+    return etag if encoding is None else f'{etag[:-1]}-{encoding}"'
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """True if If-None-Match names ``etag`` in any of its encoded variants."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    base = etag[1:-1]
+    for tag in header.split(","):
+        tag = tag.strip().removeprefix("W/").strip('"')
+        if tag == base or tag.rsplit("-", 1)[0] == base:
+            return True
+    return False
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """The encoding to use for an Accept-Encoding header, None for identity."""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name.lower()] = q
+    best, best_q = None, 0.0
+    for encoding in ENCODERS:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class SizedLRU:
+    """LRU mapping bounded by the total ``sizeof`` of its values."""
+
+    def __init__(self, max_bytes: int, sizeof: Callable = len):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.size = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def pop(self, key):
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self.size -= self.sizeof(value)
+            return value
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        self.pop(key)
+        with self._lock:
+            self._entries[key] = value
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= self.sizeof(evicted)
+
+
+# Compressed variants by (ETag, encoding), and rendered bodies of immutable
+# documents by name as (body, etag, expires_at)
+_compressed = SizedLRU(global_settings.http_cache_bytes // 2)
+_bodies = SizedLRU(global_settings.http_cache_bytes // 2, sizeof=lambda entry: len(entry[0]))
+
+
+def compress(body: bytes, etag: str, encoding: str) -> bytes:
+    key = (etag, encoding)
+    compressed = _compressed.get(key)
+    if compressed is None:
+        compressed = ENCODERS[encoding](body)
+        _compressed.put(key, compressed)
+    return compressed
+
+
+def render_json(content) -> bytes:
+    """Encode like FastAPI's JSONResponse."""
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def cached_body(name: str):
+    """(body, etag, expires_at) rendered earlier for ``name``, None if unknown or expired."""
+    entry = _bodies.get(name)
+    if entry is not None and entry[2] <= time.time():
+        _bodies.pop(name)
+        return None
+    return entry
+
+
+def remember_body(name: str, body: bytes, etag: str, ttl: int):
+    """Keep the rendered body of an immutable document for ``ttl`` seconds."""
+    entry = (body, etag, time.time() + ttl)
+    _bodies.put(name, entry)
+    return entry
+
+
+def _headers(etag: str, encoding: Optional[str], cache_control: str) -> dict:
+    return {
+        "ETag": _variant_etag(etag, encoding),
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+
+
+def not_modified_response(
+    request: Request, etag: str, cache_control: str, size: Optional[int] = None
+) -> Response:
+    """304 naming the variant a 200 would have sent; ``size`` is the body size if known."""
+    return Response(
+        status_code=304,
+        headers=_headers(etag, _choose_encoding(request, size), cache_control),
+    )
+
+
+def _choose_encoding(request: Request, size: Optional[int]) -> Optional[str]:
+    if size is not None and size < global_settings.compress_min_bytes:
+        return None
+    return negotiate(request.headers.get("accept-encoding", ""))
+
+
+def cached_response(
+    request: Request,
+    body: bytes,
+    etag: str,
+    cache_control: str,
+    media_type: str = JSON_TYPE,
+) -> Response:
+    """200 with ``body``, compressed if worthwhile, or 304 if the client has it."""
+    if not_modified(request, etag):
+        return not_modified_response(request, etag, cache_control, len(body))
+    encoding = _choose_encoding(request, len(body))
+    headers = _headers(etag, encoding, cache_control)
+    if encoding is not None:
+        body = compress(body, etag, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
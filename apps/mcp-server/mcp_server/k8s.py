@@ -1,32 +1,79 @@
+import json
+import shlex
+import threading
 from logging import Logger
 from time import time, sleep
-from kubernetes import config, client
+from mcp_server import metrics
 from mcp_server.config import settings as global_settings
 
+# The kubernetes package takes about half a second to import, so it is loaded
+# and configured on first use rather than when the server starts
+_client = None
+_client_lock = threading.Lock()
+_verified = False
 
-def init_k8s_client(logger: Logger):
+
+def get_client():
+    """The configured ``kubernetes.client`` module."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from kubernetes import client, config
+
+                cfg = client.Configuration()
+                config.load_kube_config(
+                    config_file=global_settings.k8s_config_file,
+                    client_configuration=cfg,
+                )
+                if global_settings.k8s_server_endpoint:
+                    cfg.host = global_settings.k8s_server_endpoint
+                client.Configuration.set_default(cfg)
+                _client = client
+    return _client
+
+
+def init_k8s_client(logger: Logger) -> bool:
+    """Configure the client and check the API server answers; False if not."""
+    global _verified
+    if _verified:
+        return True
     try:
-        cfg = client.Configuration()
-        config.load_kube_config(
-            config_file=global_settings.k8s_config_file, client_configuration=cfg
-        )
+        client = get_client()
         if global_settings.k8s_server_endpoint:
-            cfg.host = global_settings.k8s_server_endpoint
-            logger.info(f"Using custom K8s server endpoint: {cfg.host}")
-        client.Configuration.set_default(cfg)
-        logger.info("K8s config loaded successfully.")
-        version = client.VersionApi().get_code()
+            logger.info(f"Using custom K8s server endpoint: {global_settings.k8s_server_endpoint}")
+        version = client.VersionApi().get_code(_request_timeout=5)
         logger.info(f"K8s version: {version.git_version}")
+        _verified = True
     except Exception as e:
-        logger.fatal(f"Error loading K8s config: {e}")
-        exit(1)
+        logger.error(f"Error loading K8s config: {e}")
+    return _verified
+
+
+DATA_DIR = "/mnt/data/raw"
+
 
+def _reader_commands(storage_keys: list) -> list:
+    redis_cli = f"redis-cli -h {global_settings.job_redis_host} -p {global_settings.job_redis_port} -n {global_settings.job_redis_db}"
+    # One file per storage key, named by position
+    return [f"mkdir -p {DATA_DIR};"] + [
+        f"{redis_cli} get {shlex.quote(key)} > {DATA_DIR}/{i}.json;"
+        for i, key in enumerate(storage_keys)
+    ]
 
-def create_job(task_id: str, storage_key: str, code: str, logger: Logger):
+
+def create_job(task_id: str, spec: dict, logger: Logger):
+    client = get_client()
     job_metadata = client.V1ObjectMeta(
         name=f"code-execution-{task_id}", namespace=global_settings.job_namespace
     )
-    configMap = client.V1ConfigMap(metadata=job_metadata, data={"code": code})
+    storage_keys = spec["storage_keys"]
+    spec = dict(
+        spec, data_files=[f"{DATA_DIR}/{i}.json" for i in range(len(storage_keys))]
+    )
+    configMap = client.V1ConfigMap(
+        metadata=job_metadata, data={"spec": json.dumps(spec)}
+    )
     core_v1 = client.CoreV1Api()
     try:
         core_v1.create_namespaced_config_map(
@@ -39,6 +86,10 @@ def create_job(task_id: str, storage_key: str, code: str, logger: Logger):
         else:
             raise e
 
+    # Trace context for the runner's spans
+    env = None
+    if spec.get("traceparent"):
+        env = [client.V1EnvVar(name="TRACEPARENT", value=spec["traceparent"])]
     pod_spec = client.V1PodSpec(
         init_containers=[
             client.V1Container(
@@ -52,7 +103,7 @@ def create_job(task_id: str, storage_key: str, code: str, logger: Logger):
                         [
                             "set -e;",
                             "echo 'Fetching data from Redis...'",
-                            f"redis-cli -h {global_settings.job_redis_host} -p {global_settings.job_redis_port} -n {global_settings.job_redis_db} get {storage_key} > /mnt/data/output.json;",
+                            *_reader_commands(storage_keys),
                             "echo 'Data fetched successfully.'",
                         ]
                     ),
@@ -67,14 +118,15 @@ def create_job(task_id: str, storage_key: str, code: str, logger: Logger):
                 name="code-execution",
                 image=global_settings.job_runner_image,
                 image_pull_policy="IfNotPresent",
+                env=env,
                 command=[
                     "python",
                     "-W",
                     "ignore::SyntaxWarning",
-                    "/mnt/data/code/code.py",
-                ],
-                env=[
-                    client.V1EnvVar(name="RAW_DATA_FILE", value="/mnt/data/output.json")
+                    "-m",
+                    "agentquant_runner",
+                    "run",
+                    "/mnt/data/code/spec.json",
                 ],
                 volume_mounts=[
                     client.V1VolumeMount(name="data-volume", mount_path="/mnt/data"),
@@ -89,7 +141,7 @@ def create_job(task_id: str, storage_key: str, code: str, logger: Logger):
                 name="code-volume",
                 config_map=client.V1ConfigMapVolumeSource(
                     name=job_metadata.name,
-                    items=[client.V1KeyToPath(key="code", path="code.py")],
+                    items=[client.V1KeyToPath(key="spec", path="spec.json")],
                 ),
             ),
             client.V1Volume(
@@ -119,7 +171,41 @@ def create_job(task_id: str, storage_key: str, code: str, logger: Logger):
     return job_metadata
 
 
-def watch_job(job_metadata, timeout):
+def record_phases(job, pod):
+    """
+    Observe the Job phases from the timestamps Kubernetes recorded, so no extra
+    polling is needed: created -> scheduled -> runner started -> runner finished.
+    """
+    scheduled = next(
+        (
+            c.last_transition_time
+            for c in pod.status.conditions or []
+            if c.type == "PodScheduled" and c.status == "True"
+        ),
+        None,
+    )
+    terminated = next(
+        (
+            s.state.terminated
+            for s in pod.status.container_statuses or []
+            if s.name == "code-execution" and s.state and s.state.terminated
+        ),
+        None,
+    )
+    created = job.metadata.creation_timestamp
+    started = terminated.started_at if terminated else None
+    finished = terminated.finished_at if terminated else None
+    for phase, begin, end in (
+        ("scheduled", created, scheduled),
+        ("running", scheduled, started),
+        ("done", started, finished),
+    ):
+        if begin and end:
+            metrics.JOB_PHASE.observe(max(0.0, (end - begin).total_seconds()), phase=phase)
+
+
+def watch_job(job_metadata, timeout, logger: Logger):
+    client = get_client()
     batch_v1 = client.BatchV1Api()
     start_time = time()
     while True:
@@ -127,7 +213,7 @@ def watch_job(job_metadata, timeout):
             name=job_metadata.name, namespace=job_metadata.namespace
         )
         if job.status.succeeded:
-            print(f"Job {job_metadata.name} completed successfully.")
+            logger.info("Job %s completed successfully.", job_metadata.name)
             core_v1 = client.CoreV1Api()
             pod_list = core_v1.list_namespaced_pod(
                 namespace=job_metadata.namespace,
@@ -135,11 +221,13 @@ def watch_job(job_metadata, timeout):
             )
             if pod_list.items:
                 pod = pod_list.items[0]
-                logs = core_v1.read_namespaced_pod_log(
-                    name=pod.metadata.name,
-                    namespace=pod.metadata.namespace,
-                    container="code-execution",
-                )
+                record_phases(job, pod)
+                with metrics.POD_LOG_FETCH.time():
+                    logs = core_v1.read_namespaced_pod_log(
+                        name=pod.metadata.name,
+                        namespace=pod.metadata.namespace,
+                        container="code-execution",
+                    )
                 return {"success": True, "logs": logs}
             else:
                 return {"success": False, "message": "No pods found"}
@@ -151,6 +239,7 @@ def watch_job(job_metadata, timeout):
 
 
 def list_jobs():
+    client = get_client()
     batch_v1 = client.BatchV1Api()
     jobs = batch_v1.list_namespaced_job(namespace=global_settings.job_namespace)
     jobs_list = []
@@ -0,0 +1,154 @@
+"""
+Leases on Redis keys, shared by every worker and replica using the same Redis.
+
+A lease is a ``lock:{name}`` key set with NX and a TTL holding a random token.
+While held, a background task renews the TTL, so a crashed holder frees the
+lease after ``ttl`` seconds. Renewal and release only touch the key if it still
+holds our token, checked with WATCH/MULTI like ``update_task``.
+"""
+
+import asyncio
+import random
+import time
+import uuid
+from typing import Optional
+
+import redis.asyncio as aioredis
+from redis.exceptions import WatchError
+
+from mcp_server import metrics
+from mcp_server.config import settings as global_settings
+from mcp_server.logging import AppLogger
+
+logger = AppLogger().get_logger()
+
+
+class LockTimeout(Exception):
+    """The lease was not acquired within the timeout."""
+
+
+def lock_key(name: str) -> str:
+    return f"lock:{name}"
+
+
+async def is_locked(redis: aioredis.Redis, name: str) -> bool:
+    return bool(await redis.exists(lock_key(name)))
+
+
+class RedisLock:
+    """
+    ``async with RedisLock(redis, "fetch:AAPL:1d:...", timeout=60):`` waits up to
+    ``timeout`` seconds (None waits forever) and raises LockTimeout otherwise.
+    """
+
+    def __init__(
+        self,
+        redis: aioredis.Redis,
+        name: str,
+        ttl: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        self.redis = redis
+        self.name = name
+        self.key = lock_key(name)
+        self.ttl = ttl or global_settings.lock_ttl
+        self.timeout = timeout
+        self.token = uuid.uuid4().hex
+        self.lost = False
+        self._renewal: Optional[asyncio.Task] = None
+
+    @property
+    def kind(self) -> str:
+        return self.name.split(":", 1)[0]
+
+    async def _poll(self, attempt, timeout: Optional[float]) -> bool:
+        """Call ``attempt`` with jittered backoff until it is true or time runs out."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = 0.05
+        while True:
+            if await attempt():
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            sleep = delay * random.uniform(0.5, 1.5)
+            if deadline is not None:
+                sleep = min(sleep, max(0.0, deadline - time.monotonic()))
+            await asyncio.sleep(sleep)
+            delay = min(delay * 1.5, 1.0)
+
+    async def _try_acquire(self) -> bool:
+        return bool(await self.redis.set(self.key, self.token, ex=self.ttl, nx=True))
+
+    async def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Take the lease, waiting up to ``timeout`` seconds; 0 tries once."""
+        start = time.perf_counter()
+        acquired = await self._poll(self._try_acquire, timeout)
+        metrics.LOCK_WAIT.observe(
+            time.perf_counter() - start,
+            lock=self.kind,
+            outcome="acquired" if acquired else "timeout",
+        )
+        if acquired:
+            self.lost = False
+            self._renewal = asyncio.ensure_future(self._renew())
+        return acquired
+
+    async def wait_released(self, timeout: Optional[float] = None) -> bool:
+        """Wait until nobody holds the lease, without taking it."""
+
+        async def released():
+            return not await self.redis.exists(self.key)
+
+        return await self._poll(released, timeout)
+
+    async def _if_owner(self, command, *args) -> bool:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(self.key)
+                if await pipe.get(self.key) != self.token:
+                    return False
+                pipe.multi()
+                getattr(pipe, command)(self.key, *args)
+                await pipe.execute()
+                return True
+            except WatchError:
+                # Only an expiry or another owner can change the key under us
+                return False
+
+    async def _renew(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                renewed = await self._if_owner("expire", self.ttl)
+            except Exception as e:
+                logger.warning(f"Failed to renew lock {self.key}: {e}")
+                continue
+            if not renewed:
+                self._expired()
+                return
+
+    def _expired(self):
+        if not self.lost:
+            self.lost = True
+            metrics.LOCK_LOST.inc(lock=self.kind)
+            logger.warning(f"Lock {self.key} expired while held.")
+
+    async def release(self):
+        if self._renewal is not None:
+            self._renewal.cancel()
+            self._renewal = None
+        try:
+            # Not ours any more: it expired before renewal got to run
+            if not await self._if_owner("delete"):
+                self._expired()
+        except Exception as e:
+            # The TTL frees it anyway
+            logger.warning(f"Failed to release lock {self.key}: {e}")
+
+    async def __aenter__(self):
+        if not await self.acquire(self.timeout):
+            raise LockTimeout(f"Timed out waiting for lock {self.key}")
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.release()
@@ -1,10 +1,40 @@
-import logging
+"""
+Non-blocking logging for the server.
+
+``configure_logging`` puts a single queue handler on the root logger. Calling
+threads (the event loop included) only append the record to a bounded queue;
+a background listener thread formats it and writes one JSON object per line to
+stderr. When the queue is full the record is dropped and counted in
+``log_records_dropped_total`` instead of stalling the caller.
+
+Records keep their ``msg`` and ``args`` until the listener formats them, so
+``logger.debug("... %s", value)`` costs nothing when debug is off and little
+when it is on.
+"""
 
-from rich.console import Console
-from rich.logging import RichHandler
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from threading import Lock
+from typing import Optional
 
+from mcp_server import metrics, tracing
+from mcp_server.config import settings as global_settings
 from mcp_server.utils import SingletonMeta
 
+# Attributes every LogRecord has; anything else was passed in ``extra``
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+# Loggers that uvicorn gives handlers of their own
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+_listener: Optional["QueueListener"] = None
+_handler: Optional["QueueHandler"] = None
+_configure_lock = Lock()
+
 
 class AppLogger(metaclass=SingletonMeta):
     _logger = None
@@ -16,8 +46,110 @@ class AppLogger(metaclass=SingletonMeta):
         return self._logger
 
 
-class RichConsoleHandler(RichHandler):
-    def __init__(self, width=200, style=None, **kwargs):
-        super().__init__(
-            console=Console(color_system="256", width=width, style=style), **kwargs
-        )
\ No newline at end of file
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with trace ids and ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRS and value is not None:
+                entry[name] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records unformatted and never blocks; full queue means drop."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only what the calling context knows is resolved here, the rest is
+        # left to the listener thread
+        span = tracing.current_span()
+        if span is not None:
+            record.trace_id = span.trace_id
+            record.span_id = span.span_id
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.LOG_DROPPED.inc(level=record.levelname)
+
+
+class QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait briefly for room rather than fail when stopping with a full queue
+        self.queue.put(self._sentinel, timeout=5)
+
+
+def _formatter(fmt: str) -> logging.Formatter:
+    if fmt == "text":
+        return logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    return JsonFormatter()
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None):
+    """
+    Route the root logger through the queue, once per process. Later calls
+    only re-route uvicorn's loggers, which uvicorn may have set up since.
+    """
+    global _listener, _handler
+    with _configure_lock:
+        root = logging.getLogger()
+        if _handler is None:
+            stream = logging.StreamHandler(sys.stderr)
+            stream.setFormatter(_formatter(fmt or global_settings.log_format))
+            _handler = QueueHandler(queue.Queue(global_settings.log_queue_size))
+            _listener = QueueListener(
+                _handler.queue, stream, respect_handler_level=True
+            )
+            _listener.start()
+            atexit.register(stop_logging)
+            # Replaces anything installed before, e.g. a console handler
+            for handler in root.handlers[:]:
+                root.removeHandler(handler)
+            root.addHandler(_handler)
+        root.setLevel((level or global_settings.log_level).upper())
+        for name in UVICORN_LOGGERS:
+            uvicorn_logger = logging.getLogger(name)
+            uvicorn_logger.handlers.clear()
+            uvicorn_logger.propagate = True
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def __getattr__(name):
+    # rich is imported only by code that asks for the handler
+    if name == "RichConsoleHandler":
+        from rich.console import Console
+        from rich.logging import RichHandler
+
+        class RichConsoleHandler(RichHandler):
+            def __init__(self, width=200, style=None, **kwargs):
+                super().__init__(
+                    console=Console(color_system="256", width=width, style=style),
+                    **kwargs,
+                )
+
+        globals()[name] = RichConsoleHandler
+        return RichConsoleHandler
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,190 +1,132 @@
+import asyncio
 import json
-import uuid
-from fastapi import FastAPI
+import time
+from typing import Optional
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 
-from mcp_server.generator import (
-    generate_execution_with_data_code,
-    generate_strategy_code,
-)
-from mcp_server import k8s
-from mcp_server.logging import AppLogger
+from mcp_server import history, http_cache, k8s, metrics, results, robustness, tools
+from mcp_server.config import settings as global_settings
+from mcp_server.logging import AppLogger, configure_logging
 from mcp_server.redis import init_redis_pool
 from mcp_server.sse import create_sse_server
 from mcp.server.fastmcp import FastMCP
-from mcp_server.models import TaskEntry
-from mcp_server.config import settings as global_settings
-from mcp_server.ticker import (
-    ohlcv_to_redis,
-    query_ticker_historical_data,
-    redis_to_ohlcv,
-    yfinance_to_ohlcv,
-)
-from mcp_server.utils import compact_json_tool, safe_parse_logs
+from mcp_server.models import PrefetchRequest, TaskEntry
+from mcp_server.ticker import redis_to_ohlcv
+from mcp_server.utils import compact_json_tool
 
 
+# Before FastMCP, whose own setup only runs if the root logger has no handlers
+configure_logging()
 logger = AppLogger().get_logger()
 api = FastAPI(logger=logger)
 mcp = FastMCP("Server")
-k8s.init_k8s_client(logger=logger)
 
 
 @api.on_event("startup")
 async def startup_event():
+    # uvicorn may have installed its own handlers after the import
+    configure_logging()
     logger.info("Opening redis connection pool.")
     api.state.redis = await init_redis_pool()
+    robustness.warmup()
+    # Refill the leaderboards if Redis lost them
+    history.schedule_rebuild(api.state.redis)
+    if global_settings.job_runner_mode == "job":
+        # Connect to the cluster off the startup path; /ready waits for it
+        api.state.k8s_check = asyncio.create_task(
+            asyncio.to_thread(k8s.init_k8s_client, logger)
+        )
 
 
 @api.on_event("shutdown")
 async def shutdown_event():
     logger.info("Closing redis connection pool.")
     await api.state.redis.close()
+    robustness.shutdown()
 
 
 @mcp.tool()
 @compact_json_tool
-async def task_register(user_prompt: str) -> dict:
+@metrics.track_tool
+async def task_register(user_prompt: str, traceparent: Optional[str] = None) -> dict:
     """Register a task with the user_prompt, return a task UUID if succeeded."""
-    try:
-        uid = str(uuid.uuid4())
-        logger.debug(f"Registered task {uid} with prompt: {user_prompt}")
-        entry = TaskEntry(user_prompt=user_prompt)
-        await api.state.redis.set(
-            uid, json.dumps(entry.to_dict()), ex=global_settings.task_expire
-        )
-    except Exception as e:
-        logger.error(f"Failed to save to Redis: {e}")
-        return {"task_id": uid, "status": "failed"}
-    return {"task_id": uid, "status": "success"}
+    return await tools.task_register(
+        api.state.redis, user_prompt, traceparent=traceparent
+    )
 
 
 @mcp.tool()
 @compact_json_tool
+@metrics.track_tool
 async def yh_query_save(
-    task_id: str, ticker: str, time_frame: str, start_date: str, end_date: str
+    task_id: str,
+    ticker: str,
+    time_frame: str,
+    start_date: str,
+    end_date: str,
+    traceparent: Optional[str] = None,
 ) -> dict:
     """Query Yahoo Finance and save the data, return storage key if succeeded."""
-    try:
-        stroage_key = f"{ticker}:{time_frame}:{start_date}:{end_date}"
-        cached_data = await api.state.redis.get(stroage_key)
-        if cached_data:
-            logger.debug(f"Data for {stroage_key} already exists in Redis.")
-            task_info = await api.state.redis.get(task_id)
-            if task_info:
-                task_entry = TaskEntry(**json.loads(task_info))
-                task_entry.storage_key = stroage_key
-                task_entry.ticker = ticker
-                task_entry.start_date = start_date
-                task_entry.end_date = end_date
-                await api.state.redis.set(
-                    task_id,
-                    json.dumps(task_entry.to_dict()),
-                    ex=global_settings.task_expire,
-                )
-            logger.debug(f"Task info for {task_id} updated in Redis.")
-            return {"task_id": task_id, "status": "success", "storage_key": stroage_key}
-        else:
-            logger.info(f"Fetching data for {stroage_key} from Yahoo Finance...")
-            data = query_ticker_historical_data(
-                ticker, start_date, end_date, time_frame
-            )
-            if data.empty:
-                logger.warning(
-                    f"No data found for {ticker} between {start_date} and {end_date}"
-                )
-                return {
-                    "task_id": task_id,
-                    "status": "failed",
-                    "message": f"No data found for {ticker} between {start_date} and {end_date}",
-                }
-            ohlcv_data = yfinance_to_ohlcv(data)
-            timestamp_arrays = ohlcv_to_redis(ohlcv_data)
-            await api.state.redis.set(
-                stroage_key,
-                json.dumps(timestamp_arrays),
-                ex=global_settings.data_expire,
-            )
-            logger.debug(f"Data for {stroage_key} saved to Redis.")
-            task_info = await api.state.redis.get(task_id)
-            if task_info:
-                task_entry = TaskEntry(**json.loads(task_info))
-                task_entry.storage_key = stroage_key
-                task_entry.ticker = ticker
-                task_entry.start_date = start_date
-                task_entry.end_date = end_date
-                await api.state.redis.set(
-                    task_id,
-                    json.dumps(task_entry.to_dict()),
-                    ex=global_settings.task_expire,
-                )
-            logger.debug(f"Task info for {task_id} updated in Redis.")
-            return {"task_id": task_id, "status": "success", "storage_key": stroage_key}
-    except Exception as e:
-        logger.error(f"Failed to query Redis: {e}")
-        return {"task_id": task_id, "status": "failed", "message": str(e)}
+    return await tools.yh_query_save(
+        api.state.redis,
+        task_id,
+        ticker,
+        time_frame,
+        start_date,
+        end_date,
+        traceparent=traceparent,
+    )
 
 
 @mcp.tool()
 @compact_json_tool
-async def code_executor(task_id: str) -> dict:
-    """Execute the generated code and return the output."""
-    try:
-        task_data = await api.state.redis.get(task_id)
-        if task_data is None:
-            return {"task_id": task_id, "status": "failed", "message": "Task not found"}
-        task_entry = TaskEntry(**json.loads(task_data))
-        storage_key = task_entry.storage_key
-        if (
-            task_entry.code is None
-            or "init_code" not in task_entry.code
-            or "next_code" not in task_entry.code
-        ):
-            return {"task_id": task_id, "status": "failed", "message": "Code not found"}
-
-        strategy_code = generate_strategy_code(
-            init_code=task_entry.code.get("init_code"),
-            next_code=task_entry.code.get("next_code"),
-        )
-        execution_code = generate_execution_with_data_code(
-            strategy_code=strategy_code,
-            initial_cash=100000.0,
-        )
-        job = k8s.create_job(task_id, storage_key, execution_code, logger=logger)
-        result = k8s.watch_job(job, timeout=global_settings.job_runner_timeout)
-        if result["success"]:
-            try:
-                logs_json = safe_parse_logs(result["logs"])
-                task_entry.execute_status = "success"
-                task_entry.execute_output = json.dumps(logs_json)
-                await api.state.redis.set(
-                    task_id,
-                    json.dumps(task_entry.to_dict()),
-                    ex=global_settings.task_expire,
-                )
-            except Exception as e:
-                logger.error(f"Failed to parse logs: {e}")
-                return {
-                    "task_id": task_id,
-                    "status": "failed",
-                    "message": "Logs are not valid JSON",
-                }
-            return {
-                "task_id": task_id,
-                "status": "success",
-                "output": {
-                    "kpis": logs_json.get("kpis", {}),
-                },
-            }
-    except Exception as e:
-        logger.error(f"Code execution failed: {e}")
-        return {"task_id": task_id, "status": "failed", "message": str(e)}
-    task_entry.execute_status = "failed"
-    await api.state.redis.set(
+@metrics.track_tool
+async def code_executor(
+    task_id: str,
+    storage_keys: Optional[list[str]] = None,
+    weights: Optional[dict[str, float]] = None,
+    rebalance: str = "none",
+    profile: Optional[str] = None,
+    traceparent: Optional[str] = None,
+) -> dict:
+    """Execute the generated code and return the output.
+
+    Pass storage_keys from several yh_query_save calls to backtest the strategy
+    on a portfolio with shared cash. weights maps ticker to target weight
+    (equal weight if omitted), rebalance is one of none/weekly/monthly/quarterly.
+    profile (deterministic or sampling) adds a hot-spot report to the output.
+    """
+    return await tools.code_executor(
+        api.state.redis,
         task_id,
-        json.dumps(task_entry.to_dict()),
-        ex=global_settings.task_expire,
+        storage_keys,
+        weights,
+        rebalance,
+        profile,
+        traceparent=traceparent,
+    )
+
+
+@mcp.tool()
+@compact_json_tool
+@metrics.track_tool
+async def robustness_check(
+    task_id: str,
+    method: str = "bootstrap",
+    samples: int = 2000,
+    seed: int = 42,
+    traceparent: Optional[str] = None,
+) -> dict:
+    """Resample an executed backtest and return confidence intervals.
+
+    method is bootstrap (per-bar returns), trade_bootstrap or trade_shuffle
+    (closed trades). Results are reproducible for a given seed.
+    """
+    return await tools.robustness_check(
+        api.state.redis, task_id, method, samples, seed, traceparent=traceparent
     )
-    return {"task_id": task_id, "status": "failed", "message": "Job failed"}
 
 
 api.mount("/mcp", create_sse_server(mcp))
@@ -197,40 +139,206 @@ def read_root():
 
 @api.get("/health")
 def health_check():
+    """Liveness: the process serves requests."""
     return {"status": "healthy"}
 
 
+@api.get("/ready")
+async def readiness_check():
+    """Readiness: Redis answers and, in job mode, the cluster client works."""
+    checks = {}
+    try:
+        checks["redis"] = bool(
+            await asyncio.wait_for(api.state.redis.ping(), timeout=2.0)
+        )
+    except Exception as e:
+        logger.warning(f"Readiness: Redis ping failed: {e}")
+        checks["redis"] = False
+    if global_settings.job_runner_mode == "job":
+        checks["kubernetes"] = await asyncio.to_thread(k8s.init_k8s_client, logger)
+    ready = all(checks.values())
+    return JSONResponse(
+        {"status": "ready" if ready else "not ready", "checks": checks},
+        status_code=200 if ready else 503,
+    )
+
+
+@api.post("/prefetch", status_code=202)
+async def prefetch(request: PrefetchRequest):
+    """Start downloading a dataset in the background so yh_query_save finds it cached."""
+    return await tools.prefetch(
+        api.state.redis,
+        request.ticker,
+        request.time_frame,
+        request.start_date,
+        request.end_date,
+    )
+
+
+@api.get("/prefetch/stats")
+async def prefetch_stats():
+    """Prefetch counters: started, used, wasted, skipped and running."""
+    return await tools.prefetch_stats(api.state.redis)
+
+
+@api.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus metrics."""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @api.get("/data/{storage_key}")
-async def get_data(storage_key: str):
+async def get_data(storage_key: str, request: Request):
     """Fetch data from Redis by storage key."""
     try:
-        cached_data = await api.state.redis.get(storage_key)
-        if cached_data:
-            logger.debug(f"Data for {storage_key} retrieved from Redis.")
-            return {"data": redis_to_ohlcv(json.loads(cached_data))}
-        else:
-            logger.warning(f"No data found for {storage_key} in Redis.")
-            return {"error": "Data not found"}, 404
+        # A storage key's data does not change until it expires
+        cached = http_cache.cached_body(storage_key)
+        if cached is None:
+            cached_data = await api.state.redis.get(storage_key)
+            if not cached_data:
+                logger.warning(f"No data found for {storage_key} in Redis.")
+                return JSONResponse({"error": "Data not found"}, status_code=404)
+            ttl = await api.state.redis.ttl(storage_key)
+            body = http_cache.render_json(
+                {"data": [o.model_dump() for o in redis_to_ohlcv(json.loads(cached_data))]}
+            )
+            cached = http_cache.remember_body(
+                storage_key,
+                body,
+                http_cache.content_etag(cached_data),
+                ttl if ttl > 0 else global_settings.data_expire,
+            )
+            logger.debug("Data for %s retrieved from Redis.", storage_key)
+        body, etag, expires_at = cached
+        max_age = max(0, int(expires_at - time.time()))
+        return http_cache.cached_response(
+            request, body, etag, f"public, max-age={max_age}, immutable"
+        )
     except Exception as e:
         logger.error(f"Failed to query Redis: {e}")
-        return {"error": str(e)}, 500
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+# Results gain metrics and robustness reports after execution, so clients revalidate
+RESULT_CACHE_CONTROL = "private, no-cache"
 
 
 @api.get("/result/{task_id}")
-async def get_data(task_id: str):
-    """Fetch task result from Redis by task ID."""
+async def get_result(
+    task_id: str,
+    request: Request,
+    fields: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """
+    Fetch task result from Redis by task ID. ``fields`` is a comma-separated
+    projection (e.g. ``kpis`` or ``kpis,trades,metrics``); ``offset`` and
+    ``limit`` page signals and trades.
+    """
     try:
-        task_data = await api.state.redis.get(task_id)
-        if task_data:
-            task_entry = TaskEntry(**json.loads(task_data))
-            code_output = json.loads(task_entry.execute_output)
-            return {"data": code_output}
-        else:
+        redis = api.state.redis
+        etag = await results.get_etag(redis, task_id)
+        if etag is None:
+            task_data = await redis.get(task_id)
+            if task_data:
+                etag = await tools.migrate_result(
+                    redis, task_id, TaskEntry(**json.loads(task_data))
+                )
+            else:
+                # Expired from Redis, maybe still in the run history
+                etag = await history.restore_result(redis, task_id)
+        if etag is None:
             logger.warning(f"No task result found for {task_id} in Redis.")
-            return {"error": "Task result not found"}, 404
+            return JSONResponse({"error": "Task result not found"}, status_code=404)
+        selected = [f.strip() for f in (fields or "").split(",") if f.strip()] or None
+        view = (selected, offset, limit)
+        etag = results.view_etag(etag, *view)
+        if http_cache.not_modified(request, etag):
+            return http_cache.not_modified_response(request, etag, RESULT_CACHE_CONTROL)
+        stored = await results.read_result(redis, task_id, *view)
+        if stored is None:
+            return JSONResponse({"error": "Task result not found"}, status_code=404)
+        body, etag = stored
+        return http_cache.cached_response(
+            request, body, results.view_etag(etag, *view), RESULT_CACHE_CONTROL
+        )
     except Exception as e:
         logger.error(f"Failed to query Redis: {e}")
-        return {"error": str(e)}, 500
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+HISTORY_DISABLED = {"error": "Run history is disabled"}
+
+
+@api.get("/runs")
+async def list_runs(
+    ticker: Optional[str] = None,
+    time_frame: Optional[str] = None,
+    indicators: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    order_by: str = "created_at",
+    order: str = "desc",
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = None,
+):
+    """
+    Runs from the history matching every filter, sorted by ``order_by``
+    (created_at or a KPI). ``indicators`` is a comma-separated set, ``since``
+    and ``until`` are ISO dates or Unix times. Pass ``next_cursor`` back as
+    ``cursor`` for the next page.
+    """
+    if not history.enabled():
+        return JSONResponse(HISTORY_DISABLED, status_code=404)
+    try:
+        return await history.list_runs(
+            ticker, time_frame, indicators, since, until, order_by, order, limit, cursor
+        )
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except Exception as e:
+        logger.error(f"Failed to query run history: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@api.get("/runs/top")
+async def top_runs(
+    kpi: str = "sharpe_ratio",
+    n: int = Query(10, ge=1, le=1000),
+    ticker: Optional[str] = None,
+    time_frame: Optional[str] = None,
+    indicators: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+):
+    """The best ``n`` runs by ``kpi``, optionally for one ticker, time frame or indicator set."""
+    if not history.enabled():
+        return JSONResponse(HISTORY_DISABLED, status_code=404)
+    try:
+        return await history.top_runs(
+            api.state.redis, kpi, n, ticker, time_frame, indicators, since, until
+        )
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except Exception as e:
+        logger.error(f"Failed to query run history: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@api.get("/runs/{task_id}")
+async def get_run(task_id: str):
+    """One run from the history, with its prompt and strategy code."""
+    if not history.enabled():
+        return JSONResponse(HISTORY_DISABLED, status_code=404)
+    try:
+        run = await history.get_run(task_id)
+    except Exception as e:
+        logger.error(f"Failed to query run history: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+    if run is None:
+        return JSONResponse({"error": "Run not found"}, status_code=404)
+    return run
 
 
 @api.get("/jobs")
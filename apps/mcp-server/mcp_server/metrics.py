@@ -0,0 +1,246 @@
+"""
+Minimal Prometheus instrumentation: counters, gauges and histograms rendered
+in the text exposition format at /metrics.
+
+Labels must come from small fixed sets (tool names, Redis commands, phases).
+Each metric keeps at most ``max_series`` label combinations; later ones are
+folded into a single ``other`` series so a stray label value cannot grow memory.
+"""
+
+import bisect
+import functools
+import math
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+BARS_BUCKETS = (10, 100, 250, 500, 1_000, 2_500, 5_000, 10_000, 50_000, 100_000, 1_000_000)
+BYTES_BUCKETS = tuple(2**n for n in range(10, 28, 2))  # 1 KiB .. 128 MiB
+
+_lock = Lock()
+_metrics: list["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), max_series: int = 64):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.max_series = max_series
+        self._series: dict[tuple, object] = {}
+        _metrics.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        if key not in self._series and len(self._series) >= self.max_series:
+            key = ("other",) * len(self.label_names)
+        return key
+
+    def render(self) -> list:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for key, value in sorted(self._series.items()):
+            lines.append(
+                f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        with _lock:
+            key = self._key(labels)
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with _lock:
+            return self._series.get(tuple(str(labels.get(n, "")) for n in self.label_names), 0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        with _lock:
+            key = self._key(labels)
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS, max_series=64):
+        super().__init__(name, documentation, labels, max_series)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        with _lock:
+            key = self._key(labels)
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts, then sum and count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def render() -> str:
+    with _lock:
+        lines = [line for metric in _metrics for line in metric.render()]
+    return "\n".join(lines) + "\n"
+
+
+TOOL_DURATION = Histogram(
+    "mcp_tool_duration_seconds", "MCP tool call latency.", ("tool", "status")
+)
+TOOL_IN_FLIGHT = Gauge("mcp_tool_in_flight", "MCP tool calls in progress.", ("tool",))
+YAHOO_FETCH = Histogram(
+    "yahoo_fetch_duration_seconds", "Yahoo Finance download latency.", ("outcome",)
+)
+REDIS_COMMAND = Histogram(
+    "redis_command_duration_seconds", "Redis command latency.", ("command",)
+)
+DATA_CACHE = Counter(
+    "data_cache_requests_total", "Market data lookups by yh_query_save.", ("result",)
+)
+DATASET_BARS = Histogram(
+    "dataset_bars", "Bars per downloaded dataset.", buckets=BARS_BUCKETS
+)
+DATASET_BYTES = Histogram(
+    "dataset_bytes", "Stored size of downloaded datasets.", buckets=BYTES_BUCKETS
+)
+JOB_PHASE = Histogram(
+    "job_phase_duration_seconds",
+    "Backtest Job time per phase: create, scheduled, running, done.",
+    ("phase",),
+)
+POD_LOG_FETCH = Histogram(
+    "pod_log_fetch_duration_seconds", "Time to read the runner pod logs."
+)
+LOG_PARSE = Histogram(
+    "log_parse_duration_seconds", "Time spent in safe_parse_logs."
+)
+LOCK_WAIT = Histogram(
+    "lock_wait_seconds", "Time to acquire a Redis lease, by lock kind.", ("lock", "outcome")
+)
+LOCK_LOST = Counter(
+    "lock_lost_total", "Redis leases that expired while their holder still ran.", ("lock",)
+)
+ROUTED_MESSAGES = Counter(
+    "mcp_routed_messages_total",
+    "MCP messages POSTed to a worker that does not hold the SSE session.",
+    ("result",),
+)
+
+HISTORY_QUERY = Histogram(
+    "history_query_duration_seconds",
+    "Run history queries, answered from the Redis index or the SQLite store.",
+    ("query", "source"),
+)
+LOG_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Log records dropped because the logging queue was full.",
+    ("level",),
+)
+
+
+def track_tool(tool_fn):
+    """Decorator recording latency, outcome and concurrency of an MCP tool."""
+    tool = tool_fn.__name__
+
+    @functools.wraps(tool_fn)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        status = "error"
+        with TOOL_IN_FLIGHT.track(tool=tool):
+            try:
+                result = await tool_fn(*args, **kwargs)
+                if isinstance(result, dict):
+                    status = "failed" if result.get("status") == "failed" else "success"
+                return result
+            finally:
+                TOOL_DURATION.observe(time.perf_counter() - start, tool=tool, status=status)
+
+    return wrapper
+
+
+def instrument_redis(redis_c):
+    """Time every command sent through ``redis_c``; pipelines bypass it and are not timed."""
+    execute_command = redis_c.execute_command
+
+    @functools.wraps(execute_command)
+    async def timed(*args, **options):
+        start = time.perf_counter()
+        try:
+            return await execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND.observe(
+                time.perf_counter() - start, command=str(args[0]).upper() if args else ""
+            )
+
+    redis_c.execute_command = timed
+    return redis_c
@@ -6,9 +6,12 @@ class TaskEntry(BaseModel):
     # key: str
     user_prompt: str
     storage_key: Optional[str] = None
+    storage_keys: Optional[list] = None
     code: Optional[dict] = None
     execute_status: Optional[str] = None
     execute_output: Optional[str] = None
+    metrics: Optional[dict] = None
+    robustness: Optional[dict] = None
     start_date: Optional[str] = None
     end_date: Optional[str] = None
     ticker: Optional[str] = None
@@ -17,9 +20,12 @@ class TaskEntry(BaseModel):
         return {
             "user_prompt": self.user_prompt,
             "storage_key": self.storage_key,
+            "storage_keys": self.storage_keys,
             "code": self.code,
             "execute_status": self.execute_status,
             "execute_output": self.execute_output,
+            "metrics": self.metrics,
+            "robustness": self.robustness,
             "start_date": self.start_date,
             "end_date": self.end_date,
             "ticker": self.ticker,
@@ -30,9 +36,12 @@ class TaskEntry(BaseModel):
         return cls(
             user_prompt=data.get("user_prompt"),
             storage_key=data.get("storage_key"),
+            storage_keys=data.get("storage_keys"),
             code=data.get("code"),
             execute_status=data.get("execute_status"),
             execute_output=data.get("execute_output"),
+            metrics=data.get("metrics"),
+            robustness=data.get("robustness"),
             start_date=data.get("start_date"),
             end_date=data.get("end_date"),
             ticker=data.get("ticker"),
@@ -48,3 +57,12 @@ class OHLCVData(BaseModel):
     low: float
     close: float
     volume: int
+
+
+class PrefetchRequest(BaseModel):
+    """Dataset to warm the cache for ahead of yh_query_save."""
+
+    ticker: str
+    time_frame: str = "1d"
+    start_date: str
+    end_date: str
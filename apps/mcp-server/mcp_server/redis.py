@@ -1,6 +1,12 @@
+import json
+from typing import Callable, Optional
+
 import redis.asyncio as redis
+from redis.exceptions import WatchError
 
 from mcp_server.config import settings as global_settings
+from mcp_server.metrics import instrument_redis
+from mcp_server.models import TaskEntry
 
 
 async def init_redis_pool() -> redis.Redis:
@@ -10,4 +16,32 @@ async def init_redis_pool() -> redis.Redis:
         db=global_settings.redis_db,
         decode_responses=True,
     )
-    return redis_c
+    return instrument_redis(redis_c)
+
+
+async def update_task(
+    redis_c: redis.Redis,
+    task_id: str,
+    update: Callable[[TaskEntry], None],
+    **set_kwargs,
+) -> Optional[TaskEntry]:
+    """
+    Apply ``update`` to a stored task entry and write it back, retrying when
+    another writer changed the entry in between. Returns None if the task does
+    not exist. ``set_kwargs`` are passed to SET (e.g. ``ex`` or ``keepttl``).
+    """
+    async with redis_c.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                await pipe.watch(task_id)
+                task_data = await pipe.get(task_id)
+                if task_data is None:
+                    return None
+                task_entry = TaskEntry(**json.loads(task_data))
+                update(task_entry)
+                pipe.multi()
+                pipe.set(task_id, json.dumps(task_entry.to_dict()), **set_kwargs)
+                await pipe.execute()
+                return task_entry
+            except WatchError:
+                continue
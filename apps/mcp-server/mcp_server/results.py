@@ -0,0 +1,221 @@
+"""
+Backtest results stored as their own document, apart from the task entry.
+
+code_executor serializes the runner output once into the Redis hash
+``result:{task_id}``. Each top-level part (kpis, equity, ...) is a field of
+its own, along with metrics, robustness and an ETag. Signals and trades are
+kept item by item in lists (``result:{task_id}:signals``) so a page is a single
+LRANGE. /result splices the stored JSON fragments into its response without
+decoding them.
+"""
+
+import json
+import math
+from typing import Optional
+
+import redis.asyncio as aioredis
+
+from mcp_server.http_cache import content_etag
+
+# Parts kept as one list item per element, so they can be paged
+PAGED = ("signals", "trades")
+# Members of the /result envelope next to "data"
+ENVELOPE = ("metrics", "robustness")
+
+
+def result_key(task_id: str) -> str:
+    return f"result:{task_id}"
+
+
+def items_key(task_id: str, name: str) -> str:
+    return f"result:{task_id}:{name}"
+
+
+def _finite(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_finite(v) for v in value]
+    return value
+
+
+def dumps(value) -> str:
+    """Compact JSON that browsers can parse: NaN and infinities become null."""
+    try:
+        return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+    except ValueError:
+        return json.dumps(_finite(value), ensure_ascii=False, separators=(",", ":"))
+
+
+def _etag(digest: str, metrics: Optional[str], robustness: Optional[str]) -> str:
+    return content_etag(digest, metrics or "null", robustness or "null")
+
+
+async def store_result(
+    redis: aioredis.Redis,
+    task_id: str,
+    output: dict,
+    metrics: Optional[dict] = None,
+    robustness: Optional[dict] = None,
+    ex: Optional[int] = None,
+) -> str:
+    """Serialize ``output`` into the result document, replacing any earlier one."""
+    fields = {"keys": dumps(list(output))}
+    items = {}
+    for name, value in output.items():
+        if name in PAGED and isinstance(value, list):
+            items[name] = [dumps(item) for item in value]
+        else:
+            fields[f"part:{name}"] = dumps(value)
+    digest = content_etag(
+        *(f"{k}={v}" for k, v in sorted(fields.items())),
+        *(f"{name}={','.join(values)}" for name, values in sorted(items.items())),
+    )
+    fields["digest"] = digest
+    fields["metrics"] = dumps(metrics)
+    fields["robustness"] = dumps(robustness)
+    fields["etag"] = _etag(digest, fields["metrics"], fields["robustness"])
+
+    key = result_key(task_id)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.delete(key, *(items_key(task_id, name) for name in PAGED))
+        pipe.hset(key, mapping=fields)
+        for name, values in items.items():
+            if values:
+                pipe.rpush(items_key(task_id, name), *values)
+        if ex:
+            pipe.expire(key, ex)
+            for name in items:
+                pipe.expire(items_key(task_id, name), ex)
+        await pipe.execute()
+    return fields["etag"]
+
+
+async def set_envelope(redis: aioredis.Redis, task_id: str, name: str, value) -> bool:
+    """Replace metrics or robustness of a stored result; False if there is none."""
+    key = result_key(task_id)
+    digest, metrics, robustness = await redis.hmget(key, "digest", "metrics", "robustness")
+    if digest is None:
+        return False
+    encoded = dumps(value)
+    if name == "metrics":
+        metrics = encoded
+    else:
+        robustness = encoded
+    await redis.hset(
+        key, mapping={name: encoded, "etag": _etag(digest, metrics, robustness)}
+    )
+    return True
+
+
+def view_etag(etag: str, fields: Optional[list], offset: int, limit: Optional[int]) -> str:
+    """ETag of a projection or page, which is a representation of its own."""
+    if fields is None and offset == 0 and limit is None:
+        return etag
+    return content_etag(etag, dumps([fields, offset, limit]))
+
+
+async def get_etag(redis: aioredis.Redis, task_id: str) -> Optional[str]:
+    return await redis.hget(result_key(task_id), "etag")
+
+
+async def load_output(
+    redis: aioredis.Redis, task_id: str, names: Optional[list] = None
+) -> Optional[dict]:
+    """Decoded runner output, or only the ``names`` parts of it; None if not stored."""
+    key = result_key(task_id)
+    if names is None:
+        stored = await redis.hget(key, "keys")
+        if stored is None:
+            return None
+        names = json.loads(stored)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.exists(key)
+        pipe.hmget(key, *(f"part:{name}" for name in names))
+        for name in names:
+            if name in PAGED:
+                pipe.lrange(items_key(task_id, name), 0, -1)
+        found, parts, *lists = await pipe.execute()
+    if not found:
+        return None
+    output = {}
+    paged = iter(lists)
+    for name, part in zip(names, parts):
+        if name in PAGED:
+            values = next(paged)
+            if part is None:
+                output[name] = [json.loads(v) for v in values]
+                continue
+        if part is not None:
+            output[name] = json.loads(part)
+    return output
+
+
+def _splice(members: list) -> str:
+    return "{" + ",".join(f"{json.dumps(k)}:{v}" for k, v in members) + "}"
+
+
+async def read_result(
+    redis: aioredis.Redis,
+    task_id: str,
+    fields: Optional[list] = None,
+    offset: int = 0,
+    limit: Optional[int] = None,
+):
+    """
+    The /result body as bytes and its ETag, None if no result is stored.
+
+    ``fields`` selects output parts (kpis, signals, ...) and envelope members
+    (metrics, robustness); None means everything. ``offset`` and ``limit``
+    page signals and trades, and add a ``page`` member with their totals.
+    """
+    if not fields:
+        fields = None
+    key = result_key(task_id)
+    paging = offset > 0 or limit is not None
+    stop = -1 if limit is None else offset + limit - 1
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hmget(key, "etag", "keys", *ENVELOPE)
+        if fields is None:
+            pipe.hgetall(key)
+        else:
+            pipe.hmget(key, *(f"part:{name}" for name in fields))
+        for name in PAGED:
+            pipe.lrange(items_key(task_id, name), offset, stop)
+            pipe.llen(items_key(task_id, name))
+        (etag, keys, *envelope), parts, *lists = await pipe.execute()
+    if etag is None:
+        return None
+    if fields is None:
+        names = json.loads(keys)
+        parts = [parts.get(f"part:{name}") for name in names]
+        selected_envelope = ENVELOPE
+    else:
+        present = set(json.loads(keys))
+        names = [name for name in fields if name in present]
+        parts = [part for name, part in zip(fields, parts) if name in present]
+        selected_envelope = [name for name in ENVELOPE if name in fields]
+    paged = {name: (lists[2 * i], lists[2 * i + 1]) for i, name in enumerate(PAGED)}
+
+    data, page = [], []
+    for name, part in zip(names, parts):
+        if name in PAGED and part is None:
+            values, total = paged[name]
+            data.append((name, "[" + ",".join(values) + "]"))
+            if paging:
+                page.append(
+                    (name, dumps({"offset": offset, "limit": limit, "total": total}))
+                )
+        elif part is not None:
+            data.append((name, part))
+    members = [("data", _splice(data))]
+    members += [
+        (name, value or "null")
+        for name, value in zip(ENVELOPE, envelope)
+        if name in selected_envelope
+    ]
+    if page:
+        members.append(("page", _splice(page)))
+    return _splice(members).encode("utf-8"), etag
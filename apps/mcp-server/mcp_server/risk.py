@@ -0,0 +1,156 @@
+import numpy as np
+
+
+MS_PER_YEAR = 365.25 * 24 * 3600 * 1000
+
+# Trading bars per year for each supported time frame
+PERIODS_PER_YEAR = {
+    "1m": 252 * 390,
+    "5m": 252 * 78,
+    "15m": 252 * 26,
+    "30m": 252 * 13,
+    "1h": 252 * 7,
+    "4h": 252 * 2,
+    "1d": 252,
+    "1w": 52,
+    "1M": 12,
+}
+
+# Time frames whose bars are stamped per calendar day
+DAILY_TIME_FRAMES = ("1d", "1w", "1M")
+MS_PER_DAY = 86400000
+
+ROLLING_SHARPE_WINDOW = 63  # about one quarter of daily bars
+DIGIT_PRECISION = 4
+
+
+def _round(value):
+    if value is None or not np.isfinite(value):
+        return None
+    return round(float(value), DIGIT_PRECISION)
+
+
+def drawdowns(values: np.ndarray) -> np.ndarray:
+    """Fractional drawdown from the running peak for each bar (<= 0)."""
+    peaks = np.maximum.accumulate(values)
+    return values / peaks - 1.0
+
+
+def drawdown_duration(dd: np.ndarray, timestamps: np.ndarray) -> dict:
+    """Longest stretch below a previous peak, in bars and in days."""
+    underwater = dd < 0
+    if not underwater.any():
+        return {"bars": 0, "days": 0.0}
+    # Bars at a new high close the current underwater period; one still open
+    # at the end runs to the last bar
+    bounds = np.flatnonzero(~underwater)
+    if underwater[-1]:
+        bounds = np.concatenate([bounds, [len(dd) - 1]])
+    bars = np.diff(bounds)
+    # Consecutive highs have nothing underwater between them
+    stretches = bars > 1
+    if underwater[-1]:
+        stretches[-1] = True
+    longest = int(np.argmax(np.where(stretches, bars, 0)))
+    days = (timestamps[bounds[longest + 1]] - timestamps[bounds[longest]]) / MS_PER_DAY
+    return {"bars": int(bars[longest]), "days": _round(days)}
+
+
+def rolling_sharpe(returns: np.ndarray, window: int, periods_per_year: int) -> np.ndarray:
+    """Annualized Sharpe over a sliding window using cumulative sums."""
+    if len(returns) < window:
+        return np.array([])
+    csum = np.cumsum(np.concatenate([[0.0], returns]))
+    csq = np.cumsum(np.concatenate([[0.0], returns**2]))
+    total = csum[window:] - csum[:-window]
+    total_sq = csq[window:] - csq[:-window]
+    mean = total / window
+    var = np.maximum(total_sq / window - mean**2, 0.0) * window / (window - 1)
+    std = np.sqrt(var)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(std > 0, mean / std * np.sqrt(periods_per_year), np.nan)
+    return sharpe
+
+
+def align_benchmark(
+    timestamps: np.ndarray, bench_timestamps: np.ndarray, bench_close: np.ndarray
+) -> np.ndarray:
+    """Benchmark close as of each equity timestamp (forward-filled)."""
+    pos = np.searchsorted(bench_timestamps, timestamps, side="right") - 1
+    aligned = bench_close[np.clip(pos, 0, None)]
+    aligned[pos < 0] = np.nan
+    return aligned
+
+
+def compute_metrics(
+    equity: dict,
+    time_frame: str = "1d",
+    benchmark: list | None = None,
+    window: int = ROLLING_SHARPE_WINDOW,
+) -> dict:
+    """Extended risk metrics from a recorded equity curve.
+
+    equity holds "timestamp", "value" and "exposure" arrays as written by the
+    runner harness; benchmark is the raw Redis OHLCV rows of the benchmark.
+    """
+    timestamps = np.asarray(equity.get("timestamp", []), dtype="int64")
+    values = np.asarray(equity.get("value", []), dtype="float64")
+    exposure = np.asarray(equity.get("exposure", []), dtype="float64")
+    if len(values) < 2 or values[0] <= 0:
+        return {}
+
+    periods_per_year = PERIODS_PER_YEAR.get(time_frame, 252)
+    returns = values[1:] / values[:-1] - 1.0
+    mean = returns.mean()
+    std = returns.std(ddof=1) if len(returns) > 1 else 0.0
+    downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2))
+
+    years = (timestamps[-1] - timestamps[0]) / MS_PER_YEAR
+    total_return = values[-1] / values[0] - 1.0
+    cagr = (1.0 + total_return) ** (1.0 / years) - 1.0 if years > 0 else np.nan
+
+    dd = drawdowns(values)
+    max_drawdown = -dd.min()
+
+    metrics = {
+        "cagr": _round(cagr * 100),
+        "volatility": _round(std * np.sqrt(periods_per_year) * 100),
+        "sharpe_ratio": _round(mean / std * np.sqrt(periods_per_year)) if std > 0 else None,
+        "sortino_ratio": (
+            _round(mean / downside * np.sqrt(periods_per_year)) if downside > 0 else None
+        ),
+        "max_drawdown": _round(max_drawdown * 100),
+        "calmar_ratio": _round(cagr / max_drawdown) if max_drawdown > 0 else None,
+        "max_drawdown_duration": drawdown_duration(dd, timestamps),
+        "exposure": {
+            "time_in_market": _round((exposure > 0).mean() * 100) if len(exposure) else None,
+            "average": _round(exposure.mean() * 100) if len(exposure) else None,
+        },
+        "rolling_sharpe": {
+            "window": window,
+            "timestamp": timestamps[window:].tolist(),
+            "value": [_round(v) for v in rolling_sharpe(returns, window, periods_per_year)],
+        },
+    }
+
+    if benchmark:
+        rows = np.asarray(benchmark, dtype="float64")
+        bench_timestamps = rows[:, 0].astype("int64")
+        if time_frame in DAILY_TIME_FRAMES:
+            # The runner stamps daily bars at midnight, Yahoo at the exchange open
+            bench_timestamps = bench_timestamps // MS_PER_DAY * MS_PER_DAY
+        bench = align_benchmark(timestamps, bench_timestamps, rows[:, 4])
+        bench_returns = bench[1:] / bench[:-1] - 1.0
+        valid = np.isfinite(bench_returns)
+        if valid.sum() > 1:
+            r, rb = returns[valid], bench_returns[valid]
+            var_b = rb.var(ddof=1)
+            beta = np.cov(r, rb, ddof=1)[0, 1] / var_b if var_b > 0 else np.nan
+            alpha = (r.mean() - beta * rb.mean()) * periods_per_year
+            metrics["benchmark"] = {
+                "beta": _round(beta),
+                "alpha": _round(alpha * 100),
+                "correlation": _round(np.corrcoef(r, rb)[0, 1]),
+                "total_return": _round((np.prod(1.0 + rb) - 1.0) * 100),
+            }
+    return metrics
@@ -0,0 +1,206 @@
+import asyncio
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+from mcp_server.config import settings as global_settings
+from mcp_server.risk import MS_PER_YEAR, PERIODS_PER_YEAR
+
+
+METHODS = ("bootstrap", "trade_bootstrap", "trade_shuffle")
+
+# Samples x observations simulated per task; fixed so that results only
+# depend on the seed, not on how many workers the pool has
+CHUNK_CELLS = 1_000_000
+
+DIGIT_PRECISION = 4
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn keeps workers free of the server's event loop and threads
+        _executor = ProcessPoolExecutor(
+            max_workers=global_settings.robustness_workers,
+            mp_context=get_context("spawn"),
+        )
+    return _executor
+
+
+def warmup():
+    """Start the pool workers ahead of the first interactive request."""
+    executor = get_executor()
+    for _ in range(global_settings.robustness_workers):
+        executor.submit(math.sqrt, 0)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def simulate_chunk(
+    method: str,
+    data: np.ndarray,
+    n_samples: int,
+    seed: np.random.SeedSequence,
+    periods_per_year: float,
+    initial_cash: float,
+) -> np.ndarray:
+    """Simulate a batch of resampled paths.
+
+    Returns a (3, n_samples) array of total return, max drawdown and Sharpe.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(data)
+    if method == "trade_shuffle":
+        idx = rng.permuted(np.tile(np.arange(n), (n_samples, 1)), axis=1)
+    else:
+        idx = rng.integers(0, n, size=(n_samples, n))
+    sample = data[idx]
+
+    if method == "bootstrap":
+        # data holds per-bar returns
+        returns = sample
+        paths = np.cumprod(1.0 + sample, axis=1)
+    else:
+        # data holds per-trade PnL, compounded on the running equity
+        equity = initial_cash + np.cumsum(sample, axis=1)
+        previous = np.concatenate(
+            [np.full((n_samples, 1), initial_cash), equity[:, :-1]], axis=1
+        )
+        returns = sample / previous
+        paths = equity / initial_cash
+
+    total_return = paths[:, -1] - 1.0
+    # The starting capital counts as the first peak
+    peaks = np.maximum.accumulate(np.maximum(paths, 1.0), axis=1)
+    max_drawdown = np.max(1.0 - paths / peaks, axis=1)
+    mean = returns.mean(axis=1)
+    std = returns.std(axis=1, ddof=1) if n > 1 else np.zeros(n_samples)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(std > 0, mean / std * np.sqrt(periods_per_year), np.nan)
+    return np.stack([total_return, max_drawdown, sharpe])
+
+
+def summarize(values: np.ndarray, confidence: float) -> dict:
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return {"lower": None, "median": None, "upper": None, "mean": None}
+    tail = (1.0 - confidence) / 2 * 100
+    lower, median, upper = np.percentile(values, [tail, 50, 100 - tail])
+    return {
+        "lower": round(float(lower), DIGIT_PRECISION),
+        "median": round(float(median), DIGIT_PRECISION),
+        "upper": round(float(upper), DIGIT_PRECISION),
+        "mean": round(float(values.mean()), DIGIT_PRECISION),
+    }
+
+
+def prepare(method: str, code_output: dict, time_frame: str):
+    """Pick the resampled series and its annualization from a backtest result."""
+    initial_cash = float(code_output.get("initial_cash") or 100000.0)
+    equity = code_output.get("equity") or {}
+    timestamps = equity.get("timestamp") or []
+    if method == "bootstrap":
+        values = np.asarray(equity.get("value") or [], dtype="float64")
+        if len(values) < 3:
+            raise ValueError("Equity curve not available for this task")
+        data = values[1:] / values[:-1] - 1.0
+        return data, PERIODS_PER_YEAR.get(time_frame, 252), initial_cash
+    pnl = [t.get("pnl") for t in code_output.get("trades") or []]
+    data = np.asarray([p for p in pnl if p is not None], dtype="float64")
+    if len(data) < 2:
+        raise ValueError("At least two closed trades are required")
+    years = (timestamps[-1] - timestamps[0]) / MS_PER_YEAR if len(timestamps) > 1 else 0
+    # Annualize per-trade Sharpe by the observed trade frequency
+    periods_per_year = len(data) / years if years > 0 else len(data)
+    return data, periods_per_year, initial_cash
+
+
+async def run_robustness(
+    code_output: dict,
+    time_frame: str = "1d",
+    method: str = "bootstrap",
+    samples: int = 2000,
+    seed: int = 42,
+    confidence: float = 0.95,
+) -> dict:
+    """Confidence intervals for total return, max drawdown and Sharpe.
+
+    Resamples are split into fixed-size chunks, each with its own child seed,
+    and spread over the process pool. Chunks still running when the latency
+    budget expires are dropped and the summary reports the samples used.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unsupported method {method}, use one of {METHODS}")
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be between 0 and 1")
+    requested = int(samples)
+    data, periods_per_year, initial_cash = prepare(method, code_output, time_frame)
+    # Bound the work up front so long histories stay within the budget
+    samples = max(
+        1,
+        min(
+            requested,
+            global_settings.robustness_max_samples,
+            global_settings.robustness_max_cells // len(data),
+        ),
+    )
+
+    chunk_samples = max(1, CHUNK_CELLS // len(data))
+    n_chunks = math.ceil(samples / chunk_samples)
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    sizes = [min(chunk_samples, samples - i * chunk_samples) for i in range(n_chunks)]
+
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    if n_chunks == 1:
+        futures = [
+            asyncio.ensure_future(
+                asyncio.to_thread(
+                    simulate_chunk,
+                    method, data, sizes[0], seeds[0], periods_per_year, initial_cash,
+                )
+            )
+        ]
+    else:
+        executor = get_executor()
+        futures = [
+            loop.run_in_executor(
+                executor,
+                simulate_chunk,
+                method, data, size, chunk_seed, periods_per_year, initial_cash,
+            )
+            for size, chunk_seed in zip(sizes, seeds)
+        ]
+    done, pending = await asyncio.wait(
+        futures, timeout=global_settings.robustness_budget
+    )
+    for future in pending:
+        future.cancel()
+    # Keep chunk order so a full run is reproducible for a given seed
+    results = [f.result() for f in futures if f in done and not f.exception()]
+    if not results:
+        raise TimeoutError("Robustness analysis exceeded its latency budget")
+    stats = np.concatenate(results, axis=1)
+
+    return {
+        "method": method,
+        "seed": seed,
+        "confidence": confidence,
+        "samples": int(stats.shape[1]),
+        "requested_samples": requested,
+        "elapsed": round(time.perf_counter() - started, 3),
+        "total_return": summarize(stats[0] * 100, confidence),
+        "max_drawdown": summarize(stats[1] * 100, confidence),
+        "sharpe_ratio": summarize(stats[2], confidence),
+        "probability_of_loss": round(float((stats[0] < 0).mean()), DIGIT_PRECISION),
+    }
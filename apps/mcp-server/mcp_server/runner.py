@@ -0,0 +1,24 @@
+import asyncio
+import json
+
+from mcp_server.config import settings as global_settings
+
+
+async def execute(spec: dict, timeout: int) -> dict:
+    """Run a spec on the pre-forking runner, mirroring k8s.watch_job results."""
+    host, _, port = global_settings.job_runner_endpoint.rpartition(":")
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(host, int(port)), timeout=timeout
+    )
+    try:
+        writer.write(json.dumps(spec).encode() + b"\n")
+        await writer.drain()
+        # The forked child closes the connection once the result is written
+        logs = await asyncio.wait_for(reader.read(), timeout=timeout)
+    except asyncio.TimeoutError:
+        return {"success": False, "message": "Job timed out"}
+    finally:
+        writer.close()
+    if not logs:
+        return {"success": False, "message": "Job failed"}
+    return {"success": True, "logs": logs.decode()}
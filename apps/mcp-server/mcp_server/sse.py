@@ -1,15 +1,153 @@
 import asyncio
+import contextlib
+from contextvars import ContextVar
+from uuid import UUID
+
+import mcp.types as types
 from fastapi.responses import StreamingResponse
 from mcp.server.fastmcp import FastMCP
 from mcp.server.sse import SseServerTransport
+from mcp.shared.message import SessionMessage
+from pydantic import ValidationError
 from starlette.applications import Starlette
+from starlette.responses import Response
 from starlette.routing import Mount, Route
 from starlette.requests import Request
 
+from mcp_server import metrics
+from mcp_server.config import settings as global_settings
+from mcp_server.logging import AppLogger
+
+logger = AppLogger().get_logger()
+
+SESSION_CHANNEL_PREFIX = "mcp:session:"
+
+# Set by _Sessions when connect_sse registers a session, read back in the same task
+_new_session: ContextVar = ContextVar("_new_session", default=None)
+
+
+class _Sessions(dict):
+    def __setitem__(self, session_id, writer):
+        super().__setitem__(session_id, writer)
+        _new_session.set(session_id)
+
+
+class RedisSseTransport(SseServerTransport):
+    """
+    SSE transport that accepts message POSTs on any worker or replica, so no
+    session affinity is needed in front of the server. Each process subscribes
+    to a Redis channel per SSE session it holds; a POST for a session held
+    elsewhere is validated and published there.
+    """
+
+    def __init__(self, endpoint: str, redis_factory):
+        super().__init__(endpoint)
+        self._read_stream_writers = _Sessions()
+        self._redis_factory = redis_factory
+        self._redis = None
+        self._pubsub = None
+        self._listener = None
+        self._connecting = asyncio.Lock()
+        # Strong references to messages being handed to their sessions
+        self._deliveries: set[asyncio.Task] = set()
+
+    async def _connect(self):
+        async with self._connecting:
+            if self._redis is None:
+                self._redis = await self._redis_factory()
+                self._pubsub = self._redis.pubsub()
+                # Connected up front, so a SUBSCRIBE is on the wire before the
+                # client learns its session id from the endpoint event
+                await self._pubsub.connect()
+
+    async def _listen(self):
+        while True:
+            try:
+                if not self._pubsub.subscribed:
+                    await asyncio.sleep(0.1)
+                    continue
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Session channel listener failed: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if message and message.get("type") == "message":
+                self._deliver(message["channel"], message["data"])
+
+    def _deliver(self, channel: str, body: str):
+        session_id = UUID(hex=channel[len(SESSION_CHANNEL_PREFIX):])
+        writer = self._read_stream_writers.get(session_id)
+        if writer is None:
+            return
+        try:
+            message = types.JSONRPCMessage.model_validate_json(body)
+        except ValidationError as e:
+            logger.warning(f"Dropped unparsable message for session {session_id}: {e}")
+            return
+        # Tasks start in creation order and queue on the stream in that order,
+        # so a session sees its messages in the order they were published
+        task = asyncio.ensure_future(writer.send(SessionMessage(message)))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+
+    @contextlib.asynccontextmanager
+    async def connect_sse(self, scope, receive, send):
+        await self._connect()
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        async with super().connect_sse(scope, receive, send) as streams:
+            session_id = _new_session.get()
+            channel = f"{SESSION_CHANNEL_PREFIX}{session_id.hex}"
+            await self._pubsub.subscribe(channel)
+            try:
+                yield streams
+            finally:
+                self._read_stream_writers.pop(session_id, None)
+                with contextlib.suppress(Exception):
+                    await self._pubsub.unsubscribe(channel)
+
+    async def handle_post_message(self, scope, receive, send):
+        request = Request(scope, receive)
+        try:
+            session_id = UUID(hex=request.query_params.get("session_id") or "")
+        except ValueError:
+            session_id = None
+        if session_id is None or session_id in self._read_stream_writers:
+            return await super().handle_post_message(scope, receive, send)
+
+        error_response = await self._security.validate_request(request, is_post=True)
+        if error_response:
+            return await error_response(scope, receive, send)
+        body = await request.body()
+        try:
+            types.JSONRPCMessage.model_validate_json(body)
+        except ValidationError:
+            response = Response("Could not parse message", status_code=400)
+            return await response(scope, receive, send)
+        await self._connect()
+        receivers = await self._redis.publish(
+            f"{SESSION_CHANNEL_PREFIX}{session_id.hex}", body.decode()
+        )
+        metrics.ROUTED_MESSAGES.inc(result="routed" if receivers else "not_found")
+        if not receivers:
+            response = Response("Could not find session", status_code=404)
+        else:
+            response = Response("Accepted", status_code=202)
+        await response(scope, receive, send)
+
 
 def create_sse_server(mcp: FastMCP):
     """Create a Starlette app that handles SSE connections and message handling."""
-    transport = SseServerTransport("/messages/")
+    if global_settings.session_routing == "redis":
+        from mcp_server.redis import init_redis_pool
+
+        transport = RedisSseTransport("/messages/", init_redis_pool)
+    else:
+        transport = SseServerTransport("/messages/")
 
     async def noop():
         if False:
@@ -32,17 +170,17 @@ def create_sse_server(mcp: FastMCP):
                     )
                     await mcp_task
                 else:
-                    print("MCP server not initialized, likely due to LLM failure.")
+                    logger.warning("MCP server not initialized, likely due to LLM failure.")
         except asyncio.CancelledError:
-            print("SSE connection cancelled (server is shutting down).")
+            logger.info("SSE connection cancelled (server is shutting down).")
             if mcp_task and not mcp_task.done():
                 mcp_task.cancel()
-                with asyncio.suppress(asyncio.CancelledError):
+                with contextlib.suppress(asyncio.CancelledError):
                     await mcp_task
         except Exception as e:
-            print(f"INFO: An exception occurred in the SSE handler: {e}")
+            logger.info("An exception occurred in the SSE handler: %s", e)
         finally:
-            print("SSE endpoint has finished.")
+            logger.debug("SSE endpoint has finished.")
         return StreamingResponse(noop())
 
     routes = [
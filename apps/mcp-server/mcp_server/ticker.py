@@ -1,9 +1,12 @@
 from datetime import datetime
-import pandas as pd
-import yfinance as yf
+from typing import TYPE_CHECKING
 
 from mcp_server.models import OHLCVData
 
+if TYPE_CHECKING:
+    # yfinance and pandas are imported on the first download, not at startup
+    import pandas as pd
+
 
 interval_timeframe_map = {
     "1m": "1m",
@@ -22,7 +25,9 @@ DIGIT_PRECISION = 4
 
 def query_ticker_historical_data(
     ticker, start_date, end_date, time_frame
-) -> pd.DataFrame:
+) -> "pd.DataFrame":
+    import yfinance as yf
+
     interval = interval_timeframe_map.get(time_frame, "1d")
     tickerApi = yf.Ticker(ticker=ticker)
     try:
@@ -35,7 +40,9 @@ def query_ticker_historical_data(
     return data
 
 
-def yfinance_to_ohlcv(data: pd.DataFrame) -> list:
+def yfinance_to_ohlcv(data: "pd.DataFrame") -> list:
+    import pandas as pd
+
     ohlcv_data = []
     for index, row in data.iterrows():
         try:
@@ -0,0 +1,508 @@
+"""
+Tool implementations shared by the MCP server and in-process callers.
+
+Each tool takes the Redis client to use as its first argument, so the agent can
+call them directly on its own pool when it runs next to the server.
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from typing import Optional
+
+import redis.asyncio as aioredis
+
+from mcp_server import history, k8s, locks, metrics, results, robustness, runner, tracing
+from mcp_server.config import settings as global_settings
+from mcp_server.generator import PROFILE_MODES, generate_run_spec, generate_strategy_code
+from mcp_server.logging import AppLogger
+from mcp_server.models import TaskEntry
+from mcp_server.redis import update_task
+from mcp_server.risk import compute_metrics
+from mcp_server.ticker import (
+    ohlcv_to_redis,
+    query_ticker_historical_data,
+    yfinance_to_ohlcv,
+)
+from mcp_server.utils import safe_parse_logs
+
+logger = AppLogger().get_logger()
+
+
+@tracing.traced
+async def task_register(redis: aioredis.Redis, user_prompt: str) -> dict:
+    """Register a task with the user_prompt, return a task UUID if succeeded."""
+    try:
+        uid = str(uuid.uuid4())
+        logger.debug("Registered task %s with prompt: %s", uid, user_prompt)
+        entry = TaskEntry(user_prompt=user_prompt)
+        await redis.set(
+            uid, json.dumps(entry.to_dict()), ex=global_settings.task_expire
+        )
+    except Exception as e:
+        logger.error(f"Failed to save to Redis: {e}")
+        return {"task_id": uid, "status": "failed"}
+    return {"task_id": uid, "status": "success"}
+
+
+# Downloads in flight, keyed by storage key, shared by all callers in this process
+_fetches: dict[str, asyncio.Task] = {}
+# Strong references to fire-and-forget prefetch tasks
+_prefetches: set[asyncio.Task] = set()
+PREFETCH_STATS_KEY = "prefetch:stats"
+PREFETCH_OUTSTANDING_KEY = "prefetch:outstanding"
+
+
+async def _download(
+    redis: aioredis.Redis,
+    storage_key: str,
+    ticker: str,
+    time_frame: str,
+    start_date: str,
+    end_date: str,
+) -> bool:
+    async with locks.RedisLock(
+        redis, f"fetch:{storage_key}", timeout=global_settings.fetch_lock_timeout
+    ):
+        # Another worker or replica may have stored it while we waited
+        if await redis.exists(storage_key):
+            logger.debug("Data for %s was fetched by another worker.", storage_key)
+            return True
+        logger.info(f"Fetching data for {storage_key} from Yahoo Finance...")
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            with tracing.span("yahoo_fetch", ticker=ticker, time_frame=time_frame):
+                data = await asyncio.to_thread(
+                    query_ticker_historical_data, ticker, start_date, end_date, time_frame
+                )
+            outcome = "empty" if data.empty else "ok"
+        finally:
+            metrics.YAHOO_FETCH.observe(time.perf_counter() - start, outcome=outcome)
+        if data.empty:
+            return False
+        payload = json.dumps(ohlcv_to_redis(yfinance_to_ohlcv(data)))
+        metrics.DATASET_BARS.observe(len(data))
+        metrics.DATASET_BYTES.observe(len(payload))
+        await redis.set(storage_key, payload, ex=global_settings.data_expire)
+        logger.debug("Data for %s saved to Redis.", storage_key)
+        return True
+
+
+def _start_fetch(
+    redis: aioredis.Redis, ticker: str, time_frame: str, start_date: str, end_date: str
+) -> asyncio.Task:
+    storage_key = f"{ticker}:{time_frame}:{start_date}:{end_date}"
+    task = _fetches.get(storage_key)
+    if task is None:
+        task = asyncio.ensure_future(
+            _download(redis, storage_key, ticker, time_frame, start_date, end_date)
+        )
+        _fetches[storage_key] = task
+        task.add_done_callback(lambda _: _fetches.pop(storage_key, None))
+    return task
+
+
+async def fetch_and_store(
+    redis: aioredis.Redis, ticker: str, time_frame: str, start_date: str, end_date: str
+) -> bool:
+    """
+    Download a dataset into Redis once; concurrent callers for the same storage
+    key share one download, in this process and, through a Redis lease, across
+    workers and replicas. Returns False if Yahoo Finance has no data.
+    """
+    task = _start_fetch(redis, ticker, time_frame, start_date, end_date)
+    # A cancelled caller must not cancel the download for the others
+    return await asyncio.shield(task)
+
+
+@tracing.traced
+async def yh_query_save(
+    redis: aioredis.Redis,
+    task_id: str,
+    ticker: str,
+    time_frame: str,
+    start_date: str,
+    end_date: str,
+) -> dict:
+    """Query Yahoo Finance and save the data, return storage key if succeeded."""
+    stroage_key = f"{ticker}:{time_frame}:{start_date}:{end_date}"
+
+    def record_data(task_entry: TaskEntry):
+        task_entry.storage_key = stroage_key
+        task_entry.ticker = ticker
+        task_entry.start_date = start_date
+        task_entry.end_date = end_date
+
+    try:
+        if await redis.exists(stroage_key):
+            metrics.DATA_CACHE.inc(result="hit")
+            logger.debug("Data for %s already exists in Redis.", stroage_key)
+        else:
+            metrics.DATA_CACHE.inc(result="miss")
+            found = await fetch_and_store(
+                redis, ticker, time_frame, start_date, end_date
+            )
+            if not found:
+                logger.warning(
+                    f"No data found for {ticker} between {start_date} and {end_date}"
+                )
+                return {
+                    "task_id": task_id,
+                    "status": "failed",
+                    "message": f"No data found for {ticker} between {start_date} and {end_date}",
+                }
+        if await redis.zrem(PREFETCH_OUTSTANDING_KEY, stroage_key):
+            await redis.hincrby(PREFETCH_STATS_KEY, "used", 1)
+        await update_task(
+            redis,
+            task_id,
+            record_data,
+            ex=global_settings.task_expire,
+        )
+        logger.debug("Task info for %s updated in Redis.", task_id)
+        return {"task_id": task_id, "status": "success", "storage_key": stroage_key}
+    except Exception as e:
+        logger.error(f"Failed to query Redis: {e}")
+        return {"task_id": task_id, "status": "failed", "message": str(e)}
+
+
+async def _finish_prefetch(storage_key: str, redis: aioredis.Redis, fetch: asyncio.Task):
+    try:
+        found = await fetch
+    except Exception as e:
+        logger.warning(f"Prefetch of {storage_key} failed: {e}")
+        found = None
+    if not found:
+        await redis.zrem(PREFETCH_OUTSTANDING_KEY, storage_key)
+    await redis.hincrby(
+        PREFETCH_STATS_KEY,
+        "completed" if found else ("failed" if found is None else "empty"),
+        1,
+    )
+
+
+async def prefetch(
+    redis: aioredis.Redis, ticker: str, time_frame: str, start_date: str, end_date: str
+) -> dict:
+    """Start warming the cache for a dataset in the background, without waiting."""
+    storage_key = f"{ticker}:{time_frame}:{start_date}:{end_date}"
+    if storage_key in _fetches or await locks.is_locked(redis, f"fetch:{storage_key}"):
+        status = "in_flight"
+    elif await redis.exists(storage_key):
+        status = "cached"
+    elif len(_prefetches) >= global_settings.prefetch_max_inflight:
+        status = "skipped"
+    else:
+        # Tracked from the start so a yh_query_save joining the download counts as a use
+        await redis.zadd(PREFETCH_OUTSTANDING_KEY, {storage_key: time.time()})
+        fetch = _start_fetch(redis, ticker, time_frame, start_date, end_date)
+        task = asyncio.ensure_future(_finish_prefetch(storage_key, redis, fetch))
+        _prefetches.add(task)
+        task.add_done_callback(_prefetches.discard)
+        status = "started"
+    await redis.hincrby(PREFETCH_STATS_KEY, status, 1)
+    return {"storage_key": storage_key, "status": status}
+
+
+async def prefetch_stats(redis: aioredis.Redis) -> dict:
+    """
+    Prefetch counters. A prefetched dataset that no yh_query_save used before
+    it expired is counted as wasted.
+    """
+    expired = time.time() - global_settings.data_expire
+    wasted = await redis.zremrangebyscore(PREFETCH_OUTSTANDING_KEY, 0, expired)
+    if wasted:
+        await redis.hincrby(PREFETCH_STATS_KEY, "wasted", wasted)
+    counters = await redis.hgetall(PREFETCH_STATS_KEY)
+    stats = {name: int(value) for name, value in counters.items()}
+    stats["running"] = len(_prefetches)
+    stats["outstanding"] = await redis.zcard(PREFETCH_OUTSTANDING_KEY)
+    return stats
+
+
+async def load_benchmark(
+    redis: aioredis.Redis, time_frame: str, start_date: str, end_date: str
+):
+    """Benchmark OHLCV rows for the window, cached like any other dataset."""
+    ticker = global_settings.benchmark_ticker
+    if not ticker:
+        return None
+    storage_key = f"{ticker}:{time_frame}:{start_date}:{end_date}"
+    cached_data = await redis.get(storage_key)
+    if not cached_data:
+        if not await fetch_and_store(redis, ticker, time_frame, start_date, end_date):
+            return None
+        cached_data = await redis.get(storage_key)
+    return json.loads(cached_data) if cached_data else None
+
+
+async def compute_task_metrics(
+    redis: aioredis.Redis, task_entry: TaskEntry, code_output: dict
+):
+    """Extended risk metrics for an executed task, None without an equity curve."""
+    equity = code_output.get("equity")
+    if not equity:
+        return None
+    storage_key = task_entry.storage_key or (task_entry.storage_keys or [""])[0]
+    _, time_frame, start_date, end_date = (storage_key.split(":") + ["", "", ""])[:4]
+    time_frame = time_frame or "1d"
+    benchmark = None
+    if start_date and end_date:
+        try:
+            benchmark = await load_benchmark(redis, time_frame, start_date, end_date)
+        except Exception as e:
+            logger.warning(f"Failed to load benchmark data: {e}")
+    return compute_metrics(equity, time_frame=time_frame, benchmark=benchmark)
+
+
+def _executor_output(logs_json: dict) -> dict:
+    output = {"kpis": logs_json.get("kpis", {})}
+    for name in ("assets", "profile"):
+        if name in logs_json:
+            output[name] = logs_json[name]
+    return output
+
+
+async def _execution_result(redis: aioredis.Redis, task_id: str) -> dict:
+    """The code_executor result recorded for a task by whoever ran it."""
+    task_data = await redis.get(task_id)
+    if task_data is None:
+        return {"task_id": task_id, "status": "failed", "message": "Task not found"}
+    task_entry = TaskEntry(**json.loads(task_data))
+    output = None
+    if task_entry.execute_status == "success":
+        output = await results.load_output(redis, task_id, ["kpis", "assets", "profile"])
+    if output is None:
+        return {"task_id": task_id, "status": "failed", "message": "Job failed"}
+    return {"task_id": task_id, "status": "success", "output": _executor_output(output)}
+
+
+async def migrate_result(
+    redis: aioredis.Redis, task_id: str, task_entry: TaskEntry
+) -> Optional[str]:
+    """
+    Move a result kept inside the task entry, as stored before result documents,
+    into its own document. Returns the ETag, None if the task has no result.
+    """
+    if task_entry.execute_status != "success" or not task_entry.execute_output:
+        return None
+    code_output = json.loads(task_entry.execute_output)
+    metrics_report = task_entry.metrics
+    if metrics_report is None and code_output.get("equity"):
+        metrics_report = await compute_task_metrics(redis, task_entry, code_output)
+    ttl = await redis.ttl(task_id)
+    return await results.store_result(
+        redis,
+        task_id,
+        code_output,
+        metrics=metrics_report,
+        robustness=task_entry.robustness,
+        ex=ttl if ttl > 0 else global_settings.task_expire,
+    )
+
+
+@tracing.traced
+async def code_executor(
+    redis: aioredis.Redis,
+    task_id: str,
+    storage_keys: Optional[list[str]] = None,
+    weights: Optional[dict[str, float]] = None,
+    rebalance: str = "none",
+    profile: Optional[str] = None,
+) -> dict:
+    """Execute the generated code and return the output.
+
+    Pass storage_keys from several yh_query_save calls to backtest the strategy
+    on a portfolio with shared cash. weights maps ticker to target weight
+    (equal weight if omitted), rebalance is one of none/weekly/monthly/quarterly.
+    profile (deterministic or sampling) adds a hot-spot report to the output.
+    """
+    if profile is not None and profile not in PROFILE_MODES:
+        return {
+            "task_id": task_id,
+            "status": "failed",
+            "message": f"Unsupported profile mode: {profile}",
+        }
+    try:
+        task_data = await redis.get(task_id)
+        if task_data is None:
+            return {"task_id": task_id, "status": "failed", "message": "Task not found"}
+        task_entry = TaskEntry(**json.loads(task_data))
+        storage_key = task_entry.storage_key
+        if (
+            task_entry.code is None
+            or "init_code" not in task_entry.code
+            or "next_code" not in task_entry.code
+        ):
+            return {"task_id": task_id, "status": "failed", "message": "Code not found"}
+
+        strategy_code = generate_strategy_code(
+            init_code=task_entry.code.get("init_code"),
+            next_code=task_entry.code.get("next_code"),
+        )
+        if storage_keys:
+            async with redis.pipeline(transaction=False) as pipe:
+                for key in storage_keys:
+                    pipe.exists(key)
+                found = await pipe.execute()
+            missing = [key for key, exists in zip(storage_keys, found) if not exists]
+            if missing:
+                return {
+                    "task_id": task_id,
+                    "status": "failed",
+                    "message": f"Data not found for storage keys: {missing}",
+                }
+            task_entry.storage_keys = storage_keys
+        elif storage_key is None:
+            return {"task_id": task_id, "status": "failed", "message": "Data not found"}
+        spec = generate_run_spec(
+            task_id=task_id,
+            strategy_code=strategy_code,
+            initial_cash=100000.0,
+            storage_keys=storage_keys or [storage_key],
+            portfolio=bool(storage_keys),
+            weights=weights,
+            rebalance=rebalance,
+            timeout=global_settings.job_runner_timeout,
+            profile={
+                "mode": profile,
+                "top": global_settings.profile_top,
+                "interval": global_settings.profile_interval,
+            } if profile else None,
+        )
+        lock = locks.RedisLock(redis, f"job:{task_id}")
+        if not await lock.acquire(timeout=0):
+            # Another worker or replica is running this task; report its outcome
+            logger.info(f"Job for {task_id} is already running, waiting for it.")
+            await lock.wait_released(
+                timeout=global_settings.job_runner_timeout + lock.ttl
+            )
+            return await _execution_result(redis, task_id)
+        try:
+            with tracing.span("run_backtest", mode=global_settings.job_runner_mode):
+                # The runner reports its own spans as children of this one
+                spec["traceparent"] = tracing.current_traceparent()
+                if global_settings.job_runner_mode == "forkserver":
+                    result = await runner.execute(
+                        spec, timeout=global_settings.job_runner_timeout
+                    )
+                else:
+                    # The Kubernetes client blocks; off the loop, the lease keeps
+                    # being renewed and other sessions keep being served
+                    with metrics.JOB_PHASE.time(phase="create"):
+                        job = await asyncio.to_thread(
+                            k8s.create_job, task_id, spec, logger=logger
+                        )
+                    result = await asyncio.to_thread(
+                        k8s.watch_job,
+                        job,
+                        timeout=global_settings.job_runner_timeout,
+                        logger=logger,
+                    )
+        finally:
+            await lock.release()
+        if result["success"]:
+            try:
+                with metrics.LOG_PARSE.time(), tracing.span("parse_logs"):
+                    logs_json = safe_parse_logs(result["logs"])
+                for runner_span in logs_json.pop("spans", None) or []:
+                    tracing.export(runner_span)
+                task_entry.execute_status = "success"
+                metrics_report = None
+                try:
+                    metrics_report = await compute_task_metrics(
+                        redis, task_entry, logs_json
+                    )
+                except Exception as e:
+                    logger.warning(f"Failed to compute metrics: {e}")
+                # Serialized once here; /result serves the stored fragments as is
+                await results.store_result(
+                    redis,
+                    task_id,
+                    logs_json,
+                    metrics=metrics_report,
+                    ex=global_settings.task_expire,
+                )
+                task_entry.execute_output = None
+                task_entry.metrics = None
+                task_entry.robustness = None
+                await redis.set(
+                    task_id,
+                    json.dumps(task_entry.to_dict()),
+                    ex=global_settings.task_expire,
+                )
+                if history.enabled():
+                    try:
+                        await history.record_run(
+                            redis, task_id, task_entry, logs_json, metrics_report
+                        )
+                    except Exception as e:
+                        logger.warning(f"Failed to record run history: {e}")
+            except Exception as e:
+                logger.error(f"Failed to parse logs: {e}")
+                return {
+                    "task_id": task_id,
+                    "status": "failed",
+                    "message": "Logs are not valid JSON",
+                }
+            return {
+                "task_id": task_id,
+                "status": "success",
+                "output": _executor_output(logs_json),
+            }
+    except Exception as e:
+        logger.error(f"Code execution failed: {e}")
+        return {"task_id": task_id, "status": "failed", "message": str(e)}
+    task_entry.execute_status = "failed"
+    await redis.set(
+        task_id,
+        json.dumps(task_entry.to_dict()),
+        ex=global_settings.task_expire,
+    )
+    return {"task_id": task_id, "status": "failed", "message": "Job failed"}
+
+
+@tracing.traced
+async def robustness_check(
+    redis: aioredis.Redis,
+    task_id: str, method: str = "bootstrap", samples: int = 2000, seed: int = 42
+) -> dict:
+    """Resample an executed backtest and return confidence intervals.
+
+    method is bootstrap (per-bar returns), trade_bootstrap or trade_shuffle
+    (closed trades). Results are reproducible for a given seed.
+    """
+    try:
+        task_data = await redis.get(task_id)
+        if task_data is None:
+            return {"task_id": task_id, "status": "failed", "message": "Task not found"}
+        task_entry = TaskEntry(**json.loads(task_data))
+        code_output = None
+        if task_entry.execute_status == "success":
+            if await results.get_etag(redis, task_id) is None:
+                await migrate_result(redis, task_id, task_entry)
+            code_output = await results.load_output(
+                redis, task_id, ["initial_cash", "equity", "trades"]
+            )
+        if code_output is None:
+            return {
+                "task_id": task_id,
+                "status": "failed",
+                "message": "Task has no successful execution",
+            }
+        storage_key = task_entry.storage_key or (task_entry.storage_keys or [""])[0]
+        time_frame = (storage_key.split(":") + ["1d"])[1] or "1d"
+        report = await robustness.run_robustness(
+            code_output,
+            time_frame=time_frame,
+            method=method,
+            samples=samples,
+            seed=seed,
+        )
+        await results.set_envelope(redis, task_id, "robustness", report)
+        return {"task_id": task_id, "status": "success", "output": report}
+    except Exception as e:
+        logger.error(f"Robustness check failed: {e}")
+        return {"task_id": task_id, "status": "failed", "message": str(e)}
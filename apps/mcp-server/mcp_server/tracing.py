@@ -0,0 +1,295 @@
+"""
+Lightweight tracing with W3C ``traceparent`` propagation.
+
+The current span lives in a context variable, so it follows asyncio tasks.
+Finished spans go to a background thread that hands them to the configured
+exporter in batches, keeping export I/O off the event loop:
+
+- ``none`` (default): ids are still propagated, nothing is recorded
+- ``log``: one log line per span
+- ``file``: JSON lines appended to ``TRACE_FILE``, works offline
+- ``otlp``: OTLP/HTTP JSON to ``TRACE_OTLP_ENDPOINT`` (e.g. a local collector)
+
+Without a parent context, a span for a task uses the task UUID as trace id,
+so calls for the same task are linked even when no traceparent was passed.
+"""
+
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from mcp_server.config import settings as global_settings
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+BATCH_SIZE = 256
+QUEUE_SIZE = 10000
+
+service_name = global_settings.trace_service_name
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "service", "start_ns", "end_ns",
+        "status", "attributes",
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.service = service_name
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = "ok"
+        self.attributes = attributes
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "service": self.service,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "status": self.status,
+            "attributes": dict(self.attributes),
+        }
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[tuple[str, str]]:
+    """(trace_id, parent span_id) from a traceparent header, None if invalid."""
+    match = TRACEPARENT_RE.match((value or "").strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2)
+
+
+def task_trace_id(task_id: Optional[str]) -> Optional[str]:
+    trace_id = (task_id or "").replace("-", "").lower()
+    return trace_id if re.fullmatch(r"[0-9a-f]{32}", trace_id) else None
+
+
+def current_span() -> Optional["Span"]:
+    return _current.get()
+
+
+def current_traceparent() -> Optional[str]:
+    current = _current.get()
+    return current.traceparent if current else None
+
+
+@contextmanager
+def span(name: str, traceparent: Optional[str] = None, task_id: Optional[str] = None, **attributes):
+    """
+    Record ``name`` as a child of ``traceparent`` if valid, else of the current
+    span, else as a root span of the task's trace (or a new trace).
+    """
+    parent = parse_traceparent(traceparent)
+    current = _current.get()
+    if parent is None and current is not None:
+        parent = (current.trace_id, current.span_id)
+    if parent is not None:
+        trace_id, parent_id = parent
+    else:
+        trace_id, parent_id = task_trace_id(task_id) or os.urandom(16).hex(), None
+    if task_id:
+        attributes["task_id"] = task_id
+    s = Span(name, trace_id, parent_id, attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.status = "error"
+        s.attributes["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.end_ns = time.time_ns()
+        _current.reset(token)
+        export(s.to_dict())
+
+
+def traced(tool_fn=None, *, name: Optional[str] = None):
+    """
+    Run an async tool in a span named after it (or ``name``). The wrapper
+    accepts an extra ``traceparent`` keyword and tags the span with the tool's
+    ``task_id`` argument.
+    """
+    if tool_fn is None:
+        return functools.partial(traced, name=name)
+    signature = inspect.signature(tool_fn)
+    span_name = name or tool_fn.__name__
+
+    @functools.wraps(tool_fn)
+    async def wrapper(*args, traceparent: Optional[str] = None, **kwargs):
+        bound = signature.bind_partial(*args, **kwargs).arguments
+        with span(span_name, traceparent=traceparent, task_id=bound.get("task_id")):
+            return await tool_fn(*args, **kwargs)
+
+    return wrapper
+
+
+class Exporter:
+    def export(self, spans: list[dict]):
+        raise NotImplementedError
+
+
+class LogExporter(Exporter):
+    def export(self, spans: list[dict]):
+        for s in spans:
+            duration = (s["end_ns"] - s["start_ns"]) / 1e6
+            logger.info(
+                f"span {s['service']}/{s['name']} trace={s['trace_id']} "
+                f"id={s['span_id']} parent={s['parent_id']} {duration:.1f}ms {s['status']}"
+            )
+
+
+class FileExporter(Exporter):
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: list[dict]):
+        with open(self.path, "a") as f:
+            for s in spans:
+                f.write(json.dumps(s, default=str) + "\n")
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPExporter(Exporter):
+    """OTLP/HTTP with the JSON encoding, grouped by service."""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.timeout = timeout
+
+    def export(self, spans: list[dict]):
+        by_service: dict[str, list] = {}
+        for s in spans:
+            by_service.setdefault(s["service"], []).append(
+                {
+                    "traceId": s["trace_id"],
+                    "spanId": s["span_id"],
+                    "parentSpanId": s["parent_id"] or "",
+                    "name": s["name"],
+                    "kind": 1,
+                    "startTimeUnixNano": str(s["start_ns"]),
+                    "endTimeUnixNano": str(s["end_ns"]),
+                    "attributes": [
+                        {"key": k, "value": _otlp_value(v)}
+                        for k, v in s["attributes"].items()
+                    ],
+                    "status": {"code": 2 if s["status"] == "error" else 1},
+                }
+            )
+        body = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": "service.name", "value": {"stringValue": service}}
+                        ]
+                    },
+                    "scopeSpans": [{"scope": {"name": "agentquant"}, "spans": items}],
+                }
+                for service, items in by_service.items()
+            ]
+        }
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        urllib.request.urlopen(request, timeout=self.timeout).close()
+
+
+def create_exporter(kind: str) -> Optional[Exporter]:
+    if kind == "log":
+        return LogExporter()
+    if kind == "file":
+        return FileExporter(global_settings.trace_file)
+    if kind == "otlp":
+        return OTLPExporter(global_settings.trace_otlp_endpoint)
+    return None
+
+
+_exporter: Optional[Exporter] = create_exporter(global_settings.trace_exporter)
+_queue: "queue.Queue[dict]" = queue.Queue(maxsize=QUEUE_SIZE)
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+dropped = 0
+
+
+def configure(exporter: Optional[Exporter] = None, service: Optional[str] = None):
+    """Replace the exporter and/or the service name recorded on new spans."""
+    global _exporter, service_name
+    if exporter is not None:
+        _exporter = exporter
+    if service is not None:
+        service_name = service
+
+
+def _drain():
+    while True:
+        batch = [_queue.get()]
+        while len(batch) < BATCH_SIZE:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            if _exporter is not None:
+                _exporter.export(batch)
+        except Exception as e:
+            logger.warning(f"Failed to export {len(batch)} spans: {e}")
+        for _ in batch:
+            _queue.task_done()
+
+
+def export(span_dict: dict):
+    """Queue a finished span (also used for spans reported by the runner)."""
+    global _worker, dropped
+    if _exporter is None:
+        return
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = threading.Thread(target=_drain, name="trace-export", daemon=True)
+                _worker.start()
+    try:
+        _queue.put_nowait(span_dict)
+    except queue.Full:
+        dropped += 1
+
+
+def flush(timeout: float = 5.0):
+    """Wait until queued spans were handed to the exporter (for tests and scripts)."""
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
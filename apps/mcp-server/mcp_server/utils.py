@@ -29,10 +29,18 @@ def safe_parse_logs(logs: str) -> dict:
     try:
         return json.loads(logs)
     except json.JSONDecodeError:
+        pass
+    # Pod logs merge the runner's stderr in; the result is always the last line
+    lines = logs.strip().splitlines()
+    if len(lines) > 1:
         try:
-            return ast.literal_eval(logs)
-        except Exception:
-            return {}
+            return json.loads(lines[-1])
+        except json.JSONDecodeError:
+            pass
+    try:
+        return ast.literal_eval(logs)
+    except Exception:
+        return {}
 
 
 def compact_json_tool(tool_fn):
@@ -44,7 +52,10 @@ def compact_json_tool(tool_fn):
             result = await tool_fn(*args, **kwargs)
             return json.dumps(result, separators=(",", ":"), ensure_ascii=False)
         except Exception as e:
-            print(f"Error in {tool_fn.__name__}: {e}")
+            # Imported here, mcp_server.logging depends on this module
+            from mcp_server.logging import AppLogger
+
+            AppLogger().get_logger().error("Error in %s: %s", tool_fn.__name__, e)
             return json.dumps(
                 {"error": str(e)}, separators=(",", ":"), ensure_ascii=False
             )
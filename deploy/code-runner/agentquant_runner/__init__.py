@@ -0,0 +1,13 @@
+"""Backtest harness baked into the code-runner image.
+
+The MCP server only ships the generated strategy class and a run spec per
+task; everything else (data loading, analyzers, result encoding) lives here.
+"""
+
+__version__ = "1.2.0"
+
+# Bumped whenever the run spec or the strategy base class changes shape.
+HARNESS_VERSION = 1
+
+# Filename the generated strategy is compiled under, as seen in tracebacks
+STRATEGY_FILENAME = "<generated_strategy>"
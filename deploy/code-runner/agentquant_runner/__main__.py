@@ -0,0 +1,43 @@
+import argparse
+import contextlib
+import json
+import sys
+
+from agentquant_runner import HARNESS_VERSION, __version__
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="agentquant_runner")
+    parser.add_argument(
+        "--version",
+        action="version",
+        version=f"%(prog)s {__version__} (harness {HARNESS_VERSION})",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run a spec file and print the result.")
+    run.add_argument("spec", help="Path to the JSON run spec.")
+
+    serve = commands.add_parser("serve", help="Start the pre-forking runner.")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=9000)
+    serve.add_argument("--max-children", type=int, default=8)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        from agentquant_runner import harness
+
+        with open(args.spec, "r") as f:
+            spec = json.load(f)
+        # stdout carries only the result; anything the strategy prints goes to stderr
+        with contextlib.redirect_stdout(sys.stderr):
+            result = harness.encode_result(harness.execute(spec))
+        print(result)
+    else:
+        from agentquant_runner import forkserver
+
+        forkserver.serve(args.host, args.port, args.max_children)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Fork server that keeps the heavy imports warm between backtests.
+
+The parent imports numpy/pandas/backtrader and the harness once, then forks
+a fresh child per connection. Each child reads one JSON run spec line, runs
+it in isolation and writes the JSON result back before exiting, so nothing
+a generated strategy does survives into the next run.
+"""
+
+import gc
+import importlib
+import json
+import resource
+import signal
+import socketserver
+import sys
+
+from agentquant_runner import harness
+
+
+PRELOAD_MODULES = ("numpy", "pandas", "backtrader", "redis")
+
+
+def preload():
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+
+
+class RunHandler(socketserver.StreamRequestHandler):
+    """Handles one run spec, always inside a forked child."""
+
+    def handle(self):
+        spec = json.loads(self.rfile.readline())
+        timeout = int(spec.get("timeout") or 0)
+        if timeout > 0:
+            # Wall-clock and CPU limits; the default SIGALRM action ends the child
+            signal.alarm(timeout)
+            resource.setrlimit(resource.RLIMIT_CPU, (timeout, timeout + 1))
+        result = harness.execute(spec)
+        self.wfile.write(harness.encode_result(result).encode())
+
+
+class ForkServer(socketserver.ForkingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+
+
+def serve(host: str, port: int, max_children: int):
+    preload()
+    server = ForkServer((host, port), RunHandler)
+    server.max_children = max_children
+    # Keep preloaded objects out of the collector so children share their pages
+    gc.freeze()
+    print(f"Fork server listening on {host}:{port}", file=sys.stderr, flush=True)
+    server.serve_forever()
@@ -0,0 +1,431 @@
+import json
+import os
+import traceback
+from array import array
+
+import backtrader as bt
+import numpy as np
+import pandas as pd
+
+from agentquant_runner import HARNESS_VERSION, STRATEGY_FILENAME, profiling, tracing
+from agentquant_runner.strategy import HarnessStrategy
+
+
+def load_strategy(strategy_code: str) -> type:
+    """Compile the generated strategy source and return its class."""
+    namespace = {
+        "bt": bt,
+        "pd": pd,
+        "np": np,
+        "json": json,
+        "os": os,
+        "HarnessStrategy": HarnessStrategy,
+    }
+    exec(compile(strategy_code, STRATEGY_FILENAME, "exec"), namespace)
+    strategy_cls = namespace.get("GeneratedStrategy")
+    if strategy_cls is None:
+        raise NameError("Strategy code does not define GeneratedStrategy")
+    return strategy_cls
+
+
+def iter_raw_data(spec: dict):
+    """Yield (ticker, raw JSON text) pairs, one asset at a time."""
+    tickers = spec["params"]["tickers"]
+    data_files = spec.get("data_files")
+    if data_files:
+        for ticker, data_file in zip(tickers, data_files):
+            with open(data_file, "r") as f:
+                yield ticker, f.read()
+        return
+    import redis
+
+    client = redis.Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        db=int(os.getenv("REDIS_DB", "0")),
+    )
+    try:
+        for ticker, storage_key in zip(tickers, spec["storage_keys"]):
+            content = client.get(storage_key)
+            yield ticker, content.decode() if content else ""
+    finally:
+        client.close()
+
+
+def parse_raw(ticker: str, content: str) -> np.ndarray:
+    content = content.strip()
+    if not content:
+        raise ValueError(f"No data found for {ticker}")
+    arr = np.asarray(json.loads(content), dtype="float64")
+    if arr.ndim != 2 or len(arr) == 0:
+        raise ValueError(f"No data found for {ticker}")
+    return arr
+
+
+def to_frame(rows: np.ndarray, index: pd.DatetimeIndex, volume=None) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Close": rows[:, 4],
+            "High": rows[:, 2],
+            "Low": rows[:, 3],
+            "Open": rows[:, 1],
+            "Volume": (rows[:, 5] if volume is None else volume).astype(int),
+        },
+        index=index,
+    )
+
+
+def raw_to_ohlcv(ticker: str, content: str) -> pd.DataFrame:
+    arr = parse_raw(ticker, content)
+    index = pd.to_datetime(arr[:, 0], unit="ms").normalize().rename("Date")
+    return to_frame(arr, index)
+
+
+def load_aligned_frames(spec: dict) -> list:
+    # Parse one asset at a time into a compact float array so the raw JSON
+    # never coexists in memory, even for hundreds of tickers.
+    arrays = [parse_raw(ticker, content) for ticker, content in iter_raw_data(spec)]
+
+    # Common window: from the latest first bar to the earliest last bar,
+    # on the union of timestamps inside that window.
+    start = max(arr[0, 0] for arr in arrays)
+    end = min(arr[-1, 0] for arr in arrays)
+    if start > end:
+        raise ValueError("Assets have no overlapping date range")
+    timestamps = np.unique(
+        np.concatenate(
+            [arr[(arr[:, 0] >= start) & (arr[:, 0] <= end), 0] for arr in arrays]
+        )
+    )
+    index = pd.to_datetime(timestamps, unit="ms").normalize().rename("Date")
+
+    frames = []
+    for i in range(len(arrays)):
+        arr = arrays[i]
+        # Align as-of each common timestamp (forward-fill gaps, no volume)
+        pos = np.searchsorted(arr[:, 0], timestamps, side="right") - 1
+        rows = arr[pos]
+        volume = np.where(rows[:, 0] == timestamps, rows[:, 5], 0.0)
+        frames.append(to_frame(rows, index, volume))
+        arrays[i] = None
+    return frames
+
+
+class EquityCurve(bt.Analyzer):
+    """Record portfolio value and invested fraction once per bar"""
+
+    def start(self):
+        self.timestamps = array("q")
+        self.values = array("d")
+        self.exposure = array("d")
+
+    def next(self):
+        broker = self.strategy.broker
+        value = broker.getvalue()
+        self.timestamps.append(
+            int(self.strategy.datas[0].datetime.datetime(0).timestamp() * 1000)
+        )
+        self.values.append(value)
+        self.exposure.append((value - broker.getcash()) / value if value else 0.0)
+
+    def get_analysis(self):
+        return {
+            "timestamp": self.timestamps.tolist(),
+            "value": [round(v, 2) for v in self.values],
+            "exposure": [round(e, 4) for e in self.exposure],
+        }
+
+
+def rebalance_key(date, rule):
+    if rule == "weekly":
+        return date.isocalendar()[:2]
+    if rule == "monthly":
+        return (date.year, date.month)
+    if rule == "quarterly":
+        return (date.year, (date.month - 1) // 3)
+    return None
+
+
+class AllocationSizer(bt.Sizer):
+    """Size entries to the owning strategy's target weight of portfolio value"""
+
+    def _getsizing(self, comminfo, cash, data, isbuy):
+        position = self.broker.getposition(data).size
+        if position:
+            # An open position is only ever closed, never added to
+            closing = isbuy if position < 0 else not isbuy
+            return abs(position) if closing else 0
+        target = self.broker.getvalue() * self.strategy.p.weight
+        return min(cash, target) / data.close[0]
+
+
+class PortfolioBook(bt.Strategy):
+    """Non-trading strategy carrying the portfolio-level analyzers"""
+
+    def __init__(self):
+        self._addanalyzer(bt.analyzers.SharpeRatio, _name="sharpe")
+        self._addanalyzer(bt.analyzers.DrawDown, _name="drawdown")
+        self._addanalyzer(EquityCurve, _name="equity")
+
+
+def bind_datas(strategy, datas: list):
+    """Replace ``strategy.datas`` along with the aliases backtrader derives from it."""
+    strategy.datas = datas
+    strategy.data = datas[0]
+    for prefix, data in [("data", datas[0])] + [(f"data{d}", data) for d, data in enumerate(datas)]:
+        setattr(strategy, prefix, data)
+        for i, line in enumerate(data.lines):
+            alias = data._getlinealias(i)
+            if alias:
+                setattr(strategy, f"{prefix}_{alias}", line)
+            setattr(strategy, f"{prefix}_{i}", line)
+
+
+def asset_strategy(strategy_cls: type) -> type:
+    """Wrap the generated strategy so it trades a single asset of a portfolio."""
+
+    class AssetStrategy(strategy_cls):
+        params = (("asset", 0), ("weight", 0.0), ("rebalance", "none"))
+
+        def __init__(self):
+            # Put the traded data first before the generated indicators are
+            # built, as indicators given no data read datas[0]
+            traded = self.datas[self.p.asset]
+            bind_datas(self, [traded] + [d for d in self.datas if d is not traded])
+            self._order_bar = None
+            self._rebalance_key = None
+            super().__init__()
+
+        def getposition(self, data=None, broker=None):
+            return super().getposition(data if data is not None else self.data, broker)
+
+        position = property(getposition)
+
+        def buy(self, data=None, **kwargs):
+            self._order_bar = len(self)
+            return super().buy(data=data if data is not None else self.data, **kwargs)
+
+        def sell(self, data=None, **kwargs):
+            self._order_bar = len(self)
+            return super().sell(data=data if data is not None else self.data, **kwargs)
+
+        def close(self, data=None, **kwargs):
+            return super().close(data=data if data is not None else self.data, **kwargs)
+
+        def next(self):
+            super().next()
+            key = rebalance_key(self.data.datetime.date(0), self.p.rebalance)
+            if key is None:
+                return
+            if (
+                self._rebalance_key is not None
+                and key != self._rebalance_key
+                and self.position
+                and self._order_bar != len(self)
+            ):
+                self.order_target_percent(data=self.data, target=self.p.weight)
+            self._rebalance_key = key
+
+    return AssetStrategy
+
+
+def win_rate(won_trades, total_trades):
+    return (won_trades / total_trades * 100) if total_trades > 0 else 0
+
+
+def run_backtest(strategy_cls: type, spec: dict) -> dict:
+    initial_cash = spec["params"]["initial_cash"]
+
+    # Create a minimal Cerebro instance to avoid complex broker interactions
+    cerebro = bt.Cerebro()
+
+    # Add strategy
+    cerebro.addstrategy(profiling.timed_init(strategy_cls))
+    cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name="sharpe")
+    cerebro.addanalyzer(bt.analyzers.DrawDown, _name="drawdown")
+    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name="trades")
+    cerebro.addanalyzer(EquityCurve, _name="equity")
+
+    with tracing.span("load_data"), profiling.phase("load"):
+        ticker, content = next(iter_raw_data(spec))
+        data = raw_to_ohlcv(ticker, content)
+        del content
+
+    # Create data feed with standard configuration
+    cerebro.adddata(bt.feeds.PandasData(dataname=data))
+
+    # Set initial cash
+    cerebro.broker.setcash(initial_cash)
+    cerebro.addsizer(bt.sizers.PercentSizer, percents=100)
+
+    # Run backtest
+    with tracing.span("cerebro.run", bars=len(data)), profiling.phase("run"):
+        strategies = cerebro.run()
+    if not strategies or len(strategies) == 0:
+        raise ValueError("No strategies returned from cerebro.run()")
+    strategy = strategies[0]
+
+    with profiling.phase("analyze"):
+        return single_asset_result(cerebro, strategy, initial_cash)
+
+
+def single_asset_result(cerebro, strategy, initial_cash) -> dict:
+    # Get results
+    final_value = cerebro.broker.getvalue()
+
+    # Extract analyzer results
+    sharpe = strategy.analyzers.sharpe.get_analysis().get("sharperatio", None)
+    drawdown = strategy.analyzers.drawdown.get_analysis().max.drawdown
+    trades = strategy.analyzers.trades.get_analysis()
+
+    # Example win rate from trades analyzer
+    # Lookups go through .get: the analysis dict raises KeyError, not
+    # AttributeError, for sections that never saw a trade
+    total_trades = trades.get("total", {}).get("closed", 0)
+    won_trades = trades.get("won", {}).get("total", 0)
+
+    return {
+        "success": True,
+        "final_value": final_value,
+        "initial_cash": initial_cash,
+        "kpis": {
+            "sharpe_ratio": sharpe,
+            "max_drawdown": drawdown,
+            "total_return": ((final_value - initial_cash) / initial_cash) * 100,
+            "win_rate": win_rate(won_trades, total_trades),
+            "total_trades": total_trades,
+        },
+        "signals": strategy.get_signals(),
+        "trades": strategy.get_trades(),
+        "equity": strategy.analyzers.equity.get_analysis(),
+    }
+
+
+def asset_kpis(strategy, ticker, weight, initial_cash):
+    trades = strategy.get_trades()
+    total_trades = len(trades)
+    won_trades = len([t for t in trades if t["pnl"] > 0])
+    pnl = sum(t["pnl"] for t in trades)
+    allocated = initial_cash * weight
+    position = strategy.position
+    return {
+        "ticker": ticker,
+        "weight": weight,
+        "pnl": pnl,
+        "total_return": (pnl / allocated * 100) if allocated > 0 else 0,
+        "win_rate": win_rate(won_trades, total_trades),
+        "total_trades": total_trades,
+        "open_position": position.size * strategy.data.close[0] if position else 0,
+    }
+
+
+def run_portfolio_backtest(strategy_cls: type, spec: dict) -> dict:
+    params = spec["params"]
+    initial_cash = params["initial_cash"]
+    tickers = params["tickers"]
+    weights = params["weights"]
+
+    cerebro = bt.Cerebro()
+
+    with tracing.span("load_data", assets=len(tickers)), profiling.phase("load"):
+        frames = load_aligned_frames(spec)
+    for ticker, frame in zip(tickers, frames):
+        cerebro.adddata(bt.feeds.PandasData(dataname=frame), name=ticker)
+    del frames
+
+    # Portfolio analyzers live on a single book strategy so they are not
+    # duplicated across every asset strategy
+    cerebro.addstrategy(PortfolioBook)
+    strategy_asset_cls = profiling.timed_init(asset_strategy(strategy_cls))
+    for i, weight in enumerate(weights):
+        cerebro.addstrategy(
+            strategy_asset_cls, asset=i, weight=weight, rebalance=params["rebalance"]
+        )
+
+    # Shared cash across all assets
+    cerebro.broker.setcash(initial_cash)
+    cerebro.addsizer(AllocationSizer)
+
+    with tracing.span("cerebro.run", assets=len(tickers)), profiling.phase("run"):
+        strategies = cerebro.run()
+    if not strategies or len(strategies) != len(tickers) + 1:
+        raise ValueError("Unexpected strategies returned from cerebro.run()")
+    book, assets = strategies[0], strategies[1:]
+
+    with profiling.phase("analyze"):
+        return portfolio_result(cerebro, book, assets, params)
+
+
+def portfolio_result(cerebro, book, assets, params) -> dict:
+    initial_cash = params["initial_cash"]
+    tickers = params["tickers"]
+    weights = params["weights"]
+
+    final_value = cerebro.broker.getvalue()
+    sharpe = book.analyzers.sharpe.get_analysis().get("sharperatio", None)
+    drawdown = book.analyzers.drawdown.get_analysis().max.drawdown
+
+    asset_results = {}
+    signals = []
+    trades = []
+    for ticker, weight, strategy in zip(tickers, weights, assets):
+        asset_results[ticker] = asset_kpis(strategy, ticker, weight, initial_cash)
+        signals.extend(dict(signal, ticker=ticker) for signal in strategy.get_signals())
+        trades.extend(dict(trade, ticker=ticker) for trade in strategy.get_trades())
+
+    total_trades = sum(a["total_trades"] for a in asset_results.values())
+    won_trades = len([t for t in trades if t["pnl"] > 0])
+
+    return {
+        "success": True,
+        "final_value": final_value,
+        "initial_cash": initial_cash,
+        "kpis": {
+            "sharpe_ratio": sharpe,
+            "max_drawdown": drawdown,
+            "total_return": ((final_value - initial_cash) / initial_cash) * 100,
+            "win_rate": win_rate(won_trades, total_trades),
+            "total_trades": total_trades,
+        },
+        "assets": asset_results,
+        "signals": signals,
+        "trades": trades,
+        "equity": book.analyzers.equity.get_analysis(),
+    }
+
+
+def execute(spec: dict) -> dict:
+    """Run one backtest described by a run spec and return the result."""
+    tracing.start(spec.get("traceparent") or os.environ.get("TRACEPARENT"))
+    profiling.start(spec.get("profile"))
+    try:
+        if spec.get("harness_version") != HARNESS_VERSION:
+            raise ValueError(
+                f"Unsupported harness version {spec.get('harness_version')}, "
+                f"runner provides {HARNESS_VERSION}"
+            )
+        with tracing.span("load_strategy"), profiling.phase("load"):
+            strategy_cls = load_strategy(spec["strategy_code"])
+        if spec["params"].get("portfolio"):
+            result = run_portfolio_backtest(strategy_cls, spec)
+        else:
+            result = run_backtest(strategy_cls, spec)
+    except Exception as e:
+        result = {
+            "success": False,
+            "error": str(e),
+            "error_type": type(e).__name__,
+            "traceback": traceback.format_exc(),
+        }
+    if profiling.active():
+        result["profile"] = profiling.report()
+    return result
+
+
+def encode_result(result: dict) -> str:
+    if not tracing.active():
+        return json.dumps(result, default=str)
+    with tracing.span("encode_result"):
+        body = json.dumps(result, default=str)
+    # Appended after encoding so the encode span itself is included
+    return body[:-1] + ', "spans": ' + json.dumps(tracing.spans) + "}"
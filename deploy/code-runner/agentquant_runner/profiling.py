@@ -0,0 +1,202 @@
+"""Opt-in profiling of one backtest run, returned with the result.
+
+A spec with ``"profile": {"mode": "deterministic" | "sampling", "top": 20}``
+runs under cProfile, or under a SIGPROF sampler taking the stack every
+``interval`` seconds of CPU time. Either way the result gets a ``profile``
+report: wall time per phase (load, init, run, analyze, each excluding the
+phases nested in it) and the top functions by own time, tagged with where
+they come from (generated strategy, harness, backtrader, ...).
+
+Without a profile in the spec nothing is installed and ``phase`` returns a
+shared no-op context manager.
+"""
+
+import contextlib
+import cProfile
+import os
+import pstats
+import signal
+import time
+from collections import Counter
+
+from agentquant_runner import STRATEGY_FILENAME
+
+MODES = ("deterministic", "sampling")
+PHASES = ("load", "init", "run", "analyze")
+DEFAULT_TOP = 20
+DEFAULT_INTERVAL = 0.005  # seconds of CPU time between samples
+
+_NULL = contextlib.nullcontext()
+_HARNESS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_mode = None
+_top = DEFAULT_TOP
+_interval = DEFAULT_INTERVAL
+_started = 0.0
+_profiler = None
+_phases = {}
+_stack = []
+_samples = 0
+_own = Counter()
+_cumulative = Counter()
+
+
+def origin(filename: str) -> str:
+    """Which part of the run a function belongs to."""
+    if filename == STRATEGY_FILENAME:
+        return "strategy"
+    if filename.startswith(_HARNESS_DIR):
+        return "harness"
+    for package in ("backtrader", "pandas", "numpy", "redis"):
+        if f"{os.sep}{package}{os.sep}" in filename:
+            return package
+    if filename.startswith("<") or filename == "~":
+        return "builtin"
+    return "other"
+
+
+def start(options):
+    """Start profiling as ``options`` asks; a no-op when they are empty or invalid."""
+    global _mode, _top, _interval, _started, _profiler, _samples
+    stop()
+    _phases.clear()
+    _stack.clear()
+    _own.clear()
+    _cumulative.clear()
+    _samples = 0
+    options = options or {}
+    _mode = options.get("mode") if options.get("mode") in MODES else None
+    if _mode is None:
+        return
+    _top = int(options.get("top") or DEFAULT_TOP)
+    _interval = float(options.get("interval") or DEFAULT_INTERVAL)
+    _started = time.perf_counter()
+    if _mode == "deterministic":
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    else:
+        signal.signal(signal.SIGPROF, _sample)
+        signal.setitimer(signal.ITIMER_PROF, _interval, _interval)
+
+
+def active() -> bool:
+    return _mode is not None
+
+
+def stop():
+    if _profiler is not None:
+        _profiler.disable()
+    if _mode == "sampling":
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+
+
+def _sample(signum, frame):
+    global _samples
+    _samples += 1
+    seen = set()
+    leaf = True
+    while frame is not None:
+        code = frame.f_code
+        key = (code.co_filename, code.co_firstlineno, code.co_name)
+        if leaf:
+            _own[key] += 1
+            leaf = False
+        # Recursion counts once per sample
+        if key not in seen:
+            seen.add(key)
+            _cumulative[key] += 1
+        frame = frame.f_back
+
+
+class _Phase:
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        # [name, started, time spent in nested phases]
+        _stack.append([self.name, time.perf_counter(), 0.0])
+
+    def __exit__(self, *exc):
+        name, started, nested = _stack.pop()
+        elapsed = time.perf_counter() - started
+        _phases[name] = _phases.get(name, 0.0) + elapsed - nested
+        if _stack:
+            _stack[-1][2] += elapsed
+
+
+def phase(name: str):
+    """Time ``with`` blocks as ``name``, exclusive of phases nested in them."""
+    return _Phase(name) if _mode is not None else _NULL
+
+
+def timed_init(strategy_cls: type) -> type:
+    """``strategy_cls`` with its ``__init__`` (the indicator setup) timed as init."""
+    if _mode is None:
+        return strategy_cls
+
+    class TimedStrategy(strategy_cls):
+        def __init__(self, *args, **kwargs):
+            with phase("init"):
+                super().__init__(*args, **kwargs)
+
+    return TimedStrategy
+
+
+def _hotspot(key, calls, own, cumulative):
+    filename, line, function = key
+    return {
+        "function": function,
+        "file": filename if filename.startswith("<") else os.path.basename(filename),
+        "line": line,
+        "origin": origin(filename),
+        "calls": calls,
+        "own": round(own, 6),
+        "cumulative": round(cumulative, 6),
+    }
+
+
+def _deterministic_rows():
+    stats = pstats.Stats(_profiler).stats
+    # Calls into the profiler itself are not part of the run
+    return [
+        (key, calls, own, cumulative)
+        for key, (_, calls, own, cumulative, _) in stats.items()
+        if not (key[0] == "~" and "Profiler" in key[2])
+    ]
+
+
+def _sampling_rows():
+    return [
+        (key, None, count * _interval, _cumulative[key] * _interval)
+        for key, count in _own.items()
+    ]
+
+
+def report() -> dict:
+    """Stop profiling and summarize it; empty if profiling was not started."""
+    global _mode, _profiler
+    if _mode is None:
+        return {}
+    stop()
+    total = time.perf_counter() - _started
+    rows = _deterministic_rows() if _mode == "deterministic" else _sampling_rows()
+    by_origin = Counter()
+    for key, _, own, _ in rows:
+        by_origin[origin(key[0])] += own
+    rows.sort(key=lambda row: row[2], reverse=True)
+    result = {
+        "mode": _mode,
+        "wall_time": round(total, 6),
+        "phases": {name: round(_phases.get(name, 0.0), 6) for name in PHASES},
+        "by_origin": {name: round(t, 6) for name, t in by_origin.most_common()},
+        "hotspots": [_hotspot(*row) for row in rows[:_top]],
+    }
+    if _mode == "sampling":
+        result["samples"] = _samples
+        result["interval"] = _interval
+    _mode = None
+    _profiler = None
+    return result
@@ -0,0 +1,76 @@
+import backtrader as bt
+
+
+class HarnessStrategy(bt.Strategy):
+    """Base class for generated strategies, tracks signals and closed trades."""
+
+    def __init__(self):
+        # Initialize signals tracking
+        self.signals = []
+        self.trades = []
+
+    def _signal(self, signal_type, price=None):
+        return {
+            "type": signal_type,
+            "date": self.data.datetime.date(0).isoformat(),
+            "price": price if price is not None else float(self.data.close[0]),
+            "timestamp": int(self.data.datetime.datetime(0).timestamp() * 1000),
+        }
+
+    def capture_crossover_signals(self):
+        """Capture all crossover signals for analysis (even if we don't trade)"""
+        if not hasattr(self, "crossover"):
+            return
+        try:
+            if self.crossover[0] > 0 and self.position:
+                # Upward crossover but already have position - still capture signal
+                self.signals.append(self._signal("BUY_SIGNAL"))
+            elif self.crossover[0] < 0 and not self.position:
+                # Downward crossover but no position - still capture signal
+                self.signals.append(self._signal("SELL_SIGNAL"))
+        except Exception:
+            pass
+
+    def capture_buy_signal(self, size=None, price=None):
+        """Capture buy signal for tracking"""
+        if len(self.data) > 0:
+            try:
+                self.signals.append(self._signal("BUY", price))
+            except Exception:
+                pass
+
+    def capture_sell_signal(self, size=None, price=None):
+        """Capture sell signal for tracking"""
+        if len(self.data) > 0:
+            try:
+                self.signals.append(self._signal("SELL", price))
+            except Exception:
+                pass
+
+    def capture_close_signal(self, size=None, price=None):
+        """Capture close signal for tracking"""
+        if len(self.data) > 0:
+            try:
+                self.signals.append(self._signal("CLOSE", price))
+            except Exception:
+                pass
+
+    def notify_trade(self, trade):
+        """Capture completed trades"""
+        if trade.isclosed:
+            self.trades.append(
+                {
+                    "entry_date": trade.dtopen,
+                    "exit_date": trade.dtclose,
+                    "pnl": trade.pnl,
+                }
+            )
+
+    def get_signals(self):
+        return self.signals
+
+    def get_trades(self):
+        return self.trades
+
+    def get_performance_summary(self):
+        return {"total_trades": len(self.trades)}
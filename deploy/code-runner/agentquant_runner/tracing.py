@@ -0,0 +1,61 @@
+"""Spans for one backtest run, returned to the MCP server with the result.
+
+The runner has no exporter of its own: when the spec carries a traceparent
+(or the Job sets TRACEPARENT), the spans recorded here are added to the
+result JSON and exported by the server as children of its run span.
+"""
+
+import os
+import re
+import time
+from contextlib import contextmanager
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_trace_id = None
+_stack = []
+spans = []
+
+
+def start(traceparent):
+    """Activate recording under ``traceparent``; a no-op if it is missing or invalid."""
+    global _trace_id
+    spans.clear()
+    _stack.clear()
+    match = TRACEPARENT_RE.match((traceparent or "").strip().lower())
+    _trace_id = match.group(1) if match else None
+    if match:
+        _stack.append(match.group(2))
+
+
+def active() -> bool:
+    return _trace_id is not None
+
+
+@contextmanager
+def span(name, **attributes):
+    if _trace_id is None:
+        yield
+        return
+    record = {
+        "name": name,
+        "trace_id": _trace_id,
+        "span_id": os.urandom(8).hex(),
+        "parent_id": _stack[-1],
+        "service": "code-runner",
+        "start_ns": time.time_ns(),
+        "end_ns": None,
+        "status": "ok",
+        "attributes": attributes,
+    }
+    _stack.append(record["span_id"])
+    try:
+        yield
+    except BaseException as e:
+        record["status"] = "error"
+        record["attributes"]["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _stack.pop()
+        record["end_ns"] = time.time_ns()
+        spans.append(record)